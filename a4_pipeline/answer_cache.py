@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from metrics import REGISTRY, stats_samples
+
+
+# Finished /ask and /ask_pro answers, keyed by (mode, model, index versions, normalized
+# question). Concurrent identical questions are coalesced: the first caller runs the job
+# and the others wait for its result instead of repeating retrieval, planning and the
+# LLM call. Only successful answers are kept; a failure is handed to everyone waiting on
+# that flight and the next ask runs again. Index versions are part of the key, so a
+# rebuilt index never serves an answer built from the old one.
+
+DEFAULT_ANSWER_CACHE_SIZE = int(os.environ.get("A4_ANSWER_CACHE_SIZE", "256"))
+DEFAULT_ANSWER_CACHE_TTL_SEC = float(os.environ.get("A4_ANSWER_CACHE_TTL_SEC", "1800"))
+
+COMPUTED = "computed"
+COALESCED = "coalesced"
+CACHED = "cache"
+
+_PUNCT_RE = re.compile(r"[\s?!.,;:~\"'`()\[\]{}<>…·。，、？！：；「」『』（）]+")
+
+
+def normalize_question(question: str) -> str:
+    """Case-, width- and punctuation-insensitive form, so "Page buffer?" == "page  buffer"."""
+    text = unicodedata.normalize("NFKC", str(question or "")).casefold()
+    return _PUNCT_RE.sub(" ", text).strip()
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class AnswerCache:
+    """Thread-safe LRU + TTL answer cache with singleflight coalescing."""
+
+    def __init__(self, maxsize: int = DEFAULT_ANSWER_CACHE_SIZE, ttl_sec: float = DEFAULT_ANSWER_CACHE_TTL_SEC) -> None:
+        self.maxsize = maxsize
+        self.ttl_sec = ttl_sec
+        self._items: OrderedDict[Tuple[Hashable, ...], Tuple[float, Any]] = OrderedDict()
+        self._flights: Dict[Tuple[Hashable, ...], _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.failed = 0
+
+    def get_or_run(self, key: Tuple[Hashable, ...], compute: Callable[[], Any]) -> Tuple[Any, str, float]:
+        """(value, source, age_sec). source is COMPUTED, COALESCED or CACHED; age is 0 unless cached."""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and self.ttl_sec > 0 and time.monotonic() - entry[0] > self.ttl_sec:
+                del self._items[key]
+                self.expired += 1
+                entry = None
+            if entry is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return entry[1], CACHED, time.monotonic() - entry[0]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, COALESCED, 0.0
+        try:
+            flight.value = compute()
+        except BaseException as exc:
+            flight.error = exc
+            with self._lock:
+                self.failed += 1
+                del self._flights[key]
+            flight.done.set()
+            raise
+        with self._lock:
+            if self.maxsize > 0:
+                self._items[key] = (time.monotonic(), flight.value)
+                while len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+            del self._flights[key]
+        flight.done.set()
+        return flight.value, COMPUTED, 0.0
+
+    def peek(self, key: Tuple[Hashable, ...]) -> bool:
+        """True when a fresh answer for key is cached (no counters change)."""
+        with self._lock:
+            entry = self._items.get(key)
+            return entry is not None and (self.ttl_sec <= 0 or time.monotonic() - entry[0] <= self.ttl_sec)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+                "expired": self.expired,
+                "failed": self.failed,
+                "saved_rate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+            }
+
+
+def format_age(seconds: float) -> str:
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds}초"
+    if seconds < 3600:
+        return f"{seconds // 60}분 {seconds % 60}초"
+    return f"{seconds // 3600}시간 {seconds % 3600 // 60}분"
+
+
+def source_note(source: str, age_sec: float) -> str:
+    """Header line telling the user where a reply came from; empty for a fresh answer."""
+    if source == CACHED:
+        return f"캐시된 답변이야 ({format_age(age_sec)} 전에 생성, 같은 질문·모델·인덱스 기준)."
+    if source == COALESCED:
+        return "같은 질문이 이미 처리 중이어서 그 답변을 함께 받았어."
+    return ""
+
+
+ANSWER_CACHE = AnswerCache()
+REGISTRY.register_collector(
+    lambda: stats_samples(
+        "a4_cache", ANSWER_CACHE.stats(), ["hits", "misses", "coalesced", "expired", "failed"], ["size", "in_flight", "saved_rate"], cache="answer"
+    )
+)
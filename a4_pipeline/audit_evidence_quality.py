@@ -247,7 +247,7 @@ def audit_packs(pack_db: Path, sample_limit: int) -> Dict[str, Any]:
 
 def write_markdown(report: Dict[str, Any], md_path: Path) -> None:
     claims = report["claims"]
-    packs = report["packs"]
+    packs = report["packs"]  # None when no pack index was audited
     lines = [
         "# A4 Evidence Quality Audit",
         "",
@@ -255,12 +255,16 @@ def write_markdown(report: Dict[str, Any], md_path: Path) -> None:
         f"- total claims: {claims['total_claims']}",
         f"- claim bucket counts: `{claims['bucket_counts']}`",
         f"- high/severe claim patents: {claims['high_or_severe_patents']}",
-        f"- total evidence packs: {packs['total_packs']}",
-        f"- packs without claim text: {packs['packs_without_claim_text']}",
-        f"- packs with high/severe contaminated claim text: {packs['affected_packs_high_or_severe']}",
-        "",
-        "## Top Claim Flags",
     ]
+    if packs:
+        lines.extend(
+            [
+                f"- total evidence packs: {packs['total_packs']}",
+                f"- packs without claim text: {packs['packs_without_claim_text']}",
+                f"- packs with high/severe contaminated claim text: {packs['affected_packs_high_or_severe']}",
+            ]
+        )
+    lines.extend(["", "## Top Claim Flags"])
     for flag, count in list(claims["flag_counts"].items())[:16]:
         lines.append(f"- {flag}: {count}")
     lines.extend(["", "## Top Bad Patents"])
@@ -278,7 +282,7 @@ def write_markdown(report: Dict[str, Any], md_path: Path) -> None:
             ]
         )
     lines.extend(["", "## Pack Samples"])
-    for sample in packs["samples"][:20]:
+    for sample in (packs or {}).get("samples", [])[:20]:
         lines.extend(
             [
                 f"### {sample['patent_id']} ({sample['bucket']}, score={sample['score']})",
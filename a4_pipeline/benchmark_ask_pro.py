@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+CODE_DIR = Path(__file__).resolve().parent
+if str(CODE_DIR) not in sys.path:
+    sys.path.insert(0, str(CODE_DIR))
+
+from build_evidence_units import DEFAULT_UNITS_DB  # noqa: E402
+from evidence_pack import DEFAULT_EVIDENCE_DB  # noqa: E402
+from patent_dictionary_search import DEFAULT_DB  # noqa: E402
+from patent_local_triage import DEFAULT_PACK_DB  # noqa: E402
+from query_cache import QUERY_CACHE  # noqa: E402
+from retrieval_service import RetrievalService  # noqa: E402
+
+
+# Latency and SQL round trips of the /ask_pro evidence pack build (rank_evidence plus
+# title/claim overrides) with no LLM planner. Statement counts per DB should stay
+# flat as --limits grows; a count that scales with the result limit is an N+1 loop.
+
+
+def count_statements(service: RetrievalService, counts: Counter) -> None:
+    for name in ("index", "units", "packs", "evidence"):
+        con = service.connection(name)
+        if con is not None:
+            con.set_trace_callback(
+                lambda sql, name=name: counts.update([name]) if sql.lstrip().upper().startswith(("SELECT", "WITH")) else None
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time an /ask_pro evidence pack build and count SQL queries per DB.")
+    parser.add_argument("question", nargs="?", default="page buffer bit line 페이지 버퍼 제어 특허 비교")
+    parser.add_argument("--index-db", default=str(DEFAULT_DB))
+    parser.add_argument("--units-db", default=str(DEFAULT_UNITS_DB))
+    parser.add_argument("--pack-db", default=str(DEFAULT_PACK_DB))
+    parser.add_argument("--evidence-db", default=str(DEFAULT_EVIDENCE_DB))
+    parser.add_argument("--limits", default="1,4,8")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    service = RetrievalService(Path(args.index_db), Path(args.units_db), Path(args.pack_db), Path(args.evidence_db))
+    rows: List[Dict[str, Any]] = []
+    for limit in [int(value) for value in args.limits.split(",") if value.strip()]:
+        counts: Counter = Counter()
+        timings: List[float] = []
+        results = 0
+        for attempt in range(max(1, args.repeat)):
+            # Measure the uncached path; the query cache would otherwise answer repeats.
+            QUERY_CACHE.clear()
+            counts.clear()
+            count_statements(service, counts)
+            started = time.perf_counter()
+            pack = service.evidence_pack(args.question, planner_client=None, limit=limit)
+            timings.append((time.perf_counter() - started) * 1000.0)
+            results = len(pack.get("retrieved_cards", []))
+        rows.append(
+            {
+                "limit": limit,
+                "results": results,
+                "queries": dict(sorted(counts.items())),
+                "total_queries": sum(counts.values()),
+                "median_ms": round(statistics.median(timings), 2),
+                "min_ms": round(min(timings), 2),
+            }
+        )
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
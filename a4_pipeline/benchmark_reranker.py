@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+CODE_DIR = Path(__file__).resolve().parent
+if str(CODE_DIR) not in sys.path:
+    sys.path.insert(0, str(CODE_DIR))
+
+from evidence_reranker import TERM_REGISTRY, UNIT_FEATURE_CACHE, query_terms, row_to_unit, score_unit, score_units, title_features  # noqa: E402
+
+
+VOCAB = [
+    "page buffer", "bit line", "word line", "latch", "sense amplifier", "program verify", "erase voltage",
+    "memory plane", "controller", "firmware", "garbage collection", "页缓冲器", "位线", "字线", "存储器",
+    "페이지 버퍼", "비트 라인", "워드 라인", "메모리", "voltage", "transistor", "capacitor", "substrate",
+]
+TITLES = ["memory device", "Page buffer circuit and operating method", "onfrouler g1iic vaive", "3D NAND with plane pads"]
+UNIT_TYPES = ["claim", "claim", "claim", "figure", "title", "minimal_summary"]
+FLAGS = ["dependent_claim_reference", "short_claim_text", "publication_line_only", "very_short_text"]
+
+
+def synthetic_units(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    units: List[Dict[str, Any]] = []
+    for i in range(count):
+        patent = i // 12
+        unit_type = rng.choice(UNIT_TYPES)
+        units.append(
+            {
+                "unit_id": f"u{i}",
+                "patent_id": f"us{20250000000 + patent}a1p",
+                "unit_type": unit_type,
+                "unit_ref": f"claim_{i % 20 + 1}" if unit_type == "claim" else unit_type,
+                "claim_type": rng.choice(["independent", "dependent", "dependent_inferred"]) if unit_type == "claim" else "",
+                "is_independent_claim": unit_type == "claim" and rng.random() < 0.3,
+                "text": " ".join(rng.choice(VOCAB) for _ in range(rng.randint(20, 160))),
+                "source_weight": rng.choice([0.6, 1.0, 1.4]),
+                "quality_flags": rng.sample(FLAGS, rng.choice([0, 0, 0, 1, 2])),
+                "minimal_labels": rng.sample(VOCAB, 3),
+                "minimal_elements": rng.sample(VOCAB, 4),
+                "title_source": TITLES[patent % len(TITLES)],
+                "confidence": rng.random(),
+                "qc_flags": ["low_minimal_confidence"] if rng.random() < 0.1 else [],
+                "bm25": -rng.random() * 12 if rng.random() < 0.8 else None,
+                "dense_score": rng.random() if rng.random() < 0.3 else None,
+            }
+        )
+    return units
+
+
+def units_from_db(units_db: Path, count: int) -> List[Dict[str, Any]]:
+    con = sqlite3.connect(units_db)
+    con.row_factory = sqlite3.Row
+    rows = con.execute("SELECT *, NULL AS bm25 FROM evidence_units ORDER BY random() LIMIT ?", (count,)).fetchall()
+    con.close()
+    return [row_to_unit(row) for row in rows]
+
+
+def time_call(fn: Any, repeat: int, cold: bool = True, new_terms: bool = False) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if cold:
+            title_features.cache_clear()
+            UNIT_FEATURE_CACHE.clear()
+        if new_terms:
+            TERM_REGISTRY.clear()
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare per-unit and batch reranker scoring as candidate units grow.")
+    parser.add_argument("--sizes", default="100,1000,5000,20000")
+    parser.add_argument("--question", default="page buffer bit line 페이지 버퍼 页缓冲器 program verify")
+    parser.add_argument("--units-db", default="", help="Sample real evidence_units rows instead of synthetic ones.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    terms = query_terms(args.question, {"search_queries": [args.question]})
+    rows: List[Dict[str, Any]] = []
+    for size in [int(value) for value in args.sizes.split(",") if value.strip()]:
+        units = units_from_db(Path(args.units_db), size) if args.units_db else synthetic_units(size)
+        loop_scores = [score_unit(unit, terms)[0] for unit in units]
+        batch_scores = score_units(units, terms, version="bench")
+        max_diff = max((abs(a - b) for a, b in zip(loop_scores, batch_scores)), default=0.0)
+        loop_ms = time_call(lambda: [score_unit(unit, terms) for unit in units], args.repeat)
+        cold_ms = time_call(lambda: score_units(units, terms), args.repeat)
+        # Repeated queries over the same units reuse the cached per-unit features; new_terms
+        # is a query whose terms have not been tested against these units yet.
+        score_units(units, terms, version="bench")
+        new_terms_ms = time_call(lambda: score_units(units, terms, version="bench"), args.repeat, cold=False, new_terms=True)
+        warm_ms = time_call(lambda: score_units(units, terms, version="bench"), args.repeat, cold=False)
+        rows.append(
+            {
+                "units": len(units),
+                "terms": len(terms),
+                "per_unit_ms": round(loop_ms, 2),
+                "batch_cold_ms": round(cold_ms, 2),
+                "batch_new_terms_ms": round(new_terms_ms, 2),
+                "batch_warm_ms": round(warm_ms, 2),
+                "warm_us_per_unit": round(warm_ms * 1000.0 / max(1, len(units)), 2),
+                "warm_speedup": round(loop_ms / warm_ms, 1) if warm_ms else None,
+                "max_score_diff": round(max_diff, 9),
+            }
+        )
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
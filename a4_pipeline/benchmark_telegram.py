@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+
+CODE_DIR = Path(__file__).resolve().parent
+if str(CODE_DIR) not in sys.path:
+    sys.path.insert(0, str(CODE_DIR))
+
+from fake_telegram_api import FakeTelegramServer, FakeTelegramState  # noqa: E402
+from patent_telegram_bot import TelegramClient  # noqa: E402
+from telegram_async import AsyncTelegramClient, split_message  # noqa: E402
+
+
+# Times the two bot transports against the local fake Bot API: long /ask answers sent
+# from several lane threads at once, and one /mission summary. Both transports deliver
+# the same chunks; the async one reuses connections and pipelines each reply's chunks.
+
+
+def long_answer(chars: int, seed: int) -> str:
+    lines = []
+    index = 0
+    while sum(len(line) + 1 for line in lines) < chars:
+        lines.append(f"[{seed}-{index}] 후보 us20250191658a1p 청구항 1: page buffer가 bit line 전압을 제어하는 구성 근거 요약 {index}.")
+        index += 1
+    return "\n".join(lines)
+
+
+def mission_summary(candidates: int) -> str:
+    blocks = [f"오토 미션 리포트\n목표: page buffer bit line 제어 관련 선행기술 조사\n후보 {candidates}건"]
+    for rank in range(1, candidates + 1):
+        blocks.append(
+            f"{rank}. cn115543210a{rank:03d}p page buffer circuit\n"
+            + "\n".join(f"- 근거 {item}: 독립항 {item}의 bit line precharge 제어와 sensing 노드 비교" for item in range(1, 40))
+        )
+    return "\n\n".join(blocks)
+
+
+def run_case(client: Any, jobs: List[Dict[str, Any]], workers: int) -> Tuple[float, int]:
+    """(seconds, failed messages) for sending every job from its own thread."""
+
+    def send(job: Dict[str, Any]) -> bool:
+        try:
+            client.send_message(job["chat_id"], job["text"])
+            return True
+        except Exception:
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(send, jobs))
+    return time.perf_counter() - started, results.count(False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark requests vs asyncio Telegram transports on a fake Bot API.")
+    parser.add_argument("--rtt-ms", type=float, default=80)
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--answer-chars", type=int, default=15000, help="Length of each /ask answer.")
+    parser.add_argument("--mission-candidates", type=int, default=12)
+    parser.add_argument("--chat-rate", type=float, default=0.0, help="Fake per-chat limit before 429; 0 disables.")
+    parser.add_argument("--chat-burst", type=int, default=5)
+    args = parser.parse_args()
+
+    state = FakeTelegramState(args.rtt_ms / 1000, chat_rate=args.chat_rate, chat_burst=args.chat_burst)
+    server = FakeTelegramServer(state).start()
+    cases = {
+        "ask_answers": [{"chat_id": 1000 + i, "text": long_answer(args.answer_chars, i)} for i in range(args.chats)],
+        "mission_summary": [{"chat_id": 999, "text": mission_summary(args.mission_candidates)}],
+    }
+    out: Dict[str, Any] = {"rtt_ms": args.rtt_ms}
+    try:
+        for name, jobs in cases.items():
+            chunks = sum(len(list(split_message(job["text"]))) for job in jobs)
+            row: Dict[str, Any] = {"messages": len(jobs), "chunks": chunks}
+            for transport in ("requests", "async"):
+                client: Any = (
+                    AsyncTelegramClient("0:bench", api_base=server.base_url)
+                    if transport == "async"
+                    else TelegramClient("0:bench", api_base=server.base_url)
+                )
+                connections = state.connections
+                state.reset()
+                limited = state.rate_limited
+                seconds, failed = run_case(client, jobs, workers=len(jobs))
+                row[f"{transport}_sec"] = round(seconds, 3)
+                row[f"{transport}_connections"] = state.connections - connections
+                row[f"{transport}_429"] = state.rate_limited - limited
+                row[f"{transport}_failed"] = failed
+                for job in jobs:
+                    if not failed and "\n".join(state.messages_for(job["chat_id"])) != "\n".join(split_message(job["text"])):
+                        raise SystemExit(f"{transport} delivered {name} chunks out of order")
+                if transport == "async":
+                    row["async_stats"] = client.stats()
+                    client.close()
+            row["speedup"] = round(row["requests_sec"] / max(row["async_sec"], 1e-9), 2)
+            out[name] = row
+    finally:
+        server.stop()
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+from build_evidence_units import DEFAULT_UNITS_DB
+from card_cache import index_version
+from dense_index import (
+    DEFAULT_ENCODER,
+    DEFAULT_HASH_DIM,
+    DEFAULT_SBERT_MODEL,
+    HashedNgramEncoder,
+    SentenceEncoder,
+    dense_dir_for,
+    np,
+)
+
+
+def unit_text(row: sqlite3.Row) -> str:
+    """Same fields the units FTS indexes: text, labels, elements, title."""
+    parts: List[str] = [str(row["text"] or "")]
+    for column in ("minimal_labels_json", "minimal_elements_json"):
+        try:
+            parts.append(" ".join(str(item) for item in json.loads(row[column] or "[]")))
+        except Exception:
+            pass
+    parts.append(str(row["title_source"] or ""))
+    return " ".join(part for part in parts if part)
+
+
+def make_build_encoder(name: str, model: str, dim: int) -> Any:
+    if name == "sbert":
+        try:
+            return SentenceEncoder(model)
+        except Exception as exc:
+            print(f"[dense] sentence-transformers model unavailable ({exc!r}); using hashed n-grams")
+    return HashedNgramEncoder(dim=dim)
+
+
+def build_dense(
+    units_db: Path,
+    out_dir: Path | None = None,
+    encoder_name: str = DEFAULT_ENCODER,
+    model: str = DEFAULT_SBERT_MODEL,
+    dim: int = DEFAULT_HASH_DIM,
+    dtype: str = "float16",
+    batch_size: int = 256,
+) -> Dict[str, Any]:
+    if np is None:
+        raise SystemExit("numpy is required to build the dense index")
+    out_dir = out_dir or dense_dir_for(units_db)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    con = sqlite3.connect(units_db)
+    con.row_factory = sqlite3.Row
+    count = con.execute("SELECT COUNT(*) FROM evidence_units").fetchone()[0]
+    encoder = make_build_encoder(encoder_name, model, dim)
+    vectors = np.lib.format.open_memmap(
+        tmp_dir / "vectors.npy",
+        mode="w+",
+        dtype=np.int8 if dtype == "int8" else np.float16,
+        shape=(count, encoder.dim),
+    )
+    rowids = np.lib.format.open_memmap(tmp_dir / "rowids.npy", mode="w+", dtype=np.int64, shape=(count,))
+    scales = np.lib.format.open_memmap(tmp_dir / "scales.npy", mode="w+", dtype=np.float32, shape=(count,)) if dtype == "int8" else None
+
+    position = 0
+    batches = 0
+    cursor = con.execute(
+        "SELECT rowid, text, minimal_labels_json, minimal_elements_json, title_source FROM evidence_units ORDER BY rowid"
+    )
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        block = encoder.encode([unit_text(row) for row in rows])
+        end = position + len(rows)
+        rowids[position:end] = [row["rowid"] for row in rows]
+        if scales is not None:
+            row_scale = np.maximum(np.abs(block).max(axis=1), 1e-8) / 127.0
+            vectors[position:end] = np.round(block / row_scale[:, None]).astype(np.int8)
+            scales[position:end] = row_scale
+        else:
+            vectors[position:end] = block.astype(np.float16)
+        position = end
+        batches += 1
+        if batches % 40 == 0:
+            print(f"[dense] units={position}/{count}", flush=True)
+
+    meta = {
+        **encoder.spec(),
+        "dtype": dtype,
+        "count": position,
+        "units_db": str(units_db),
+        "units_index_version": index_version(con),
+        "built_at": f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}",
+    }
+    con.close()
+    vectors.flush()
+    rowids.flush()
+    del vectors, rowids
+    if scales is not None:
+        scales.flush()
+        del scales
+    (tmp_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    # Swap directories so readers never see a half-written matrix.
+    old_dir = out_dir.with_name(out_dir.name + ".old")
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    if out_dir.exists():
+        out_dir.rename(old_dir)
+    tmp_dir.rename(out_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    return meta
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the CPU dense vector index over evidence_units.")
+    parser.add_argument("--units-db", default=str(DEFAULT_UNITS_DB))
+    parser.add_argument("--out-dir", default="", help="Defaults to <units-db stem>.dense next to the units DB.")
+    parser.add_argument("--encoder", choices=["hash", "sbert"], default=DEFAULT_ENCODER)
+    parser.add_argument("--model", default=DEFAULT_SBERT_MODEL, help="sentence-transformers model for --encoder sbert.")
+    parser.add_argument("--dim", type=int, default=DEFAULT_HASH_DIM, help="Vector size for the hashed n-gram encoder.")
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    meta = build_dense(
+        Path(args.units_db),
+        Path(args.out_dir) if args.out_dir else None,
+        encoder_name=args.encoder,
+        model=args.model,
+        dim=args.dim,
+        dtype=args.dtype,
+        batch_size=args.batch_size,
+    )
+    print(f"[dense] wrote {Path(args.out_dir) if args.out_dir else dense_dir_for(Path(args.units_db))}")
+    print(f"[dense] meta={json.dumps(meta, ensure_ascii=False)}, elapsed={time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ from pathlib import Path
 
 import fitz
 
-from db_schema import ensure_db, get_connection, reset_patent_artifacts, upsert_job, increment_job_retry
+from db_schema import append_change, ensure_db, get_connection, reset_patent_artifacts, upsert_job, increment_job_retry
 
 try:
     from config import (
@@ -896,6 +896,7 @@ def process_one_pdf(pdf_path: Path, move_processed: bool) -> dict:
         insert_claim_ref_map(con, meta["patent_id"], claim_ref_map)
         insert_figure_captions(con, meta["patent_id"], figure_caps)
         insert_drawing_ref_map(con, meta["patent_id"], drawing_ref_map)
+        append_change(con, meta["patent_id"], "evidence", PARSER_VERSION)
         upsert_job(con, meta["patent_id"], str(pdf_path), "evidence_done")
     finally:
         con.close()
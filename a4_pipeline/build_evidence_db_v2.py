@@ -141,25 +141,27 @@ def build_from_pdfs(args: argparse.Namespace, db_path: Path, parsed_json_dir: Pa
     }
 
 
-def write_audit(evidence_db: Path, pack_db: Path, out_dir: Path) -> Dict[str, Any]:
+def write_audit(evidence_db: Path, pack_db: Path | None, out_dir: Path) -> Dict[str, Any]:
+    """Claim audit, plus the pack audit when a pack index was built (pack_db is not None)."""
     out_dir.mkdir(parents=True, exist_ok=True)
     report = {
         "evidence_db": str(evidence_db),
-        "pack_db": str(pack_db),
+        "pack_db": str(pack_db) if pack_db else "",
         "claims": audit_evidence_quality.audit_claims(evidence_db, sample_limit=40),
-        "packs": audit_evidence_quality.audit_packs(pack_db, sample_limit=40),
+        "packs": audit_evidence_quality.audit_packs(pack_db, sample_limit=40) if pack_db else None,
     }
     json_path = out_dir / "evidence_quality_audit.json"
     md_path = out_dir / "evidence_quality_audit.md"
     json_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
     audit_evidence_quality.write_markdown(report, md_path)
+    packs = report["packs"] or {}
     return {
         "json_path": str(json_path),
         "md_path": str(md_path),
         "claim_bucket_counts": report["claims"]["bucket_counts"],
         "high_or_severe_claim_patents": report["claims"]["high_or_severe_patents"],
-        "affected_packs_high_or_severe": report["packs"]["affected_packs_high_or_severe"],
-        "packs_without_claim_text": report["packs"]["packs_without_claim_text"],
+        "affected_packs_high_or_severe": packs.get("affected_packs_high_or_severe"),
+        "packs_without_claim_text": packs.get("packs_without_claim_text"),
     }
 
 
@@ -169,6 +171,7 @@ def run_postprocess(
     pack_db: Path,
     report_dir: Path,
     skip_missing_strong: bool,
+    build_packs: bool = True,
 ) -> Dict[str, Any]:
     stages: Dict[str, Any] = {}
 
@@ -178,6 +181,15 @@ def run_postprocess(
         if k != "actions"
     }
 
+    if not build_packs:
+        # The pack index (and the missing-strong repair that reads its flags) is left to
+        # the caller, e.g. build_pipeline.py's packs stage; this run reads no minimal index.
+        stages["pack_index"] = {"skipped": True}
+        stages["missing_strong_repair"] = {"skipped": True, "reason": "no pack index"}
+        stages["audit"] = write_audit(evidence_db=db_path, pack_db=None, out_dir=report_dir)
+        stages["db_counts"] = db_counts(db_path)
+        return stages
+
     stages["pack_index_1"] = build_pack_index(
         minimal_db=minimal_db,
         evidence_db=db_path,
@@ -212,13 +224,17 @@ def run_postprocess(
         evidence_only=True,
     )
     stages["audit"] = write_audit(evidence_db=db_path, pack_db=pack_db, out_dir=report_dir)
-    stages["db_counts"] = {
+    stages["db_counts"] = db_counts(db_path)
+    return stages
+
+
+def db_counts(db_path: Path) -> Dict[str, int]:
+    return {
         "patents": table_count(db_path, "patents"),
         "claims": table_count(db_path, "claims"),
         "claim_ref_map": table_count(db_path, "claim_ref_map"),
         "text_spans": table_count(db_path, "text_spans"),
     }
-    return stages
 
 
 def copy_if_requested(src: Path, dst: Path | None) -> str:
@@ -243,6 +259,11 @@ def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
     parser.add_argument("--move-processed", action="store_true", help="Move PDFs to processed after success.")
     parser.add_argument("--post-only", action="store_true", help="Run v2 cleanup/index/audit on an existing DB.")
     parser.add_argument("--skip-missing-strong", action="store_true", help="Skip PDF reparse repair for missing strong claims.")
+    parser.add_argument(
+        "--no-pack-index",
+        action="store_true",
+        help="Do not build a pack index (or run the pack-driven repair); --minimal-db and --pack-db are not used.",
+    )
     parser.add_argument("--db", default=str(DEFAULT_DB_DIR / f"{run_id}.sqlite"))
     parser.add_argument("--minimal-db", default=str(DEFAULT_MINIMAL_DB))
     parser.add_argument("--pack-db", default=str(DEFAULT_INDEX_DIR / f"patent_evidence_pack_index_{run_id}.sqlite"))
@@ -270,7 +291,7 @@ def main() -> None:
         "parser_version": PARSER_VERSION_V2,
         "db_path": str(db_path),
         "minimal_db": str(minimal_db),
-        "pack_db": str(pack_db),
+        "pack_db": "" if args.no_pack_index else str(pack_db),
         "parsed_json_dir": str(parsed_json_dir),
         "report_dir": str(report_dir),
         "post_only": bool(args.post_only),
@@ -288,6 +309,7 @@ def main() -> None:
         pack_db=pack_db,
         report_dir=report_dir,
         skip_missing_strong=bool(args.skip_missing_strong),
+        build_packs=not args.no_pack_index,
     )
     copied_to = copy_if_requested(db_path, Path(args.copy_final_db_to) if args.copy_final_db_to else None)
     if copied_to:
@@ -301,7 +323,7 @@ def main() -> None:
     summary = {
         "report_path": str(report_path),
         "db_path": str(db_path),
-        "pack_db": str(pack_db),
+        "pack_db": "" if args.no_pack_index else str(pack_db),
         "parser_version": PARSER_VERSION_V2,
         "elapsed_sec": report["elapsed_sec"],
         "audit": report["postprocess"]["audit"],
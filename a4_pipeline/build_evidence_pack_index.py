@@ -8,6 +8,19 @@ import time
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Sequence
 
+from family_index import FamilyBuilder
+from fts_index import (
+    DEFAULT_TOKENIZER,
+    TOKENIZERS,
+    begin_bulk_load,
+    finish_bulk_load,
+    index_text,
+    tokenize_option,
+    write_index_meta,
+)
+from patent_id_index import create_id_index
+from query_aliases import create_alias_index, read_aliases
+
 
 BASE = Path("/Volumes/외장 2TB/cpu2026")
 INDEX_DIR = BASE / "patent_hub" / "outputs" / "indexes" / "A4"
@@ -321,9 +334,9 @@ def build_quality_flags(
     return unique_keep_order(flags)
 
 
-def create_schema(con: sqlite3.Connection) -> None:
+def create_schema(con: sqlite3.Connection, tokenizer: str = DEFAULT_TOKENIZER) -> None:
     con.executescript(
-        """
+        f"""
         DROP TABLE IF EXISTS evidence_pack_index;
         DROP TABLE IF EXISTS evidence_pack_fts;
         DROP TABLE IF EXISTS evidence_pack_labels;
@@ -365,21 +378,21 @@ def create_schema(con: sqlite3.Connection) -> None:
         CREATE INDEX idx_pack_labels ON evidence_pack_labels(label);
 
         CREATE VIRTUAL TABLE evidence_pack_fts USING fts5(
-            patent_id UNINDEXED,
             title,
             core_subject,
             elements,
             labels,
             claims,
             figures,
-            search_text
+            search_text,
+            content=''{tokenize_option(tokenizer)}
         );
         """
     )
 
 
-def insert_pack(con: sqlite3.Connection, pack: Dict[str, Any]) -> None:
-    con.execute(
+def insert_pack(con: sqlite3.Connection, pack: Dict[str, Any], tokenizer: str = DEFAULT_TOKENIZER) -> None:
+    cur = con.execute(
         """
         INSERT INTO evidence_pack_index (
             patent_id, source_language, title, title_source, title_quality, core_subject,
@@ -420,19 +433,24 @@ def insert_pack(con: sqlite3.Connection, pack: Dict[str, Any]) -> None:
     con.execute(
         """
         INSERT INTO evidence_pack_fts (
-            patent_id, title, core_subject, elements, labels, claims, figures, search_text
+            rowid, title, core_subject, elements, labels, claims, figures, search_text
         )
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
-            pack["patent_id"],
-            pack["title"],
-            pack["core_subject"],
-            " ".join(pack["core_elements"]),
-            " ".join([*pack["problem_labels"], *pack["solution_labels"], *pack["effect_labels"]]),
-            " ".join(claim["text"] for claim in [*pack["strong_claims"], *pack["support_claims"]]),
-            " ".join(fig["caption"] for fig in pack["figures"]),
-            pack["search_text"],
+            cur.lastrowid,
+            *(
+                index_text(value, tokenizer)
+                for value in (
+                    pack["title"],
+                    pack["core_subject"],
+                    " ".join(pack["core_elements"]),
+                    " ".join([*pack["problem_labels"], *pack["solution_labels"], *pack["effect_labels"]]),
+                    " ".join(claim["text"] for claim in [*pack["strong_claims"], *pack["support_claims"]]),
+                    " ".join(fig["caption"] for fig in pack["figures"]),
+                    pack["search_text"],
+                )
+            ),
         ),
     )
     for label_type in ("problem_labels", "solution_labels", "effect_labels"):
@@ -559,6 +577,7 @@ def build_pack_index(
     pack_db: Path,
     limit: int = 0,
     evidence_only: bool = False,
+    tokenizer: str = DEFAULT_TOKENIZER,
 ) -> Dict[str, Any]:
     started = time.monotonic()
     pack_db.parent.mkdir(parents=True, exist_ok=True)
@@ -570,7 +589,8 @@ def build_pack_index(
     out_con = sqlite3.connect(pack_db)
     out_con.execute("PRAGMA journal_mode=WAL;")
     out_con.execute("PRAGMA synchronous=NORMAL;")
-    create_schema(out_con)
+    create_schema(out_con, tokenizer=tokenizer)
+    begin_bulk_load(out_con, "evidence_pack_fts")
 
     allowed_patents = evidence_patent_ids(ev_con) if evidence_only else set()
     counts: Dict[str, Any] = {
@@ -580,12 +600,14 @@ def build_pack_index(
         "claim_nos_corrected": 0,
         "missing_strong": 0,
     }
+    family = FamilyBuilder()
     for row in iter_minimal_cards(min_con):
         if allowed_patents and str(row["patent_id"]) not in allowed_patents:
             counts["skipped_not_in_evidence_db"] += 1
             continue
         pack = build_pack_for_row(ev_con, row)
-        insert_pack(out_con, pack)
+        insert_pack(out_con, pack, tokenizer=tokenizer)
+        family.add(pack["patent_id"], pack["title"], [claim["text"] for claim in pack["strong_claims"]])
         counts["patents"] += 1
         flags = set(pack["quality_flags"])
         if "minimal_title_repaired" in flags:
@@ -601,6 +623,11 @@ def build_pack_index(
             break
 
     out_con.commit()
+    finish_bulk_load(out_con, "evidence_pack_fts")
+    create_id_index(out_con, [row[0] for row in out_con.execute("SELECT patent_id FROM evidence_pack_index")])
+    create_alias_index(out_con, read_aliases(min_con))
+    counts["families"] = family.write(out_con)["families"]
+    write_index_meta(out_con, tokenizer)
     min_con.close()
     ev_con.close()
     out_con.close()
@@ -616,6 +643,7 @@ def main() -> None:
     parser.add_argument("--out-db", default=str(DEFAULT_PACK_DB))
     parser.add_argument("--limit", type=int, default=0)
     parser.add_argument("--evidence-only", action="store_true", help="Index only patents present in the evidence DB.")
+    parser.add_argument("--tokenizer", choices=TOKENIZERS, default=DEFAULT_TOKENIZER, help="FTS tokenization for CJK text.")
     args = parser.parse_args()
 
     counts = build_pack_index(
@@ -624,6 +652,7 @@ def main() -> None:
         pack_db=Path(args.out_db),
         limit=args.limit,
         evidence_only=args.evidence_only,
+        tokenizer=args.tokenizer,
     )
     print(json.dumps(counts, ensure_ascii=False, indent=2))
 
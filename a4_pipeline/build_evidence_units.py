@@ -8,6 +8,17 @@ import time
 from pathlib import Path
 from typing import Any, Dict, Iterable, List
 
+from family_index import FamilyBuilder
+from fts_index import (
+    DEFAULT_TOKENIZER,
+    TOKENIZERS,
+    begin_bulk_load,
+    finish_bulk_load,
+    register_index_text,
+    tokenize_option,
+    write_index_meta,
+)
+
 
 BASE = Path("/Volumes/외장 2TB/cpu2026")
 INDEX_DIR = BASE / "patent_hub" / "outputs" / "indexes" / "A4"
@@ -86,9 +97,9 @@ def iter_minimal_rows(con: sqlite3.Connection) -> Iterable[sqlite3.Row]:
     )
 
 
-def create_schema(con: sqlite3.Connection) -> None:
+def create_schema(con: sqlite3.Connection, tokenizer: str = DEFAULT_TOKENIZER) -> None:
     con.executescript(
-        """
+        f"""
         DROP TABLE IF EXISTS evidence_units;
         DROP TABLE IF EXISTS evidence_units_fts;
 
@@ -118,14 +129,11 @@ def create_schema(con: sqlite3.Connection) -> None:
         CREATE INDEX idx_evidence_units_claim_type ON evidence_units(claim_type);
 
         CREATE VIRTUAL TABLE evidence_units_fts USING fts5(
-            unit_id UNINDEXED,
-            patent_id UNINDEXED,
-            unit_type UNINDEXED,
-            unit_ref UNINDEXED,
             text,
             labels,
             elements,
-            title
+            title,
+            content=''{tokenize_option(tokenizer)}
         );
         """
     )
@@ -188,25 +196,36 @@ def insert_unit(
             json_dumps(qc_flags),
         ),
     )
+
+
+def sync_units_fts(con: sqlite3.Connection, tokenizer: str = DEFAULT_TOKENIZER) -> None:
+    """Index the final evidence_units rows once; INSERT OR REPLACE duplicates never reach FTS."""
+    begin_bulk_load(con, "evidence_units_fts")
+    register_index_text(con, tokenizer)
     con.execute(
         """
-        INSERT INTO evidence_units_fts (unit_id, patent_id, unit_type, unit_ref, text, labels, elements, title)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            unit_id,
-            patent_id,
-            unit_type,
-            unit_ref,
-            clean,
-            " ".join(labels),
-            " ".join(elements),
-            title_source,
-        ),
+        INSERT INTO evidence_units_fts (rowid, text, labels, elements, title)
+        SELECT
+            eu.rowid,
+            fts_text(eu.text),
+            fts_text((SELECT group_concat(value, ' ') FROM json_each(eu.minimal_labels_json))),
+            fts_text((SELECT group_concat(value, ' ') FROM json_each(eu.minimal_elements_json))),
+            fts_text(eu.title_source)
+        FROM evidence_units eu
+        """
     )
-
-
-def build_units(minimal_db: Path, evidence_db: Path, units_db: Path, limit: int = 0) -> Dict[str, int]:
+    con.commit()
+    finish_bulk_load(con, "evidence_units_fts")
+    write_index_meta(con, tokenizer)
+
+
+def build_units(
+    minimal_db: Path,
+    evidence_db: Path,
+    units_db: Path,
+    limit: int = 0,
+    tokenizer: str = DEFAULT_TOKENIZER,
+) -> Dict[str, int]:
     if units_db.exists():
         units_db.unlink()
     units_db.parent.mkdir(parents=True, exist_ok=True)
@@ -216,9 +235,10 @@ def build_units(minimal_db: Path, evidence_db: Path, units_db: Path, limit: int
     out_con = sqlite3.connect(units_db)
     out_con.execute("PRAGMA journal_mode=WAL;")
     out_con.execute("PRAGMA synchronous=NORMAL;")
-    create_schema(out_con)
+    create_schema(out_con, tokenizer=tokenizer)
 
     counts = {"patents": 0, "units": 0, "claims": 0, "figures": 0}
+    family = FamilyBuilder()
     for row in iter_minimal_rows(min_con):
         patent_id = row["patent_id"]
         labels = [
@@ -263,6 +283,7 @@ def build_units(minimal_db: Path, evidence_db: Path, units_db: Path, limit: int
             elements=elements,
         )
 
+        independent_claims: List[str] = []
         for claim in ev_con.execute(
             """
             SELECT claim_no, claim_type, raw_text, norm_text, page_start
@@ -291,6 +312,9 @@ def build_units(minimal_db: Path, evidence_db: Path, units_db: Path, limit: int
                 elements=elements,
             )
             counts["claims"] += 1
+            if claim_type == "independent":
+                independent_claims.append(raw_text or norm_text or "")
+        family.add(patent_id, title, independent_claims)
 
         for fig in ev_con.execute(
             """
@@ -327,6 +351,8 @@ def build_units(minimal_db: Path, evidence_db: Path, units_db: Path, limit: int
             break
 
     out_con.commit()
+    sync_units_fts(out_con, tokenizer=tokenizer)
+    counts["families"] = family.write(out_con)["families"]
     counts["units"] = out_con.execute("SELECT COUNT(*) FROM evidence_units").fetchone()[0]
     min_con.close()
     ev_con.close()
@@ -340,10 +366,17 @@ def main() -> None:
     parser.add_argument("--evidence-db", default=str(DEFAULT_EVIDENCE_DB))
     parser.add_argument("--out", default=str(DEFAULT_UNITS_DB))
     parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--tokenizer", choices=TOKENIZERS, default=DEFAULT_TOKENIZER, help="FTS tokenization for CJK text.")
     args = parser.parse_args()
 
     started = time.monotonic()
-    counts = build_units(Path(args.minimal_db), Path(args.evidence_db), Path(args.out), limit=args.limit)
+    counts = build_units(
+        Path(args.minimal_db),
+        Path(args.evidence_db),
+        Path(args.out),
+        limit=args.limit,
+        tokenizer=args.tokenizer,
+    )
     elapsed = time.monotonic() - started
     print(f"[units] wrote {args.out}")
     print(f"[units] counts={counts}, elapsed={elapsed:.1f}s")
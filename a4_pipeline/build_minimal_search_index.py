@@ -8,6 +8,20 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Iterable, List
 
+from facet_index import create_facet_index
+from fts_index import (
+    DEFAULT_TOKENIZER,
+    TOKENIZERS,
+    begin_bulk_load,
+    finish_bulk_load,
+    rebuild_external_content,
+    register_index_text,
+    tokenize_option,
+    write_index_meta,
+)
+from patent_id_index import create_id_index
+from query_aliases import build_alias_dictionary, create_alias_index
+
 
 BASE = Path("/Volumes/외장 2TB/cpu2026")
 HUB = BASE / "patent_hub"
@@ -237,7 +251,7 @@ def iter_rows() -> Iterable[Dict[str, Any]]:
         yield row
 
 
-def build_sqlite(rows: List[Dict[str, Any]], db_path: Path) -> None:
+def build_sqlite(rows: List[Dict[str, Any]], db_path: Path, tokenizer: str = DEFAULT_TOKENIZER) -> None:
     if db_path.exists():
         db_path.unlink()
     con = sqlite3.connect(db_path)
@@ -349,26 +363,34 @@ def build_sqlite(rows: List[Dict[str, Any]], db_path: Path) -> None:
         for evidence_id in row["evidence_ids"]
     ]
     cur.executemany("INSERT INTO minimal_evidence VALUES (?, ?)", evidence_rows)
+    create_id_index(con, [row["patent_id"] for row in rows])
+    create_alias_index(con, build_alias_dictionary(rows))
+    create_facet_index(con)
 
-    try:
+    if tokenizer == "cjk_bigram":
+        # Bigram text differs from minimal_index, so it cannot be external content.
         cur.execute(
             "CREATE VIRTUAL TABLE minimal_index_fts USING fts5("
-            "patent_id UNINDEXED, title_source, core_subject, search_text)"
+            "title_source, core_subject, search_text, content='')"
         )
-        cur.executemany(
-            "INSERT INTO minimal_index_fts VALUES (?, ?, ?, ?)",
-            [
-                (
-                    row["patent_id"],
-                    row["title_source"],
-                    row["core_subject"],
-                    row["search_text"],
-                )
-                for row in rows
-            ],
+        begin_bulk_load(con, "minimal_index_fts")
+        register_index_text(con, tokenizer)
+        cur.execute(
+            "INSERT INTO minimal_index_fts (rowid, title_source, core_subject, search_text) "
+            "SELECT rowid, fts_text(title_source), fts_text(core_subject), fts_text(search_text) "
+            "FROM minimal_index"
         )
-    except sqlite3.OperationalError:
-        pass
+    else:
+        cur.execute(
+            "CREATE VIRTUAL TABLE minimal_index_fts USING fts5("
+            "patent_id UNINDEXED, title_source, core_subject, search_text, "
+            f"content='minimal_index', content_rowid='rowid'{tokenize_option(tokenizer)})"
+        )
+        begin_bulk_load(con, "minimal_index_fts")
+        rebuild_external_content(con, "minimal_index_fts")
+    con.commit()
+    finish_bulk_load(con, "minimal_index_fts")
+    write_index_meta(con, tokenizer)
 
     con.commit()
     con.close()
@@ -410,6 +432,7 @@ def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--minimal-dir", type=Path, default=MINIMAL_DIR)
     parser.add_argument("--index-dir", type=Path, default=INDEX_DIR)
+    parser.add_argument("--tokenizer", choices=TOKENIZERS, default=DEFAULT_TOKENIZER, help="FTS tokenization for CJK text.")
     args = parser.parse_args()
 
     MINIMAL_DIR = args.minimal_dir
@@ -420,7 +443,7 @@ def main() -> None:
 
     INDEX_DIR.mkdir(parents=True, exist_ok=True)
     rows = list(iter_rows())
-    build_sqlite(rows, INDEX_SQLITE)
+    build_sqlite(rows, INDEX_SQLITE, tokenizer=args.tokenizer)
     build_jsonl(rows, INDEX_JSONL)
     report = build_qc_report(rows, QC_REPORT)
 
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from fts_index import DEFAULT_TOKENIZER, TOKENIZERS
+
+
+CODE_DIR = Path(__file__).resolve().parent
+BASE = Path("/Volumes/외장 2TB/cpu2026")
+HUB = BASE / "patent_hub"
+DEFAULT_INBOX = HUB / "raw_patents" / "inbox" / "A4"
+DEFAULT_EVIDENCE_DB = BASE / "common" / "runtime" / "db" / "patent_A4.sqlite"
+DEFAULT_MINIMAL_DIR = HUB / "outputs" / "minimal_analysis" / "A4"
+DEFAULT_INDEX_DIR = HUB / "outputs" / "indexes" / "A4"
+DEFAULT_LOG_DIR = BASE / "common" / "runtime" / "logs" / "A4" / "build_pipeline"
+STATE_FILENAME = "build_pipeline_state.json"
+STAGE_ORDER = ["evidence", "minimal", "index", "units", "dense", "packs"]
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str
+    args: List[str]
+    inputs: List[Path]
+    outputs: List[Path]
+    deps: List[str] = field(default_factory=list)
+    patterns: Dict[str, str] = field(default_factory=dict)
+
+    def command(self) -> List[str]:
+        return [sys.executable, str(CODE_DIR / self.script), *self.args]
+
+
+def now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def path_entries(path: Path, pattern: str = "") -> List[List[Any]]:
+    """Cheap make-style fingerprint entries: path, size and mtime, never file contents.
+
+    SQLite -wal/-shm side files are left out: readers create them too, so whether they
+    exist says nothing about the data. Builders close their connections, which
+    checkpoints the WAL into the main file before a stage finishes.
+    """
+    if path.is_dir():
+        files = sorted(p for p in path.glob(pattern or "**/*") if p.is_file() and not p.name.endswith(("-wal", "-shm")))
+    elif path.exists():
+        files = [path]
+    else:
+        return [[str(path), "missing"]]
+    entries: List[List[Any]] = []
+    for item in files:
+        stat = item.stat()
+        entries.append([str(item), stat.st_size, stat.st_mtime_ns])
+    return entries
+
+
+def fingerprint(paths: Sequence[Path], patterns: Dict[str, str], extra: Sequence[Any] = ()) -> str:
+    digest = hashlib.sha1()
+    for path in paths:
+        for entry in path_entries(path, patterns.get(str(path), "")):
+            digest.update(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+    digest.update(json.dumps(list(extra), ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def input_fingerprint(stage: Stage) -> str:
+    return fingerprint([*stage.inputs, CODE_DIR / stage.script], stage.patterns, extra=stage.args)
+
+
+def output_fingerprint(stage: Stage) -> str:
+    return fingerprint(stage.outputs, stage.patterns)
+
+
+def outputs_exist(stage: Stage) -> bool:
+    return all(path.exists() for path in stage.outputs)
+
+
+def load_state(path: Path) -> Dict[str, Dict[str, Any]]:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8")).get("stages", {})
+    except Exception:
+        return {}
+
+
+def save_state(path: Path, stages: Dict[str, Dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"updated_at": now(), "stages": stages}, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def build_stages(args: argparse.Namespace) -> Dict[str, Stage]:
+    inbox = Path(args.inbox)
+    evidence_db = Path(args.evidence_db)
+    minimal_dir = Path(args.minimal_dir)
+    index_dir = Path(args.index_dir)
+    minimal_db = index_dir / "patent_minimal_index.sqlite"
+    units_db = index_dir / "patent_evidence_units.sqlite"
+    dense_meta = index_dir / "patent_evidence_units.dense" / "meta.json"
+    pack_db = index_dir / "patent_evidence_pack_index.sqlite"
+    report_dir = Path(args.log_dir) / "evidence_v2_report"
+
+    tokenizer_args = ["--tokenizer", args.tokenizer]
+    pack_args = [
+        "--minimal-db", str(minimal_db),
+        "--evidence-db", str(evidence_db),
+        "--out-db", str(pack_db),
+        *tokenizer_args,
+    ]
+    if args.evidence_only:
+        pack_args.append("--evidence-only")
+    stages = [
+        # The evidence stage reads only the inbox it fingerprints: --folder, since --all would
+        # read config.A4_INBOX. --no-pack-index keeps it from reading the minimal index (built
+        # later) and from writing pack_db, which the packs stage owns.
+        Stage(
+            name="evidence",
+            script="build_evidence_db_v2.py",
+            args=[
+                "--folder", str(inbox), "--recursive",
+                "--db", str(evidence_db),
+                "--no-pack-index",
+                "--report-dir", str(report_dir),
+            ],
+            inputs=[inbox],
+            outputs=[evidence_db],
+            patterns={str(inbox): "**/*.pdf"},
+        ),
+        Stage(
+            name="minimal",
+            script="patent_minimal_index.py",
+            args=[
+                "--db", str(evidence_db),
+                "--output-dir", str(minimal_dir),
+                "--limit", str(args.minimal_limit),
+                "--model", args.model,
+            ],
+            inputs=[evidence_db],
+            outputs=[minimal_dir],
+            deps=["evidence"],
+            patterns={str(minimal_dir): "*.minimal.json"},
+        ),
+        Stage(
+            name="index",
+            script="build_minimal_search_index.py",
+            args=["--minimal-dir", str(minimal_dir), "--index-dir", str(index_dir), *tokenizer_args],
+            inputs=[minimal_dir],
+            outputs=[minimal_db],
+            deps=["minimal"],
+            patterns={str(minimal_dir): "*.minimal.json"},
+        ),
+        Stage(
+            name="units",
+            script="build_evidence_units.py",
+            args=["--minimal-db", str(minimal_db), "--evidence-db", str(evidence_db), "--out", str(units_db), *tokenizer_args],
+            inputs=[minimal_db, evidence_db],
+            outputs=[units_db],
+            deps=["index"],
+        ),
+        Stage(
+            name="dense",
+            script="build_dense_index.py",
+            args=["--units-db", str(units_db), "--encoder", args.dense_encoder],
+            inputs=[units_db],
+            outputs=[dense_meta],
+            deps=["units"],
+        ),
+        Stage(
+            name="packs",
+            script="build_evidence_pack_index.py",
+            args=pack_args,
+            inputs=[minimal_db, evidence_db],
+            outputs=[pack_db],
+            deps=["index"],
+        ),
+    ]
+    return {stage.name: stage for stage in stages}
+
+
+def stage_is_current(stage: Stage, record: Dict[str, Any] | None) -> bool:
+    if not record or not outputs_exist(stage):
+        return False
+    return (
+        record.get("input_fingerprint") == input_fingerprint(stage)
+        and record.get("output_fingerprint") == output_fingerprint(stage)
+    )
+
+
+def run_stage(stage: Stage, log_dir: Path) -> Dict[str, Any]:
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = log_dir / f"{stage.name}.log"
+    started = time.monotonic()
+    with log_path.open("w", encoding="utf-8") as log_file:
+        proc = subprocess.run(stage.command(), cwd=CODE_DIR, stdout=log_file, stderr=subprocess.STDOUT, text=True)
+    return {
+        "stage": stage.name,
+        "status": "built" if proc.returncode == 0 else "failed",
+        "returncode": proc.returncode,
+        "elapsed_sec": round(time.monotonic() - started, 1),
+        "log_path": str(log_path),
+    }
+
+
+def selected_stages(stages: Dict[str, Stage], only: Sequence[str]) -> List[str]:
+    if not only:
+        return list(STAGE_ORDER)
+    return [name for name in STAGE_ORDER if name in set(only)]
+
+
+def run_pipeline(
+    stages: Dict[str, Stage],
+    state_path: Path,
+    log_dir: Path,
+    only: Sequence[str] = (),
+    force: Sequence[str] = (),
+    jobs: int = 2,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    state = load_state(state_path)
+    targets = selected_stages(stages, only)
+    forced = set(force)
+    report: Dict[str, Dict[str, Any]] = {}
+    rebuilt: set[str] = set()
+    pending = list(targets)
+    running: Dict[Future, str] = {}
+    # Input fingerprints taken when a stage starts: a stage running beside it may touch
+    # shared inputs (or their side files) before this one finishes.
+    input_prints: Dict[str, str] = {}
+    started = time.monotonic()
+
+    def ready(name: str) -> bool:
+        return all(dep not in targets or dep in report for dep in stages[name].deps)
+
+    def blocked(name: str) -> bool:
+        return any(report.get(dep, {}).get("status") in {"failed", "blocked"} for dep in stages[name].deps)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        while pending or running:
+            for name in [item for item in pending if ready(item)]:
+                pending.remove(name)
+                stage = stages[name]
+                if blocked(name):
+                    report[name] = {"stage": name, "status": "blocked", "elapsed_sec": 0.0}
+                    continue
+                upstream_rebuilt = any(dep in rebuilt for dep in stage.deps)
+                if name not in forced and not upstream_rebuilt and stage_is_current(stage, state.get(name)):
+                    report[name] = {"stage": name, "status": "up_to_date", "elapsed_sec": 0.0}
+                    continue
+                if dry_run:
+                    report[name] = {"stage": name, "status": "would_build", "command": stage.command(), "elapsed_sec": 0.0}
+                    rebuilt.add(name)
+                    continue
+                print(f"[pipeline] start {name}", flush=True)
+                input_prints[name] = input_fingerprint(stage)
+                running[executor.submit(run_stage, stage, log_dir)] = name
+            if not running:
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result = future.result()
+                report[name] = result
+                print(f"[pipeline] {result['status']} {name} {result['elapsed_sec']}s", flush=True)
+                if result["status"] != "built":
+                    continue
+                rebuilt.add(name)
+                stage = stages[name]
+                state[name] = {
+                    "input_fingerprint": input_prints[name],
+                    "output_fingerprint": output_fingerprint(stage),
+                    "finished_at": now(),
+                    "elapsed_sec": result["elapsed_sec"],
+                }
+                save_state(state_path, state)
+
+    return {
+        "state_path": str(state_path),
+        "elapsed_sec": round(time.monotonic() - started, 1),
+        "stages": [report[name] for name in targets if name in report],
+    }
+
+
+def format_timing_report(result: Dict[str, Any]) -> str:
+    lines = [f"[pipeline] total={result['elapsed_sec']}s state={result['state_path']}"]
+    for item in result["stages"]:
+        lines.append(f"  {item['stage']:<9} {item['status']:<11} {item['elapsed_sec']:>8.1f}s")
+    return "\n".join(lines)
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Rebuild the A4 evidence -> minimal -> index -> units/packs chain, skipping up-to-date stages."
+    )
+    parser.add_argument("--inbox", default=str(DEFAULT_INBOX))
+    parser.add_argument("--evidence-db", default=str(DEFAULT_EVIDENCE_DB))
+    parser.add_argument("--minimal-dir", default=str(DEFAULT_MINIMAL_DIR))
+    parser.add_argument("--index-dir", default=str(DEFAULT_INDEX_DIR))
+    parser.add_argument("--log-dir", default=str(DEFAULT_LOG_DIR))
+    parser.add_argument("--state", default="", help="State JSON path. Defaults to <index-dir>/build_pipeline_state.json.")
+    parser.add_argument("--only", action="append", default=[], choices=STAGE_ORDER, help="Run only these stages. May be repeated.")
+    parser.add_argument("--force", action="append", default=[], choices=STAGE_ORDER, help="Rebuild a stage even if up to date.")
+    parser.add_argument("--jobs", type=int, default=2, help="Independent stages to run concurrently.")
+    parser.add_argument("--minimal-limit", type=int, default=30000)
+    parser.add_argument("--model", default="qwen3:14b")
+    parser.add_argument("--tokenizer", choices=TOKENIZERS, default=DEFAULT_TOKENIZER, help="FTS tokenization for the index, units and packs stages.")
+    parser.add_argument("--dense-encoder", choices=["hash", "sbert"], default="hash", help="Encoder for the dense units index.")
+    parser.add_argument("--evidence-only", action="store_true", help="Pass --evidence-only to the pack index build.")
+    parser.add_argument("--dry-run", action="store_true", help="Report which stages would run without running them.")
+    parser.add_argument("--json", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    stages = build_stages(args)
+    state_path = Path(args.state) if args.state else Path(args.index_dir) / STATE_FILENAME
+    result = run_pipeline(
+        stages,
+        state_path=state_path,
+        log_dir=Path(args.log_dir),
+        only=args.only,
+        force=args.force,
+        jobs=args.jobs,
+        dry_run=args.dry_run,
+    )
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(format_timing_report(result))
+    if any(item["status"] == "failed" for item in result["stages"]):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
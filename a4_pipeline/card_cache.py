@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+from metrics import REGISTRY, stats_samples
+
+
+DEFAULT_CACHE_SIZE = int(os.environ.get("A4_CARD_CACHE_SIZE", "20000"))
+
+
+def load_json_list(value: Any) -> Any:
+    try:
+        return json.loads(value or "[]")
+    except Exception:
+        return []
+
+
+class DecodedRow:
+    """Decoded *_json columns of one index row. Shared across queries; treat as read-only."""
+
+    __slots__ = ("names", "values")
+
+    def __init__(self, names: Tuple[str, ...], values: Tuple[Any, ...]) -> None:
+        self.names = names
+        self.values = values
+
+    def as_dict(self) -> Dict[str, Any]:
+        # Fresh lists, and fresh dicts inside them (e.g. pack claim dicts), so callers can
+        # slice, reassign or edit an item's fields without touching the cache.
+        return {name: _copy_value(value) for name, value in zip(self.names, self.values)}
+
+
+def _copy_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def decode_json_columns(row: sqlite3.Row, columns: Sequence[str]) -> DecodedRow:
+    names = tuple(column[: -len("_json")] if column.endswith("_json") else column for column in columns)
+    return DecodedRow(names, tuple(load_json_list(row[column]) for column in columns))
+
+
+_profiles = threading.local()
+
+
+@contextmanager
+def decode_profile() -> Iterator[Dict[str, Any]]:
+    """Collect cache hits, misses and decode time for the queries run inside the block."""
+    profile: Dict[str, Any] = {"hits": 0, "misses": 0, "decode_ms": 0.0}
+    active: List[Dict[str, Any]] = _profiles.__dict__.setdefault("active", [])
+    active.append(profile)
+    try:
+        yield profile
+    finally:
+        active.remove(profile)
+        profile["decode_ms"] = round(profile["decode_ms"], 3)
+
+
+def _record(hit: bool, elapsed: float = 0.0) -> None:
+    for profile in getattr(_profiles, "active", []):
+        profile["hits" if hit else "misses"] += 1
+        profile["decode_ms"] += elapsed * 1000.0
+
+
+class DecodedCardCache:
+    """Thread-safe LRU of DecodedRow keyed by (kind, row id, index version)."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._items: OrderedDict[Tuple[str, str, str], DecodedRow] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.decode_sec = 0.0
+
+    def get(self, key: Tuple[str, str, str], decode: Callable[[], DecodedRow]) -> DecodedRow:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+        if item is not None:
+            _record(hit=True)
+            return item
+        started = time.perf_counter()
+        item = decode()
+        elapsed = time.perf_counter() - started
+        _record(hit=False, elapsed=elapsed)
+        with self._lock:
+            self.misses += 1
+            self.decode_sec += elapsed
+            if self.maxsize <= 0:
+                return item
+            self._items[key] = item
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return item
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "decode_ms": round(self.decode_sec * 1000.0, 3),
+            }
+
+
+CARD_CACHE = DecodedCardCache()
+REGISTRY.register_collector(lambda: stats_samples("a4_cache", CARD_CACHE.stats(), ["hits", "misses"], ["size", "hit_rate"], cache="card"))
+
+
+def index_version(con: sqlite3.Connection) -> str:
+    """Build stamp written by the index builders, or the file identity for older indexes."""
+    try:
+        row = con.execute("SELECT value FROM index_meta WHERE key='index_version'").fetchone()
+        if row and row[0]:
+            return str(row[0])
+    except sqlite3.Error:
+        pass
+    try:
+        path = next((item[2] for item in con.execute("PRAGMA database_list") if item[1] == "main"), "")
+        if path:
+            stat = Path(path).stat()
+            return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    except (OSError, sqlite3.Error):
+        pass
+    return ""
+
+
+def cached_decode(kind: str, row_id: str, version: str, row: sqlite3.Row, columns: Sequence[str]) -> Dict[str, Any]:
+    if not version:
+        started = time.perf_counter()
+        decoded = decode_json_columns(row, columns)
+        _record(hit=False, elapsed=time.perf_counter() - started)
+        return decoded.as_dict()
+    return CARD_CACHE.get((kind, row_id, version), lambda: decode_json_columns(row, columns)).as_dict()
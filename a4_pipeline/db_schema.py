@@ -1,6 +1,7 @@
 from __future__ import annotations
 import sqlite3
 from pathlib import Path
+from typing import Any, Dict, List, Sequence
 
 try:
     from config import A4_DB
@@ -161,12 +162,118 @@ def ensure_db() -> Path:
         CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
         """
     )
+    cur.executescript(CHANGE_LOG_SCHEMA)
 
     con.commit()
     con.close()
     return DB_PATH
 
 
+# ---------- change log ----------
+
+# Append-only log of per-patent writes. Every pipeline writer appends a row in the
+# same transaction as its data change; consumers keep a cursor (last seen seq) in
+# change_cursors and read only newer rows instead of rescanning the corpus.
+CHANGE_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    patent_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    version TEXT,
+    changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS change_cursors (
+    consumer TEXT PRIMARY KEY,
+    last_seq INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_log_stage_seq ON change_log (stage, seq);
+CREATE INDEX IF NOT EXISTS idx_change_log_patent ON change_log (patent_id);
+"""
+
+
+def ensure_change_log(con: sqlite3.Connection) -> None:
+    con.executescript(CHANGE_LOG_SCHEMA)
+
+
+def append_change(con: sqlite3.Connection, patent_id: str, stage: str, version: str = "") -> None:
+    """Record a write to patent_id. Does not commit; the caller's transaction does."""
+    con.execute(
+        "INSERT INTO change_log (patent_id, stage, version) VALUES (?, ?, ?)",
+        (patent_id, stage, version),
+    )
+
+
+def latest_change_seq(con: sqlite3.Connection) -> int:
+    row = con.execute("SELECT MAX(seq) FROM change_log").fetchone()
+    return int(row[0] or 0)
+
+
+def read_changes(
+    con: sqlite3.Connection,
+    after_seq: int,
+    stages: Sequence[str] = (),
+    limit: int = 5000,
+) -> List[Dict[str, Any]]:
+    params: List[Any] = [after_seq]
+    where = "seq > ?"
+    if stages:
+        where += f" AND stage IN ({','.join('?' for _ in stages)})"
+        params.extend(stages)
+    rows = con.execute(
+        f"""
+        SELECT seq, patent_id, stage, version, changed_at
+        FROM change_log
+        WHERE {where}
+        ORDER BY seq
+        LIMIT ?
+        """,
+        [*params, limit],
+    ).fetchall()
+    return [
+        {"seq": int(row[0]), "patent_id": row[1], "stage": row[2], "version": row[3], "changed_at": row[4]}
+        for row in rows
+    ]
+
+
+def changed_patent_ids_since(
+    con: sqlite3.Connection,
+    after_seq: int,
+    stages: Sequence[str] = (),
+) -> tuple[List[str], int]:
+    """Return (distinct patent_ids changed after after_seq, new cursor seq)."""
+    patent_ids: Dict[str, None] = {}
+    cursor = after_seq
+    while True:
+        batch = read_changes(con, cursor, stages=stages)
+        if not batch:
+            return list(patent_ids), cursor
+        for change in batch:
+            patent_ids[str(change["patent_id"])] = None
+        cursor = batch[-1]["seq"]
+
+
+def get_cursor(con: sqlite3.Connection, consumer: str) -> int:
+    row = con.execute("SELECT last_seq FROM change_cursors WHERE consumer=?", (consumer,)).fetchone()
+    return int(row[0]) if row else 0
+
+
+def set_cursor(con: sqlite3.Connection, consumer: str, seq: int) -> None:
+    con.execute(
+        """
+        INSERT INTO change_cursors (consumer, last_seq, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(consumer) DO UPDATE SET
+            last_seq=excluded.last_seq,
+            updated_at=CURRENT_TIMESTAMP
+        """,
+        (consumer, seq),
+    )
+    con.commit()
+
+
 # ---------- helper write functions ----------
 
 def reset_patent_artifacts(con: sqlite3.Connection, patent_id: str) -> None:
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # dense retrieval is optional; BM25 keeps working without NumPy
+    np = None  # type: ignore[assignment]
+
+
+# CPU dense index over evidence_units, stored next to the units DB:
+#   <units_db stem>.dense/meta.json     encoder spec, dtype, count, units index_version
+#   <units_db stem>.dense/vectors.npy   (n, dim) float16, or int8 with per-row scales.npy
+#   <units_db stem>.dense/rowids.npy    evidence_units.rowid of each vector row
+# Readers np.load(mmap_mode="r") the matrix and scan it in chunks (brute force), so
+# memory stays flat and the OS page cache keeps the hot part resident.
+#
+# Encoders:
+#   sbert: a local sentence-transformers model (multilingual models bridge a Korean
+#          question and a Chinese claim); loaded on CPU, only if the package is installed.
+#   hash:  dependency-free hashed character 2/3-grams. It does not translate, but it
+#          matches across particles, spacing and CJK runs that whole-token BM25 misses.
+
+DENSE_DIR_SUFFIX = ".dense"
+DEFAULT_ENCODER = "hash"
+DEFAULT_SBERT_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+DEFAULT_HASH_DIM = 512
+HASH_NGRAMS = (2, 3)
+MAX_ENCODE_CHARS = 4000
+SEARCH_CHUNK_ROWS = 65536
+DENSE_ENABLED = os.environ.get("A4_DENSE_RETRIEVAL", "1") != "0"
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def dense_dir_for(units_db: Path) -> Path:
+    units_db = Path(units_db)
+    return units_db.with_name(units_db.stem + DENSE_DIR_SUFFIX)
+
+
+# ---------- encoders ----------
+
+class HashedNgramEncoder:
+    name = "hash"
+
+    def __init__(self, dim: int = DEFAULT_HASH_DIM, ngrams: Sequence[int] = HASH_NGRAMS) -> None:
+        self.dim = int(dim)
+        self.ngrams = tuple(int(n) for n in ngrams)
+
+    def spec(self) -> Dict[str, Any]:
+        return {"encoder": self.name, "dim": self.dim, "ngrams": list(self.ngrams)}
+
+    def _encode_one(self, text: str) -> "np.ndarray":
+        text = re.sub(r"\s+", " ", str(text or "").lower()).strip()[:MAX_ENCODE_CHARS]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        for n in self.ngrams:
+            if len(codes) < n:
+                continue
+            # Polynomial rolling hash of every n-gram at once; uint64 arithmetic wraps.
+            count = len(codes) - n + 1
+            hashes = np.full(count, n, dtype=np.uint64)
+            for offset in range(n):
+                hashes = hashes * np.uint64(1000003) + codes[offset : offset + count]
+            hashes = hashes * np.uint64(0x9E3779B97F4A7C15)
+            buckets = (hashes >> np.uint64(33)) % np.uint64(self.dim)
+            signs = np.where((hashes >> np.uint64(17)) & np.uint64(1), 1.0, -1.0).astype(np.float32)
+            vector += np.bincount(buckets.astype(np.int64), weights=signs, minlength=self.dim).astype(np.float32)
+        # Sublinear term frequency, then unit length so dot product is cosine.
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def encode(self, texts: Sequence[str]) -> "np.ndarray":
+        return np.vstack([self._encode_one(text) for text in texts]) if texts else np.zeros((0, self.dim), dtype=np.float32)
+
+
+class SentenceEncoder:
+    name = "sbert"
+
+    def __init__(self, model_name: str = DEFAULT_SBERT_MODEL, batch_size: int = 32) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+
+    def spec(self) -> Dict[str, Any]:
+        return {"encoder": self.name, "dim": self.dim, "model": self.model_name}
+
+    def encode(self, texts: Sequence[str]) -> "np.ndarray":
+        clipped = [str(text or "")[:MAX_ENCODE_CHARS] for text in texts]
+        vectors = self.model.encode(clipped, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def make_encoder(spec: Dict[str, Any]) -> Any:
+    if spec.get("encoder") == SentenceEncoder.name:
+        return SentenceEncoder(spec.get("model") or DEFAULT_SBERT_MODEL)
+    return HashedNgramEncoder(dim=int(spec.get("dim") or DEFAULT_HASH_DIM), ngrams=spec.get("ngrams") or HASH_NGRAMS)
+
+
+# ---------- search ----------
+
+class DenseUnitIndex:
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.meta: Dict[str, Any] = json.loads((self.directory / "meta.json").read_text(encoding="utf-8"))
+        self.vectors = np.load(self.directory / "vectors.npy", mmap_mode="r")
+        self.rowids = np.load(self.directory / "rowids.npy", mmap_mode="r")
+        scales_path = self.directory / "scales.npy"
+        self.scales = np.load(scales_path, mmap_mode="r") if scales_path.exists() else None
+        self.encoder = make_encoder(self.meta)
+
+    @property
+    def stamp(self) -> str:
+        return str(self.meta.get("built_at", ""))
+
+    def search(self, text: str, k: int) -> List[Tuple[int, float]]:
+        """(evidence_units.rowid, cosine) for the k nearest units, best first."""
+        count = len(self.rowids)
+        if not count or k <= 0 or not str(text or "").strip():
+            return []
+        query = self.encoder.encode([text])[0].astype(np.float32)
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        for start in range(0, count, SEARCH_CHUNK_ROWS):
+            end = min(count, start + SEARCH_CHUNK_ROWS)
+            scores = np.asarray(self.vectors[start:end], dtype=np.float32) @ query
+            if self.scales is not None:
+                scores *= np.asarray(self.scales[start:end], dtype=np.float32)
+            take = min(k, len(scores))
+            top = np.argpartition(-scores, take - 1)[:take]
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_rows = np.concatenate([best_rows, top.astype(np.int64) + start])
+            if len(best_scores) > k:
+                keep = np.argpartition(-best_scores, k - 1)[:k]
+                best_scores, best_rows = best_scores[keep], best_rows[keep]
+        order = np.argsort(-best_scores)
+        return [(int(self.rowids[best_rows[i]]), float(best_scores[i])) for i in order]
+
+
+_LOADED: Dict[str, Tuple[int, Optional[DenseUnitIndex]]] = {}
+_LOAD_LOCK = threading.Lock()
+
+
+def load_dense_index(units_db: Path) -> Optional[DenseUnitIndex]:
+    """Shared memmapped index for units_db, reloaded when meta.json changes; None if unusable."""
+    if np is None or not DENSE_ENABLED:
+        return None
+    meta_path = dense_dir_for(units_db) / "meta.json"
+    try:
+        mtime = meta_path.stat().st_mtime_ns
+    except OSError:
+        return None
+    key = str(meta_path)
+    with _LOAD_LOCK:
+        cached = _LOADED.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            index: Optional[DenseUnitIndex] = DenseUnitIndex(meta_path.parent)
+        except Exception as exc:  # missing encoder package, truncated files
+            print(f"[dense] disabled for {meta_path.parent}: {exc!r}")
+            index = None
+        _LOADED[key] = (mtime, index)
+        return index
+
+
+def connection_path(con: sqlite3.Connection) -> Optional[Path]:
+    for _, name, path in con.execute("PRAGMA database_list").fetchall():
+        if name == "main" and path:
+            return Path(path)
+    return None
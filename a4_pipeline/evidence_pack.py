@@ -6,15 +6,17 @@ import re
 import sqlite3
 import sys
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 CODE_DIR = Path(__file__).resolve().parent
 if str(CODE_DIR) not in sys.path:
     sys.path.insert(0, str(CODE_DIR))
 
 from llm_clients import LLMClient, json_from_text  # noqa: E402
+from metrics import timed  # noqa: E402
 from patent_dictionary_ask import infer_search_query  # noqa: E402
-from patent_dictionary_search import DEFAULT_DB, lookup, search  # noqa: E402
+from patent_dictionary_search import DEFAULT_DB, lookup, lookup_many, search  # noqa: E402
+from patent_id_index import resolve_patent_ids  # noqa: E402
 
 try:
     from build_evidence_units import DEFAULT_UNITS_DB  # noqa: E402
@@ -66,29 +68,65 @@ def needs_title_override(title: Any) -> bool:
     return bool(NOISY_TITLE_RE.search(title))
 
 
-def apply_db_title_overrides(cards: List[Dict[str, Any]], evidence_db: Path) -> List[Dict[str, Any]]:
-    if not cards or not evidence_db.exists():
+def placeholders(values: List[Any]) -> str:
+    return ",".join("?" for _ in values)
+
+
+def fetch_independent_claim_nos(con: sqlite3.Connection, patent_ids: List[str]) -> Dict[str, List[str]]:
+    """patent_id -> independent claim numbers in claim order, for all patent_ids in one query."""
+    if not patent_ids:
+        return {}
+    rows = con.execute(
+        f"""
+        SELECT patent_id, claim_no FROM claims
+        WHERE patent_id IN ({placeholders(patent_ids)}) AND claim_type='independent'
+        ORDER BY patent_id, CAST(claim_no AS INT)
+        """,
+        patent_ids,
+    ).fetchall()
+    out: Dict[str, List[str]] = {}
+    for row in rows:
+        out.setdefault(row[0], []).append(str(row[1]))
+    return out
+
+
+def fetch_db_titles(con: sqlite3.Connection, patent_ids: List[str]) -> Dict[str, Any]:
+    if not patent_ids:
+        return {}
+    rows = con.execute(
+        f"SELECT patent_id, title_raw FROM patents WHERE patent_id IN ({placeholders(patent_ids)})",
+        patent_ids,
+    ).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+def apply_db_title_overrides(
+    cards: List[Dict[str, Any]],
+    evidence_db: Path,
+    con: sqlite3.Connection | None = None,
+) -> List[Dict[str, Any]]:
+    if not cards or (con is None and not evidence_db.exists()):
         return cards
-    con = sqlite3.connect(evidence_db)
+    own_con = con is None
+    con = con or sqlite3.connect(evidence_db)
+    patent_ids = unique_keep_order([card["patent_id"] for card in cards])
+    claim_nos = fetch_independent_claim_nos(con, patent_ids)
+    titles = fetch_db_titles(con, unique_keep_order([card["patent_id"] for card in cards if needs_title_override(card.get("title"))]))
     out: List[Dict[str, Any]] = []
     for card in cards:
         card = dict(card)
-        rows = con.execute(
-            "SELECT claim_no FROM claims WHERE patent_id=? AND claim_type='independent' ORDER BY CAST(claim_no AS INT)",
-            (card["patent_id"],),
-        ).fetchall()
-        if rows:
-            card["independent_claim_nos"] = [str(row[0]) for row in rows]
+        if claim_nos.get(card["patent_id"]):
+            card["independent_claim_nos"] = claim_nos[card["patent_id"]]
         if needs_title_override(card.get("title")):
-            row = con.execute("SELECT title_raw FROM patents WHERE patent_id=? LIMIT 1", (card["patent_id"],)).fetchone()
-            fixed_title = clean_db_title(row[0]) if row else ""
+            fixed_title = clean_db_title(titles.get(card["patent_id"]))
             if fixed_title:
                 old_title = card.get("title", "")
                 card["title"] = fixed_title
                 if needs_title_override(card.get("core_subject")) or card.get("core_subject") == old_title:
                     card["core_subject"] = fixed_title
         out.append(card)
-    con.close()
+    if own_con:
+        con.close()
     return out
 
 
@@ -103,42 +141,7 @@ def fuzzy_lookup_cards(con: sqlite3.Connection, text: str, limit: int) -> List[D
         card = lookup(con, patent_id)
         return [card] if card else []
 
-    fragments = PATENT_NUMBER_RE.findall(text or "")
-    if not fragments:
-        return []
-    lower = (text or "").lower()
-    prefix = ""
-    if "us" in lower or "미국" in lower:
-        prefix = "us"
-    elif "cn" in lower or "중국" in lower:
-        prefix = "cn"
-    elif "kr" in lower or "한국" in lower:
-        prefix = "kr"
-
-    out: List[Dict[str, Any]] = []
-    seen: Set[str] = set()
-    for fragment in fragments:
-        stripped = fragment.lstrip("0") or fragment
-        for pattern in unique_keep_order([f"%{fragment.lower()}%", f"%{stripped.lower()}%"]):
-            params: List[Any] = [pattern]
-            where = "patent_id LIKE ?"
-            if prefix:
-                where += " AND patent_id LIKE ?"
-                params.append(f"{prefix}%")
-            rows = con.execute(
-                f"SELECT patent_id FROM minimal_index WHERE {where} ORDER BY length(patent_id), patent_id LIMIT ?",
-                [*params, limit],
-            ).fetchall()
-            for (candidate_id,) in rows:
-                if candidate_id in seen:
-                    continue
-                card = lookup(con, candidate_id)
-                if card:
-                    seen.add(candidate_id)
-                    out.append(card)
-                if len(out) >= limit:
-                    return out
-    return out
+    return lookup_many(con, resolve_patent_ids(con, text, limit))
 
 
 def fallback_plan(question: str, limit: int) -> Dict[str, Any]:
@@ -213,8 +216,13 @@ def compact_card(card: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def retrieve_cards(plan: Dict[str, Any], index_db: Path = DEFAULT_DB) -> List[Dict[str, Any]]:
-    con = sqlite3.connect(index_db)
+def retrieve_cards(
+    plan: Dict[str, Any],
+    index_db: Path = DEFAULT_DB,
+    con: sqlite3.Connection | None = None,
+) -> List[Dict[str, Any]]:
+    own_con = con is None
+    con = con or sqlite3.connect(index_db)
     cards: List[Dict[str, Any]] = []
     seen: Set[str] = set()
     limit = int(plan.get("max_results") or 8)
@@ -240,7 +248,8 @@ def retrieve_cards(plan: Dict[str, Any], index_db: Path = DEFAULT_DB) -> List[Di
         if len(cards) >= limit:
             break
 
-    con.close()
+    if own_con:
+        con.close()
     return cards[:limit]
 
 
@@ -264,37 +273,73 @@ def evidence_ids_to_fig_nos(card: Dict[str, Any]) -> List[str]:
 
 
 def fetch_evidence_for_card(con: sqlite3.Connection, card: Dict[str, Any]) -> Dict[str, Any]:
-    patent_id = card["patent_id"]
-    out: Dict[str, Any] = {"patent_id": patent_id, "claims": [], "figures": []}
-
-    for claim_no in evidence_ids_to_claim_nos(card):
-        row = con.execute(
-            "SELECT claim_no, claim_type, raw_text, norm_text, page_start, page_end FROM claims WHERE patent_id=? AND claim_no=?",
-            (patent_id, claim_no),
-        ).fetchone()
-        if row:
-            out["claims"].append({
-                "claim_no": row[0],
-                "claim_type": row[1],
-                "text": clip(row[2] or row[3], 1200),
-                "page_start": row[4],
-                "page_end": row[5],
-            })
+    return fetch_evidence_for_cards(con, [card])[0]
+
 
-    for fig_no in evidence_ids_to_fig_nos(card):
+def fetch_evidence_for_cards(con: sqlite3.Connection, cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Claim and figure evidence for every card: one claims query and one figures query in total."""
+    claim_keys = [(card["patent_id"], claim_no) for card in cards for claim_no in evidence_ids_to_claim_nos(card)]
+    fig_keys = [(card["patent_id"], fig_no) for card in cards for fig_no in evidence_ids_to_fig_nos(card)]
+
+    claims: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    if claim_keys:
+        rows = con.execute(
+            f"""
+            SELECT patent_id, claim_no, claim_type, raw_text, norm_text, page_start, page_end FROM claims
+            WHERE (patent_id, claim_no) IN (VALUES {",".join("(?, ?)" for _ in claim_keys)})
+            """,
+            [value for key in claim_keys for value in key],
+        ).fetchall()
+        for row in rows:
+            claims[(row[0], str(row[1]))] = {
+                "claim_no": row[1],
+                "claim_type": row[2],
+                "text": clip(row[3] or row[4], 1200),
+                "page_start": row[5],
+                "page_end": row[6],
+            }
+
+    figures: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    if fig_keys:
         rows = con.execute(
-            "SELECT figure_no, caption_raw, caption_norm, page_no FROM figure_captions WHERE patent_id=? AND figure_no=? LIMIT 3",
-            (patent_id, fig_no),
+            f"""
+            SELECT patent_id, figure_no, caption_raw, caption_norm, page_no FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY patent_id, figure_no ORDER BY id) AS figure_rank
+                FROM figure_captions
+                WHERE (patent_id, figure_no) IN (VALUES {",".join("(?, ?)" for _ in fig_keys)})
+            )
+            WHERE figure_rank <= 3
+            ORDER BY patent_id, figure_no, figure_rank
+            """,
+            [value for key in fig_keys for value in key],
         ).fetchall()
         for row in rows:
-            out["figures"].append({
-                "figure_no": row[0],
-                "caption": clip(row[1] or row[2], 400),
-                "page_no": row[3],
+            figures.setdefault((row[0], str(row[1])), []).append({
+                "figure_no": row[1],
+                "caption": clip(row[2] or row[3], 400),
+                "page_no": row[4],
             })
+
+    out: List[Dict[str, Any]] = []
+    for card in cards:
+        patent_id = card["patent_id"]
+        out.append({
+            "patent_id": patent_id,
+            "claims": [
+                claims[(patent_id, claim_no)]
+                for claim_no in evidence_ids_to_claim_nos(card)
+                if (patent_id, claim_no) in claims
+            ],
+            "figures": [
+                figure
+                for fig_no in evidence_ids_to_fig_nos(card)
+                for figure in figures.get((patent_id, fig_no), [])
+            ],
+        })
     return out
 
 
+@timed("build_evidence_pack")
 def build_evidence_pack(
     question: str,
     planner_client: Optional[LLMClient] = None,
@@ -302,11 +347,22 @@ def build_evidence_pack(
     evidence_db: Path = DEFAULT_EVIDENCE_DB,
     units_db: Path = DEFAULT_UNITS_DB,
     limit: int = 8,
+    index_con: sqlite3.Connection | None = None,
+    units_con: sqlite3.Connection | None = None,
+    evidence_con: sqlite3.Connection | None = None,
 ) -> Dict[str, Any]:
     plan = make_query_plan(question, planner_client, limit=limit)
-    if rank_evidence is not None and Path(units_db).exists():
-        ranked = rank_evidence(question, plan, index_db=Path(index_db), units_db=Path(units_db), limit=limit)
-        cards = apply_db_title_overrides([item["card"] for item in ranked], Path(evidence_db))
+    if rank_evidence is not None and (units_con is not None or Path(units_db).exists()):
+        ranked = rank_evidence(
+            question,
+            plan,
+            index_db=Path(index_db),
+            units_db=Path(units_db),
+            limit=limit,
+            index_con=index_con,
+            units_con=units_con,
+        )
+        cards = apply_db_title_overrides([item["card"] for item in ranked], Path(evidence_db), con=evidence_con)
         for item, card in zip(ranked, cards):
             item["card"] = card
             item["weaknesses"] = [
@@ -323,6 +379,7 @@ def build_evidence_pack(
                     "why_selected": item["why_selected"],
                     "weaknesses": item["weaknesses"],
                     "top_units": item["top_units"],
+                    **{key: item[key] for key in ("family_siblings", "family_size") if key in item},
                 }
                 for item in ranked
             ],
@@ -338,12 +395,13 @@ def build_evidence_pack(
             "limits": {"max_results": limit, "claim_chars": 1200, "reranker": "evidence_units"},
         }
 
-    cards = apply_db_title_overrides(retrieve_cards(plan, index_db=index_db), Path(evidence_db))
+    cards = apply_db_title_overrides(retrieve_cards(plan, index_db=index_db, con=index_con), Path(evidence_db), con=evidence_con)
     evidence: List[Dict[str, Any]] = []
-    if evidence_db.exists():
+    if evidence_con is not None:
+        evidence = fetch_evidence_for_cards(evidence_con, cards)
+    elif evidence_db.exists():
         con = sqlite3.connect(evidence_db)
-        for card in cards:
-            evidence.append(fetch_evidence_for_card(con, card))
+        evidence = fetch_evidence_for_cards(con, cards)
         con.close()
     return {
         "question": question,
@@ -3,12 +3,20 @@ from __future__ import annotations
 import argparse
 import json
 import math
+import os
 import re
 import sqlite3
 import sys
-from collections import defaultdict
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Set, Tuple
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # score_units falls back to the per-unit scorer
+    np = None  # type: ignore[assignment]
 
 
 CODE_DIR = Path(__file__).resolve().parent
@@ -16,25 +24,28 @@ if str(CODE_DIR) not in sys.path:
     sys.path.insert(0, str(CODE_DIR))
 
 from build_evidence_units import DEFAULT_UNITS_DB  # noqa: E402
-from patent_dictionary_search import DEFAULT_DB, expand_query, lookup, search  # noqa: E402
+from card_cache import DecodedCardCache, DecodedRow, cached_decode, decode_profile, index_version  # noqa: E402
+from dense_index import DenseUnitIndex, connection_path, load_dense_index  # noqa: E402
+from family_index import collapse_families, family_fields, family_map  # noqa: E402
+from fts_index import DEFAULT_TOKENIZER, match_expression, read_fts_tokenizer  # noqa: E402
+from metrics import timed  # noqa: E402
+from patent_dictionary_search import DEFAULT_DB, expand_query, lookup_many, search  # noqa: E402
+from patent_id_index import resolve_keys, value_keys  # noqa: E402
+from query_aliases import AliasMatcher, alias_matcher  # noqa: E402
+from query_cache import QUERY_CACHE, freeze, normalize_query  # noqa: E402
 
 
 TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9_+-]{2,}|[가-힣]{2,}|[\u4e00-\u9fff]{2,}")
 NOISY_TITLE_RE = re.compile(r"(onfrouler|g1iic|ceeee|wees|o\.\.|frorn|vaive)", re.I)
 GENERIC_TITLE_RE = re.compile(r"^(memory device|memory system|method|system|device|program operation memory)$", re.I)
+RRF_K = 60
+DENSE_MIN_SIMILARITY = 0.1
 
 
 def normalize_ws(value: Any) -> str:
     return re.sub(r"\s+", " ", str(value or "")).strip()
 
 
-def load_json(value: Any) -> Any:
-    try:
-        return json.loads(value or "[]")
-    except Exception:
-        return []
-
-
 def unique_keep_order(items: Iterable[str]) -> List[str]:
     out: List[str] = []
     seen: Set[str] = set()
@@ -46,13 +57,13 @@ def unique_keep_order(items: Iterable[str]) -> List[str]:
     return out
 
 
-def query_terms(question: str, plan: Dict[str, Any]) -> List[str]:
+def query_terms(question: str, plan: Dict[str, Any], aliases: AliasMatcher | None = None) -> List[str]:
     values: List[str] = [question]
     values.extend([str(x) for x in plan.get("search_queries", []) or []])
     values.extend([str(x) for x in plan.get("labels", []) or []])
     expanded: List[str] = []
     for value in values:
-        expanded.extend(expand_query(value))
+        expanded.extend(expand_query(value, aliases))
         expanded.extend(TOKEN_RE.findall(value.lower()))
     stop = {
         "관련", "특허", "후보", "비교", "정리", "알려줘", "대해서", "기술",
@@ -61,15 +72,15 @@ def query_terms(question: str, plan: Dict[str, Any]) -> List[str]:
     return [x for x in unique_keep_order(expanded) if x.lower() not in stop and len(x) >= 2][:40]
 
 
-def fts_query_for_terms(terms: List[str]) -> str:
-    phrases = []
-    for term in terms[:16]:
-        escaped = term.replace('"', '""')
-        phrases.append(f'"{escaped}"')
-    return " OR ".join(phrases)
+def fts_query_for_terms(terms: List[str], tokenizer: str = DEFAULT_TOKENIZER) -> str:
+    return match_expression(terms, tokenizer, max_terms=16)
+
 
+UNIT_JSON_COLUMNS = ("quality_flags_json", "minimal_labels_json", "minimal_elements_json", "qc_flags_json")
 
-def row_to_unit(row: sqlite3.Row) -> Dict[str, Any]:
+
+def row_to_unit(row: sqlite3.Row, version: str = "") -> Dict[str, Any]:
+    decoded = cached_decode("unit", row["unit_id"], version, row, UNIT_JSON_COLUMNS)
     return {
         "unit_id": row["unit_id"],
         "patent_id": row["patent_id"],
@@ -82,33 +93,21 @@ def row_to_unit(row: sqlite3.Row) -> Dict[str, Any]:
         "page_no": row["page_no"],
         "text": row["text"],
         "source_weight": float(row["source_weight"] or 1.0),
-        "quality_flags": load_json(row["quality_flags_json"]),
-        "minimal_labels": load_json(row["minimal_labels_json"]),
-        "minimal_elements": load_json(row["minimal_elements_json"]),
+        "quality_flags": decoded["quality_flags"],
+        "minimal_labels": decoded["minimal_labels"],
+        "minimal_elements": decoded["minimal_elements"],
         "title_source": row["title_source"],
         "primary_claim_type": row["primary_claim_type"],
         "confidence": float(row["confidence"] or 0.0),
-        "qc_flags": load_json(row["qc_flags_json"]),
+        "qc_flags": decoded["qc_flags"],
         "bm25": row["bm25"] if "bm25" in row.keys() else None,
     }
 
 
-def candidate_cards(plan: Dict[str, Any], index_db: Path, limit: int) -> Dict[str, Dict[str, Any]]:
-    con = sqlite3.connect(index_db)
+def candidate_cards(con: sqlite3.Connection, plan: Dict[str, Any], limit: int) -> Dict[str, Dict[str, Any]]:
     cards: Dict[str, Dict[str, Any]] = {}
-    patent_numbers = [str(x) for x in plan.get("patent_numbers", []) or []]
-    for value in patent_numbers:
-        exact = lookup(con, value.lower())
-        if exact:
-            cards[exact["patent_id"]] = exact
-        rows = con.execute(
-            "SELECT patent_id FROM minimal_index WHERE patent_id LIKE ? LIMIT ?",
-            (f"%{value.lstrip('0') or value.lower()}%", limit),
-        ).fetchall()
-        for (patent_id,) in rows:
-            card = lookup(con, patent_id)
-            if card:
-                cards[patent_id] = card
+    for card in lookup_many(con, plan_patent_ids(con, plan, limit)):
+        cards[card["patent_id"]] = card
 
     language = ""
     languages = plan.get("languages") if isinstance(plan.get("languages"), list) else []
@@ -119,90 +118,148 @@ def candidate_cards(plan: Dict[str, Any], index_db: Path, limit: int) -> Dict[st
             cards.setdefault(card["patent_id"], card)
             if len(cards) >= limit * 4:
                 break
-    con.close()
     return cards
 
 
-def patent_number_candidate_ids(plan: Dict[str, Any], index_db: Path, limit: int) -> List[str]:
-    con = sqlite3.connect(index_db)
-    out: List[str] = []
-    seen: Set[str] = set()
-    for value in [str(x).strip().lower() for x in plan.get("patent_numbers", []) or []]:
-        if not value:
-            continue
-        exact = lookup(con, value)
-        if exact and exact["patent_id"] not in seen:
-            out.append(exact["patent_id"])
-            seen.add(exact["patent_id"])
-        fragments = unique_keep_order([value, value.lstrip("0") or value])
-        for fragment in fragments:
-            rows = con.execute(
-                """
-                SELECT patent_id
-                FROM minimal_index
-                WHERE patent_id LIKE ?
-                ORDER BY length(patent_id), patent_id
-                LIMIT ?
-                """,
-                (f"%{fragment}%", limit),
-            ).fetchall()
-            for (patent_id,) in rows:
-                if patent_id not in seen:
-                    out.append(patent_id)
-                    seen.add(patent_id)
-                if len(out) >= limit:
-                    con.close()
-                    return out
-    con.close()
-    return out
+def plan_patent_ids(con: sqlite3.Connection, plan: Dict[str, Any], limit: int) -> List[str]:
+    keys = [key for value in plan.get("patent_numbers", []) or [] for key in value_keys(str(value).strip())]
+    return resolve_keys(con, keys, limit)
 
 
 def fetch_units_by_fts(units_con: sqlite3.Connection, terms: List[str], limit: int) -> List[Dict[str, Any]]:
-    match = fts_query_for_terms(terms)
+    match = fts_query_for_terms(terms, read_fts_tokenizer(units_con))
     if not match:
         return []
     units_con.row_factory = sqlite3.Row
     sql = """
         SELECT eu.*, bm25(evidence_units_fts) AS bm25
         FROM evidence_units_fts fts
-        JOIN evidence_units eu ON eu.unit_id = fts.unit_id
+        JOIN evidence_units eu ON eu.rowid = fts.rowid
         WHERE evidence_units_fts MATCH ?
         ORDER BY bm25(evidence_units_fts) ASC, eu.source_weight DESC
         LIMIT ?
     """
-    return [row_to_unit(row) for row in units_con.execute(sql, (match, limit)).fetchall()]
+    version = index_version(units_con)
+    return [row_to_unit(row, version) for row in units_con.execute(sql, (match, limit)).fetchall()]
 
 
-def fetch_units_for_patents(units_con: sqlite3.Connection, patent_ids: Iterable[str], limit_per_patent: int = 10) -> List[Dict[str, Any]]:
+def units_dense_index(units_con: sqlite3.Connection) -> DenseUnitIndex | None:
+    """Dense index built from this exact units DB, or None (missing, stale, no NumPy)."""
+    path = connection_path(units_con)
+    dense = load_dense_index(path) if path else None
+    if dense is None or dense.meta.get("units_index_version") != index_version(units_con):
+        return None
+    return dense
+
+
+def fetch_units_by_dense(units_con: sqlite3.Connection, text: str, limit: int) -> List[Dict[str, Any]]:
+    dense = units_dense_index(units_con)
+    if dense is None:
+        return []
+    hits = dense.search(text, limit)
+    if not hits:
+        return []
     units_con.row_factory = sqlite3.Row
+    rows = units_con.execute(
+        f"SELECT rowid AS unit_rowid, * FROM evidence_units WHERE rowid IN ({','.join('?' for _ in hits)})",
+        [rowid for rowid, _ in hits],
+    ).fetchall()
+    by_rowid = {row["unit_rowid"]: row for row in rows}
+    version = index_version(units_con)
     out: List[Dict[str, Any]] = []
-    for patent_id in patent_ids:
-        rows = units_con.execute(
-            """
-            SELECT *, 0.0 AS bm25
-            FROM evidence_units
-            WHERE patent_id=?
-            ORDER BY
-                CASE unit_type WHEN 'claim' THEN 0 WHEN 'minimal_summary' THEN 1 WHEN 'title' THEN 2 ELSE 3 END,
-                is_independent_claim DESC,
-                source_weight DESC
-            LIMIT ?
-            """,
-            (patent_id, limit_per_patent),
-        ).fetchall()
-        out.extend(row_to_unit(row) for row in rows)
+    for rowid, similarity in hits:
+        row = by_rowid.get(rowid)
+        if row is None or similarity < DENSE_MIN_SIMILARITY:
+            continue
+        unit = row_to_unit(row, version)
+        unit["dense_score"] = round(similarity, 4)
+        out.append(unit)
     return out
 
 
-def score_unit(unit: Dict[str, Any], terms: List[str]) -> Tuple[float, List[str], List[str]]:
-    text = " ".join(
+def fuse_rrf(ranked_lists: Iterable[List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+    """Reciprocal-rank fusion of unit lists; keeps bm25 and dense_score from every list."""
+    fused: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = defaultdict(float)
+    for units in ranked_lists:
+        for rank, unit in enumerate(units, 1):
+            unit_id = unit["unit_id"]
+            scores[unit_id] += 1.0 / (RRF_K + rank)
+            if unit_id not in fused:
+                fused[unit_id] = unit
+            else:
+                for key in ("bm25", "dense_score"):
+                    if fused[unit_id].get(key) is None and unit.get(key) is not None:
+                        fused[unit_id][key] = unit[key]
+    ordered = sorted(fused, key=lambda unit_id: scores[unit_id], reverse=True)[:limit]
+    out = []
+    for unit_id in ordered:
+        unit = fused[unit_id]
+        unit["rrf"] = round(scores[unit_id], 5)
+        out.append(unit)
+    return out
+
+
+def fetch_units_hybrid(units_con: sqlite3.Connection, question: str, plan: Dict[str, Any], terms: List[str], limit: int) -> List[Dict[str, Any]]:
+    lexical = fetch_units_by_fts(units_con, terms, limit=limit)
+    dense_text = " ".join(unique_keep_order([question, *[str(q) for q in plan.get("search_queries", []) or []]]))
+    semantic = fetch_units_by_dense(units_con, dense_text, limit=limit)
+    if not semantic:
+        return lexical
+    return fuse_rrf([lexical, semantic], limit=limit)
+
+
+def fetch_units_for_patents(units_con: sqlite3.Connection, patent_ids: Iterable[str], limit_per_patent: int = 10) -> List[Dict[str, Any]]:
+    """Best units of every patent in one query (top limit_per_patent per patent, grouped in patent_ids order)."""
+    patent_ids = list(dict.fromkeys(patent_ids))
+    if not patent_ids:
+        return []
+    units_con.row_factory = sqlite3.Row
+    rows = units_con.execute(
+        f"""
+        SELECT * FROM (
+            SELECT *, 0.0 AS bm25,
+                ROW_NUMBER() OVER (
+                    PARTITION BY patent_id
+                    ORDER BY
+                        CASE unit_type WHEN 'claim' THEN 0 WHEN 'minimal_summary' THEN 1 WHEN 'title' THEN 2 ELSE 3 END,
+                        is_independent_claim DESC,
+                        source_weight DESC
+                ) AS patent_rank
+            FROM evidence_units
+            WHERE patent_id IN ({','.join('?' for _ in patent_ids)})
+        )
+        WHERE patent_rank <= ?
+        ORDER BY patent_id, patent_rank
+        """,
+        [*patent_ids, limit_per_patent],
+    ).fetchall()
+    version = index_version(units_con)
+    by_patent: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        by_patent[row["patent_id"]].append(row_to_unit(row, version))
+    return [unit for patent_id in patent_ids for unit in by_patent.get(patent_id, [])]
+
+
+def unit_search_text(unit: Dict[str, Any]) -> str:
+    return " ".join(
         [
-            unit.get("text", ""),
+            unit.get("text", "") or "",
             " ".join(unit.get("minimal_labels", [])),
             " ".join(unit.get("minimal_elements", [])),
-            unit.get("title_source", ""),
+            unit.get("title_source", "") or "",
         ]
     ).lower()
+
+
+@lru_cache(maxsize=16384)
+def title_features(title: str) -> Tuple[bool, bool]:
+    """(noisy, generic) for a patent title; every unit of a patent shares its title."""
+    return bool(NOISY_TITLE_RE.search(title)), bool(GENERIC_TITLE_RE.search(title))
+
+
+def score_unit(unit: Dict[str, Any], terms: List[str]) -> Tuple[float, List[str], List[str]]:
+    text = unit_search_text(unit)
     why: List[str] = []
     weaknesses: List[str] = []
     hits = [term for term in terms if term.lower() in text]
@@ -234,6 +291,11 @@ def score_unit(unit: Dict[str, Any], terms: List[str]) -> Tuple[float, List[str]
             score += max(0.0, min(2.0, -float(bm25) / 4.0))
         except Exception:
             pass
+    dense_score = unit.get("dense_score")
+    if dense_score is not None:
+        score += max(0.0, min(1.5, (float(dense_score) - 0.2) * 3.0))
+        if not hits:
+            why.append(f"{unit['unit_ref']} is semantically similar (cosine {float(dense_score):.2f})")
     score += unit.get("source_weight", 1.0) * 0.4
     score += min(0.8, max(0.0, unit.get("confidence", 0.0) - 0.5))
 
@@ -248,11 +310,11 @@ def score_unit(unit: Dict[str, Any], terms: List[str]) -> Tuple[float, List[str]
     if qc_flags:
         score -= 0.8 * len(qc_flags)
         weaknesses.append("minimal QC flags: " + ", ".join(qc_flags))
-    title = unit.get("title_source", "")
-    if NOISY_TITLE_RE.search(title):
+    noisy_title, generic_title = title_features(unit.get("title_source", "") or "")
+    if noisy_title:
         score -= 1.0
         weaknesses.append("title appears OCR-noisy")
-    if GENERIC_TITLE_RE.search(title):
+    if generic_title:
         score -= 0.4
         weaknesses.append("title/core subject appears generic")
     if not hits:
@@ -261,6 +323,160 @@ def score_unit(unit: Dict[str, Any], terms: List[str]) -> Tuple[float, List[str]
     return score, why, weaknesses
 
 
+# Per-unit features that do not depend on the query, in score_units column order:
+# claim, dependent-like claim, independent claim, summary, figure, source_weight,
+# confidence, #quality flags, publication_line_only, short_claim_text, #qc flags,
+# noisy title, generic title.
+STATIC_FEATURES = 13
+UNIT_FEATURE_CACHE = DecodedCardCache(maxsize=int(os.environ.get("A4_UNIT_FEATURE_CACHE_SIZE", "50000")))
+# Term hits are memoized per cached unit as two bitsets (terms tested, terms found) over a
+# process-wide term registry, the same int bitmaps facet_index uses. A term is searched for
+# in a unit's text once per units index version; later queries that repeat it (alias
+# expansions and common words do) pay one AND + popcount per unit instead of a text scan.
+MAX_MEMO_TERMS = int(os.environ.get("A4_TERM_MEMO_SIZE", "4096"))
+
+
+class TermHitMemo:
+    """(registry generation, tested bits, found bits) of one unit text, replaced as one tuple."""
+
+    __slots__ = ("state",)
+
+    def __init__(self) -> None:
+        self.state: Tuple[int, int, int] = (-1, 0, 0)
+
+
+class TermRegistry:
+    """Bit position of every memoized term; cleared (new generation) when it reaches max_terms."""
+
+    def __init__(self, max_terms: int = MAX_MEMO_TERMS) -> None:
+        self.max_terms = max(64, max_terms)
+        self.generation = 0
+        self._bits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bits(self, needles: Sequence[str]) -> Tuple[int, Dict[str, int]]:
+        with self._lock:
+            new = [needle for needle in needles if needle not in self._bits]
+            if len(self._bits) + len(new) > self.max_terms:
+                # Bit positions are reused from here on; memos of older generations read as empty.
+                self._bits.clear()
+                self.generation += 1
+            for needle in needles:
+                self._bits.setdefault(needle, len(self._bits))
+            return self.generation, {needle: self._bits[needle] for needle in needles}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bits.clear()
+            self.generation += 1
+
+
+TERM_REGISTRY = TermRegistry()
+
+
+def unit_static_features(unit: Dict[str, Any]) -> DecodedRow:
+    flags = unit.get("quality_flags", [])
+    unit_type = unit["unit_type"]
+    dependent_like = "dependent_claim_reference" in flags or unit.get("claim_type") == "dependent_inferred"
+    independent = bool(unit.get("is_independent_claim")) and not dependent_like
+    noisy_title, generic_title = title_features(unit.get("title_source", "") or "")
+    features = (
+        float(unit_type == "claim"),
+        float(unit_type == "claim" and dependent_like and not independent),
+        float(independent),
+        float(unit_type == "minimal_summary"),
+        float(unit_type == "figure"),
+        float(unit.get("source_weight", 1.0)),
+        float(unit.get("confidence", 0.0)),
+        float(len(flags)),
+        float("publication_line_only" in flags),
+        float("short_claim_text" in flags),
+        float(len(unit.get("qc_flags", []))),
+        float(noisy_title),
+        float(generic_title),
+    )
+    return DecodedRow(("text", "features", "term_hits"), (unit_search_text(unit), features, TermHitMemo()))
+
+
+def cached_static_features(unit: Dict[str, Any], version: str) -> DecodedRow:
+    if not version:
+        return unit_static_features(unit)
+    return UNIT_FEATURE_CACHE.get(("unit_features", unit["unit_id"], version), lambda: unit_static_features(unit))
+
+
+def term_hit_counts(texts: Sequence[str], terms: Sequence[str], memos: Sequence[TermHitMemo] | None = None) -> "np.ndarray":
+    """Number of terms found in each text (the term-hit matrix summed per row).
+    With memos (one per text, kept with the cached unit), each (unit, term) pair is searched
+    for at most once; only the terms a unit has not been tested against touch its text."""
+    if memos is None:
+        counts = np.zeros(len(texts), dtype=np.float64)
+        for term in terms:
+            needle = term.lower()
+            counts += np.fromiter((needle in text for text in texts), dtype=np.float64, count=len(texts))
+        return counts
+    # Terms that lowercase alike each count, as in score_unit: weight bits by multiplicity.
+    multiplicity = Counter(term.lower() for term in terms)
+    generation, positions = TERM_REGISTRY.bits(list(multiplicity))
+    needle_bits = [(needle, 1 << positions[needle]) for needle in multiplicity]
+    query_mask = 0
+    weighted: Dict[int, int] = defaultdict(int)
+    for needle, bit in needle_bits:
+        query_mask |= bit
+        weighted[multiplicity[needle]] |= bit
+    out: List[int] = []
+    for text, memo in zip(texts, memos):
+        memo_generation, tested, found = memo.state
+        if memo_generation != generation:
+            tested = found = 0
+        missing = query_mask & ~tested
+        if missing:
+            for needle, bit in needle_bits:
+                if missing & bit and needle in text:
+                    found |= bit
+            memo.state = (generation, tested | missing, found)
+        out.append(sum(weight * (found & mask).bit_count() for weight, mask in weighted.items()))
+    return np.array(out, dtype=np.float64)
+
+
+def score_units(units: Sequence[Dict[str, Any]], terms: List[str], version: str = "") -> List[float]:
+    """Scores identical to score_unit, computed for all units at once with array ops.
+    Query-independent features are cached per (unit_id, units index version);
+    explanations are left to score_unit for the few units that are shown."""
+    if np is None:
+        return [score_unit(unit, terms)[0] for unit in units]
+    if not units:
+        return []
+    static = [cached_static_features(unit, version).values for unit in units]
+    texts = [row[0] for row in static]
+    features = np.array([row[1] for row in static], dtype=np.float64).reshape(len(units), STATIC_FEATURES)
+    # Uncached rows are built for this call only, so memoizing their hits would not pay.
+    memos = [row[2] for row in static] if version else None
+    (
+        is_claim, dependent_claim, independent, is_summary, is_figure, source_weight, confidence,
+        quality_count, publication_only, short_claim, qc_count, noisy_title, generic_title,
+    ) = features.T
+    bm25 = np.array([_float_or_nan(unit.get("bm25")) for unit in units], dtype=np.float64)
+    dense = np.array([_float_or_nan(unit.get("dense_score")) for unit in units], dtype=np.float64)
+
+    score = np.minimum(5.0, term_hit_counts(texts, terms, memos) * 0.7)
+    score += 2.0 * is_claim + 1.4 * independent - 1.6 * dependent_claim
+    score += 0.7 * is_summary - 0.5 * is_figure
+    score += np.where(np.isnan(bm25), 0.0, np.clip(-np.nan_to_num(bm25) / 4.0, 0.0, 2.0))
+    score += np.where(np.isnan(dense), 0.0, np.clip((np.nan_to_num(dense) - 0.2) * 3.0, 0.0, 1.5))
+    score += 0.4 * source_weight + np.clip(confidence - 0.5, 0.0, 0.8)
+    score -= 0.6 * quality_count + 2.0 * publication_only + 1.2 * short_claim + 0.8 * qc_count
+    score -= 1.0 * noisy_title + 0.4 * generic_title
+    return score.tolist()
+
+
+def _float_or_nan(value: Any) -> float:
+    try:
+        return float(value) if value is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+@timed("rank_evidence")
 def rank_evidence(
     question: str,
     plan: Dict[str, Any],
@@ -268,37 +484,74 @@ def rank_evidence(
     units_db: Path = DEFAULT_UNITS_DB,
     limit: int = 8,
     units_per_patent: int = 4,
+    index_con: sqlite3.Connection | None = None,
+    units_con: sqlite3.Connection | None = None,
 ) -> List[Dict[str, Any]]:
-    terms = query_terms(question, plan)
-    direct_patent_ids = patent_number_candidate_ids(plan, index_db=index_db, limit=limit)
-    cards = candidate_cards(plan, index_db=index_db, limit=limit)
+    """Connections passed in (e.g. by RetrievalService) are reused and left open."""
+    own_index = index_con is None
+    own_units = units_con is None
+    index_con = index_con or sqlite3.connect(index_db)
+    units_con = units_con or sqlite3.connect(units_db)
+    try:
+        index_stamp, units_stamp = index_version(index_con), index_version(units_con)
+        dense = units_dense_index(units_con)
+        version = f"{index_stamp}|{units_stamp}|{dense.stamp if dense else ''}" if index_stamp and units_stamp else ""
+        return QUERY_CACHE.get_or_compute(
+            "rank",
+            version,
+            (normalize_query(question), freeze(plan), limit, units_per_patent),
+            lambda: _rank_evidence(question, plan, index_con, units_con, limit, units_per_patent),
+        )
+    finally:
+        if own_index:
+            index_con.close()
+        if own_units:
+            units_con.close()
+
+
+def _rank_evidence(
+    question: str,
+    plan: Dict[str, Any],
+    index_con: sqlite3.Connection,
+    units_con: sqlite3.Connection,
+    limit: int,
+    units_per_patent: int,
+) -> List[Dict[str, Any]]:
+    terms = query_terms(question, plan, alias_matcher(index_con))
+    direct_patent_ids = plan_patent_ids(index_con, plan, limit)
+    cards = candidate_cards(index_con, plan, limit)
     if direct_patent_ids:
-        index_con = sqlite3.connect(index_db)
-        direct_cards: Dict[str, Dict[str, Any]] = {}
-        for patent_id in direct_patent_ids:
-            card = cards.get(patent_id) or lookup(index_con, patent_id)
-            if card:
-                direct_cards[patent_id] = card
-        index_con.close()
-        cards = direct_cards
-    units_con = sqlite3.connect(units_db)
-    units = [] if direct_patent_ids else fetch_units_by_fts(units_con, terms, limit=max(100, limit * 20))
+        missing = [patent_id for patent_id in direct_patent_ids if patent_id not in cards]
+        cards.update((card["patent_id"], card) for card in lookup_many(index_con, missing))
+        cards = {patent_id: cards[patent_id] for patent_id in direct_patent_ids if patent_id in cards}
+    units = [] if direct_patent_ids else fetch_units_hybrid(units_con, question, plan, terms, limit=max(100, limit * 20))
     units.extend(fetch_units_for_patents(units_con, cards.keys(), limit_per_patent=8))
-    units_con.close()
 
-    by_patent: Dict[str, List[Tuple[float, Dict[str, Any], List[str], List[str]]]] = defaultdict(list)
-    for unit in units:
-        score, why, weaknesses = score_unit(unit, terms)
-        by_patent[unit["patent_id"]].append((score, unit, why, weaknesses))
+    by_patent: Dict[str, List[Tuple[float, Dict[str, Any]]]] = defaultdict(list)
+    for unit, score in zip(units, score_units(units, terms, index_version(units_con))):
+        by_patent[unit["patent_id"]].append((score, unit))
 
-    results: List[Dict[str, Any]] = []
-    index_con = sqlite3.connect(index_db)
+    # Rank patents on the numeric score first; cards and explanations are only built
+    # for the `limit` patents that are returned.
+    ranked: List[Tuple[float, str, List[Tuple[float, Dict[str, Any]]]]] = []
     for patent_id, scored_units in by_patent.items():
         scored_units.sort(key=lambda item: item[0], reverse=True)
-        top = scored_units[:units_per_patent]
+        patent_score = sum(score for score, _ in scored_units[:units_per_patent]) + math.log1p(len(scored_units)) * 0.3
+        if patent_id in direct_patent_ids:
+            patent_score += 100.0
+        ranked.append((round(patent_score, 3), patent_id, scored_units[:units_per_patent]))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    # Fold near-duplicate family members into the best-ranked one before cutting to limit.
+    families = collapse_families([patent_id for _, patent_id, _ in ranked], family_map(units_con), keep=direct_patent_ids)
+    ranked = [item for item in ranked if item[1] in families][:limit]
+    # Cards for patents that surfaced only through unit search, in one query.
+    missing = [patent_id for _, patent_id, _ in ranked if patent_id not in cards]
+    cards.update((card["patent_id"], card) for card in lookup_many(index_con, missing))
+
+    results: List[Dict[str, Any]] = []
+    for patent_score, patent_id, scored_units in ranked:
+        top = [(score, unit, *score_unit(unit, terms)[1:]) for score, unit in scored_units]
         card = cards.get(patent_id)
-        if card is None:
-            card = lookup(index_con, patent_id)
         if card is None:
             # Build a light card from unit metadata when this patent came only from unit FTS.
             unit0 = top[0][1]
@@ -320,40 +573,34 @@ def rank_evidence(
                 "json_path": "",
                 "score": None,
             }
-        patent_score = sum(item[0] for item in top) + math.log1p(len(scored_units)) * 0.3
-        if patent_id in direct_patent_ids:
-            patent_score += 100.0
         why_all = unique_keep_order(reason for item in top for reason in item[2])[:8]
         if patent_id in direct_patent_ids:
             why_all = unique_keep_order(["explicit patent number match", *why_all])[:8]
         weak_all = unique_keep_order(reason for item in top for reason in item[3])[:8]
-        results.append(
-            {
-                "patent_id": patent_id,
-                "score": round(patent_score, 3),
-                "card": card,
-                "why_selected": why_all,
-                "weaknesses": weak_all,
-                "top_units": [
-                    {
-                        "unit_id": item[1]["unit_id"],
-                        "unit_type": item[1]["unit_type"],
-                        "unit_ref": item[1]["unit_ref"],
-                        "claim_no": item[1]["claim_no"],
-                        "claim_type": item[1]["claim_type"],
-                        "page_no": item[1]["page_no"],
-                        "score": round(item[0], 3),
-                        "text": normalize_ws(item[1]["text"])[:1200],
-                        "quality_flags": item[1]["quality_flags"],
-                    }
-                    for item in top
-                ],
-            }
-        )
-
-    index_con.close()
-    results.sort(key=lambda item: item["score"], reverse=True)
-    return results[:limit]
+        result = {
+            "patent_id": patent_id,
+            "score": patent_score,
+            "card": card,
+            "why_selected": why_all,
+            "weaknesses": weak_all,
+            "top_units": [
+                {
+                    "unit_id": item[1]["unit_id"],
+                    "unit_type": item[1]["unit_type"],
+                    "unit_ref": item[1]["unit_ref"],
+                    "claim_no": item[1]["claim_no"],
+                    "claim_type": item[1]["claim_type"],
+                    "page_no": item[1]["page_no"],
+                    "score": round(item[0], 3),
+                    "text": normalize_ws(item[1]["text"])[:1200],
+                    "quality_flags": item[1]["quality_flags"],
+                }
+                for item in top
+            ],
+        }
+        result.update(family_fields(families[patent_id]))
+        results.append(result)
+    return results
 
 
 def main() -> None:
@@ -363,10 +610,14 @@ def main() -> None:
     parser.add_argument("--index-db", default=str(DEFAULT_DB))
     parser.add_argument("--units-db", default=str(DEFAULT_UNITS_DB))
     parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--profile", action="store_true", help="Print card and unit decode counters to stderr")
     args = parser.parse_args()
     plan = json.loads(args.plan_json) if args.plan_json else {"search_queries": [args.question], "max_results": args.limit}
-    ranked = rank_evidence(args.question, plan, Path(args.index_db), Path(args.units_db), limit=args.limit)
+    with decode_profile() as profile:
+        ranked = rank_evidence(args.question, plan, Path(args.index_db), Path(args.units_db), limit=args.limit)
     print(json.dumps(ranked, ensure_ascii=False, indent=2))
+    if args.profile:
+        print(f"[profile] decode={json.dumps(profile)}", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from card_cache import index_version
+
+
+# Facet bitmaps over minimal_index rowids, built with the index (facet_bitmaps table).
+# Each (facet, value) is a Python int whose bit r is set when row r has that value, so
+# filters intersect with `&` before any FTS row is scored or decoded and facet counts
+# are popcounts. Bitmaps are zlib-compressed on disk and loaded once per index_version.
+
+FACETS = ("language", "claim_type", "label", "qc")
+CLEAN = "clean"  # qc facet value for rows without QC flags
+
+
+def bitmap_from_rowids(rowids: Iterable[int]) -> int:
+    ids = list(rowids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for rowid in ids:
+        buffer[rowid >> 3] |= 1 << (rowid & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_rowids(bitmap: int) -> Iterator[int]:
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield index * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+def encode_bitmap(bitmap: int) -> bytes:
+    return zlib.compress(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"))
+
+
+def decode_bitmap(blob: bytes) -> int:
+    return int.from_bytes(zlib.decompress(blob), "little")
+
+
+class FacetIndex:
+    def __init__(self, bitmaps: Dict[Tuple[str, str], int], version: str = "") -> None:
+        self.bitmaps = bitmaps
+        self.version = version
+        self.universe = 0
+        for (facet, _), bitmap in bitmaps.items():
+            if facet == "language":
+                self.universe |= bitmap
+
+    def get(self, facet: str, value: str) -> int:
+        return self.bitmaps.get((facet, value), 0)
+
+    def select(self, language: str = "", claim_type: str = "", label: str = "", include_qc: bool = False) -> Optional[int]:
+        """Rows passing every filter, or None when nothing is filtered."""
+        selected: Optional[int] = None
+        for facet, value in (("language", language), ("claim_type", claim_type), ("label", label)):
+            if value:
+                bitmap = self.get(facet, value)
+                selected = bitmap if selected is None else selected & bitmap
+        if not include_qc:
+            clean = self.get("qc", CLEAN)
+            selected = clean if selected is None else selected & clean
+        return selected
+
+    def counts(self, facet: str, within: Optional[int] = None, top: int = 0) -> List[Tuple[str, int]]:
+        """(value, rows) for one facet, largest first, optionally inside a row set."""
+        rows = []
+        for (name, value), bitmap in self.bitmaps.items():
+            if name != facet:
+                continue
+            count = (bitmap & within if within is not None else bitmap).bit_count()
+            if count:
+                rows.append((value, count))
+        rows.sort(key=lambda item: (-item[1], item[0]))
+        return rows[:top] if top else rows
+
+    def stats(self) -> Dict[str, Any]:
+        values: Dict[str, int] = {}
+        for facet, _ in self.bitmaps:
+            values[facet] = values.get(facet, 0) + 1
+        return {"version": self.version, "rows": self.universe.bit_count(), "values": values}
+
+
+# ---------- storage ----------
+
+def facet_rows(con: sqlite3.Connection) -> Iterator[Tuple[str, str, int]]:
+    for rowid, language, claim_type, qc_json in con.execute(
+        "SELECT rowid, source_language, primary_claim_type, qc_flags_json FROM minimal_index"
+    ):
+        yield "language", str(language or ""), rowid
+        yield "claim_type", str(claim_type or ""), rowid
+        try:
+            flags = json.loads(qc_json or "[]")
+        except json.JSONDecodeError:
+            flags = []
+        for flag in flags or [CLEAN]:
+            yield "qc", str(flag), rowid
+    for label, rowid in con.execute(
+        "SELECT DISTINCT ml.label, mi.rowid FROM minimal_labels ml JOIN minimal_index mi ON mi.patent_id = ml.patent_id"
+    ):
+        yield "label", str(label), rowid
+
+
+def create_facet_index(con: sqlite3.Connection) -> int:
+    """Build facet_bitmaps from minimal_index and minimal_labels; returns the number of bitmaps."""
+    members: Dict[Tuple[str, str], List[int]] = {}
+    for facet, value, rowid in facet_rows(con):
+        members.setdefault((facet, value), []).append(rowid)
+    con.execute("DROP TABLE IF EXISTS facet_bitmaps")
+    con.execute(
+        """
+        CREATE TABLE facet_bitmaps (
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            bitmap BLOB NOT NULL,
+            PRIMARY KEY (facet, value)
+        ) WITHOUT ROWID
+        """
+    )
+    con.executemany(
+        "INSERT INTO facet_bitmaps (facet, value, row_count, bitmap) VALUES (?, ?, ?, ?)",
+        (
+            (facet, value, len(rowids), encode_bitmap(bitmap_from_rowids(rowids)))
+            for (facet, value), rowids in members.items()
+        ),
+    )
+    con.commit()
+    return len(members)
+
+
+def read_facets(con: sqlite3.Connection) -> Dict[Tuple[str, str], int]:
+    try:
+        rows = con.execute("SELECT facet, value, bitmap FROM facet_bitmaps").fetchall()
+    except sqlite3.OperationalError:  # index built before the facet table existed
+        return {}
+    return {(facet, value): decode_bitmap(blob) for facet, value, blob in rows}
+
+
+_FACETS: Dict[str, Optional[FacetIndex]] = {}
+_FACETS_LOCK = threading.Lock()
+
+
+def facet_index(con: sqlite3.Connection) -> Optional[FacetIndex]:
+    """Facet bitmaps of con's index, loaded once per index_version; None for older indexes."""
+    version = index_version(con)
+    with _FACETS_LOCK:
+        if version in _FACETS:
+            return _FACETS[version]
+    bitmaps = read_facets(con)
+    facets = FacetIndex(bitmaps, version=version) if bitmaps else None
+    with _FACETS_LOCK:
+        if len(_FACETS) >= 8:
+            _FACETS.clear()
+        _FACETS[version] = facets
+    return facets
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show facet counts from the facet bitmaps of a minimal index.")
+    parser.add_argument("--index-db", required=True)
+    parser.add_argument("--facet", action="append", choices=FACETS, help="Facet to count; repeatable, default all.")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild facet_bitmaps in place first.")
+    args = parser.parse_args()
+
+    con = sqlite3.connect(Path(args.index_db))
+    if args.rebuild:
+        print(f"[facets] bitmaps={create_facet_index(con)}")
+    facets = facet_index(con)
+    if facets is None:
+        raise SystemExit("facet_bitmaps table missing; rebuild the index or pass --rebuild")
+    out: Dict[str, Any] = {"facets": facets.stats()}
+    for facet in args.facet or FACETS:
+        out[facet] = dict(facets.counts(facet, top=args.top))
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import argparse
+import json
+import select
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Local stand-in for the Telegram Bot API, for exercising the bot transports without a
+# token or network. Speaks keep-alive HTTP/1.1, delays each response by a simulated
+# network round trip (pipelined requests that arrive together share one round trip, as
+# they would over a real link), and answers 429 with retry_after when a chat goes over
+# its message rate (sends and edits) the way Telegram does. Point the bot at it with
+# TELEGRAM_API_BASE=http://127.0.0.1:<port>.
+
+
+class FakeTelegramState:
+    def __init__(self, rtt_sec: float = 0.05, chat_rate: float = 0.0, chat_burst: int = 5, retry_after: int = 1) -> None:
+        self.rtt_sec = rtt_sec
+        self.chat_rate = chat_rate  # 0 disables the 429 limiter
+        self.chat_burst = chat_burst
+        self.retry_after = retry_after
+        self.lock = threading.Condition()
+        self.updates: List[Dict[str, Any]] = []
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.sent: List[Dict[str, Any]] = []
+        self.actions: List[Dict[str, Any]] = []
+        self.commands: List[Dict[str, str]] = []
+        self.calls: Dict[str, int] = {}
+        self.rate_limited = 0
+        self.edits = 0
+        self.connections = 0
+        self._allowance: Dict[int, Tuple[float, float]] = {}
+
+    def push_message(self, chat_id: int, text: str) -> None:
+        with self.lock:
+            self.updates.append(
+                {
+                    "update_id": self.next_update_id,
+                    "message": {"message_id": self.next_update_id, "chat": {"id": chat_id}, "text": text},
+                }
+            )
+            self.next_update_id += 1
+            self.lock.notify_all()
+
+    def reset(self) -> None:
+        """Forget sent messages and per-chat allowances (counters are kept)."""
+        with self.lock:
+            self.sent.clear()
+            self.actions.clear()
+            self._allowance.clear()
+
+    def messages_for(self, chat_id: int) -> List[str]:
+        with self.lock:
+            return [item["text"] for item in self.sent if item["chat_id"] == chat_id]
+
+    def _over_rate(self, chat_id: int) -> bool:
+        if self.chat_rate <= 0:
+            return False
+        now = time.monotonic()
+        tokens, updated = self._allowance.get(chat_id, (float(self.chat_burst), now))
+        tokens = min(float(self.chat_burst), tokens + (now - updated) * self.chat_rate)
+        if tokens < 1:
+            self._allowance[chat_id] = (tokens, now)
+            return True
+        self._allowance[chat_id] = (tokens - 1, now)
+        return False
+
+    def handle(self, method: str, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": self._get_updates(payload)}
+        with self.lock:
+            if method in {"sendMessage", "editMessageText"} and self._over_rate(int(payload["chat_id"])):
+                self.rate_limited += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+            if method == "sendMessage":
+                chat_id = int(payload["chat_id"])
+                message = {"message_id": self.next_message_id, "chat_id": chat_id, "text": str(payload.get("text") or "")}
+                self.next_message_id += 1
+                self.sent.append(message)
+                return 200, {"ok": True, "result": message}
+            if method == "editMessageText":
+                for message in self.sent:
+                    if message["message_id"] == int(payload.get("message_id") or 0) and message["chat_id"] == int(payload["chat_id"]):
+                        if message["text"] == payload.get("text"):
+                            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message is not modified"}
+                        message["text"] = str(payload.get("text") or "")
+                        self.edits += 1
+                        return 200, {"ok": True, "result": message}
+                return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message to edit not found"}
+            if method == "deleteMessage":
+                before = len(self.sent)
+                self.sent = [m for m in self.sent if m["message_id"] != int(payload.get("message_id") or 0)]
+                return 200, {"ok": True, "result": len(self.sent) < before}
+            if method == "sendChatAction":
+                self.actions.append({"chat_id": payload.get("chat_id"), "action": payload.get("action")})
+                return 200, {"ok": True, "result": True}
+            if method == "setMyCommands":
+                self.commands = list(payload.get("commands") or [])
+                return 200, {"ok": True, "result": True}
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+    def _get_updates(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(payload.get("offset") or 0)
+        deadline = time.monotonic() + float(payload.get("timeout") or 0)
+        with self.lock:
+            while True:
+                pending = [update for update in self.updates if update["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0:
+                    self.updates = pending
+                    return pending
+                self.lock.wait(remaining)
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    rbufsize = 0  # unbuffered, so select() shows whether the next request is already waiting
+    server: "FakeTelegramServer"
+
+    def setup(self) -> None:
+        super().setup()
+        self.arrived_at = 0.0
+        self.next_pipelined = False
+        with self.server.state.lock:
+            self.server.state.connections += 1
+
+    def do_POST(self) -> None:
+        # A request that was already queued behind the previous one was sent with it.
+        if not self.next_pipelined:
+            self.arrived_at = time.monotonic()
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        method = self.path.rsplit("/", 1)[-1]
+        try:
+            payload = json.loads(body.decode("utf-8") or "{}")
+        except json.JSONDecodeError:
+            payload = {}
+        status, data = self.server.state.handle(method, payload)
+        time.sleep(max(0.0, self.arrived_at + self.server.state.rtt_sec - time.monotonic()))
+        out = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        try:
+            self.wfile.write(out)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            return
+        self.next_pipelined = bool(select.select([self.connection], [], [], 0)[0])
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, state: FakeTelegramState, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), FakeTelegramHandler)
+        self.state = state
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeTelegramServer":
+        self.thread = threading.Thread(target=self.serve_forever, name="fake-telegram", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local fake Telegram Bot API server.")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--rtt-ms", type=float, default=50, help="Simulated network round trip per request.")
+    parser.add_argument("--chat-rate", type=float, default=1.0, help="Messages per second per chat before 429; 0 disables.")
+    parser.add_argument("--chat-burst", type=int, default=5)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    state = FakeTelegramState(args.rtt_ms / 1000, args.chat_rate, args.chat_burst, args.retry_after)
+    server = FakeTelegramServer(state, port=args.port)
+    print(f"[fake-telegram] {server.base_url}  (export TELEGRAM_API_BASE={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps({"calls": state.calls, "sent": len(state.sent), "rate_limited": state.rate_limited}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # family collapsing is optional; results are just not collapsed
+    np = None  # type: ignore[assignment]
+
+from card_cache import index_version
+
+
+# Near-duplicate / family groups over independent claim text and titles, built with the
+# units and pack indexes (patent_families table). Each patent gets a MinHash signature of
+# character shingles; LSH bands bucket likely duplicates so grouping never compares all
+# pairs. At query time collapse_families keeps the best-ranked patent of each group and
+# lists the others as its siblings, using one dict lookup per result.
+
+NUM_PERM = 64
+BANDS = 16
+BUCKET_HEADS = 8
+SHINGLE_CHARS = 5
+DEFAULT_FAMILY_THRESHOLD = 0.7
+MAX_LISTED_SIBLINGS = 8
+MIN_CLAIM_CHARS = 80  # titles alone ("Memory device") are too generic to group on
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+FAMILY_COLLAPSE = os.environ.get("A4_FAMILY_COLLAPSE", "1") != "0"
+
+_PRIME = 4294967311  # smallest prime above 2**32
+_rng = np.random.default_rng(0x5EED) if np is not None else None
+_PERM_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64) if _rng is not None else None
+_PERM_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64) if _rng is not None else None
+
+
+def shingles(text: str, size: int = SHINGLE_CHARS) -> Set[str]:
+    normalized = re.sub(r"[\W_]+", " ", str(text or "").lower()).strip()
+    if not normalized:
+        return set()
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i : i + size] for i in range(len(normalized) - size + 1)}
+
+
+def minhash(text: str) -> Optional[bytes]:
+    """NUM_PERM 32-bit MinHash values of text's shingles, or None for empty text or no NumPy."""
+    grams = shingles(text)
+    if np is None or not grams:
+        return None
+    hashes = np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+    values = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) % _PRIME
+    return (values.min(axis=0) & 0xFFFFFFFF).astype("<u4").tobytes()
+
+
+def signature_similarity(left: bytes, right: bytes) -> float:
+    """Fraction of equal MinHash slots, an estimate of shingle Jaccard similarity."""
+    a = np.frombuffer(left, dtype="<u4")
+    b = np.frombuffer(right, dtype="<u4")
+    return float((a == b).mean())
+
+
+class FamilyBuilder:
+    """Collects one signature per patent during an index build, then groups them."""
+
+    def __init__(self, threshold: float = DEFAULT_FAMILY_THRESHOLD) -> None:
+        self.threshold = threshold
+        self.signatures: Dict[str, bytes] = {}
+
+    def add(self, patent_id: str, title: str, claims: Iterable[str]) -> None:
+        """Sign title plus independent claim text; patents without enough claim text stay ungrouped."""
+        claim_text = " ".join(str(claim or "") for claim in claims).strip()
+        # A Han/Kana/Hangul character carries about as much text as two Latin letters.
+        if len(claim_text) + len(CJK_RE.findall(claim_text)) < MIN_CLAIM_CHARS:
+            return
+        signature = minhash(f"{title or ''} {claim_text}")
+        if signature is not None:
+            self.signatures[patent_id] = signature
+
+    def groups(self) -> Dict[str, str]:
+        """patent_id -> family_id (smallest patent_id of its group)."""
+        parent = {patent_id: patent_id for patent_id in self.signatures}
+
+        def find(patent_id: str) -> str:
+            while parent[patent_id] != patent_id:
+                parent[patent_id] = parent[parent[patent_id]]
+                patent_id = parent[patent_id]
+            return patent_id
+
+        rows = NUM_PERM // BANDS
+        for band in range(BANDS):
+            buckets: Dict[bytes, List[str]] = {}
+            for patent_id, signature in self.signatures.items():
+                buckets.setdefault(signature[band * rows * 4 : (band + 1) * rows * 4], []).append(patent_id)
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                # Compare each member with at most BUCKET_HEADS earlier unmatched members,
+                # so crowded buckets stay linear instead of all-pairs.
+                heads: List[str] = []
+                for patent_id in members:
+                    for head in heads:
+                        if find(patent_id) == find(head):
+                            break
+                        if signature_similarity(self.signatures[head], self.signatures[patent_id]) >= self.threshold:
+                            left, right = sorted((find(head), find(patent_id)))
+                            parent[right] = left
+                            break
+                    else:
+                        if len(heads) < BUCKET_HEADS:
+                            heads.append(patent_id)
+        return {patent_id: find(patent_id) for patent_id in self.signatures}
+
+    def write(self, con: sqlite3.Connection) -> Dict[str, int]:
+        families = self.groups()
+        sizes: Dict[str, int] = {}
+        for family_id in families.values():
+            sizes[family_id] = sizes.get(family_id, 0) + 1
+        con.execute("DROP TABLE IF EXISTS patent_families")
+        con.execute(
+            """
+            CREATE TABLE patent_families (
+                patent_id TEXT PRIMARY KEY,
+                family_id TEXT NOT NULL,
+                family_size INTEGER NOT NULL,
+                signature BLOB NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        con.executemany(
+            "INSERT INTO patent_families (patent_id, family_id, family_size, signature) VALUES (?, ?, ?, ?)",
+            (
+                (patent_id, family_id, sizes[family_id], self.signatures[patent_id])
+                for patent_id, family_id in families.items()
+            ),
+        )
+        con.commit()
+        return {
+            "signatures": len(families),
+            "families": sum(1 for size in sizes.values() if size > 1),
+            "collapsed": sum(size - 1 for size in sizes.values()),
+        }
+
+
+# ---------- query time ----------
+
+def read_families(con: sqlite3.Connection) -> Dict[str, str]:
+    try:
+        rows = con.execute("SELECT patent_id, family_id FROM patent_families WHERE family_size > 1").fetchall()
+    except sqlite3.OperationalError:  # index built before the family table existed
+        return {}
+    return {patent_id: family_id for patent_id, family_id in rows}
+
+
+_FAMILIES: Dict[str, Dict[str, str]] = {}
+_FAMILIES_LOCK = threading.Lock()
+
+
+def family_map(con: sqlite3.Connection | None) -> Dict[str, str]:
+    """patent_id -> family_id for patents with siblings, loaded once per index_version."""
+    if con is None or not FAMILY_COLLAPSE:
+        return {}
+    version = index_version(con)
+    with _FAMILIES_LOCK:
+        if version in _FAMILIES:
+            return _FAMILIES[version]
+    families = read_families(con)
+    with _FAMILIES_LOCK:
+        if len(_FAMILIES) >= 8:
+            _FAMILIES.clear()
+        _FAMILIES[version] = families
+    return families
+
+
+def collapse_families(
+    patent_ids: Sequence[str],
+    families: Dict[str, str],
+    keep: Iterable[str] = (),
+) -> Dict[str, List[str]]:
+    """Representative patent_id -> sibling patent_ids, in rank order.
+
+    patent_ids must be best-first. The first patent of each family is kept; later members
+    become its siblings. Patents in keep (e.g. explicitly requested numbers) are never folded.
+    """
+    keep = set(keep)
+    groups: Dict[str, List[str]] = {}
+    representative: Dict[str, str] = {}
+    for patent_id in patent_ids:
+        family_id = families.get(patent_id)
+        if family_id is None or patent_id in keep:
+            groups.setdefault(patent_id, [])
+            continue
+        head = representative.setdefault(family_id, patent_id)
+        if head == patent_id:
+            groups.setdefault(patent_id, [])
+        else:
+            groups[head].append(patent_id)
+    return groups
+
+
+def family_fields(siblings: Sequence[str]) -> Dict[str, Any]:
+    """Fields for a kept result: its first siblings and how many family members were among the candidates."""
+    if not siblings:
+        return {}
+    return {"family_siblings": list(siblings[:MAX_LISTED_SIBLINGS]), "family_size": len(siblings) + 1}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show patent family groups stored in a units or pack index.")
+    parser.add_argument("--index-db", required=True)
+    parser.add_argument("patent_ids", nargs="*", help="Show the families of these patents only.")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    con = sqlite3.connect(Path(args.index_db))
+    families = read_families(con)
+    members: Dict[str, List[str]] = {}
+    for patent_id, family_id in sorted(families.items()):
+        members.setdefault(family_id, []).append(patent_id)
+    if args.patent_ids:
+        wanted = {families.get(patent_id, patent_id) for patent_id in args.patent_ids}
+        members = {family_id: ids for family_id, ids in members.items() if family_id in wanted}
+    largest: List[Tuple[str, List[str]]] = sorted(members.items(), key=lambda item: (-len(item[1]), item[0]))[: args.top]
+    out: Dict[str, Any] = {
+        "families": len(members),
+        "patents_in_families": sum(len(ids) for ids in members.values()),
+        "largest": {family_id: {"size": len(ids), "members": ids[:10]} for family_id, ids in largest},
+    }
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+import uuid
+from typing import Iterable, List
+
+
+# FTS5 tables in the A4 indexes never keep their own copy of the text:
+#   - external content (content='<table>') when every FTS column exists in the base
+#     table, so the index can be rebuilt from it with the 'rebuild' command;
+#   - contentless (content='') when columns are derived (joined labels, claim text).
+# Either way readers join the base table on rowid and only use MATCH/bm25 from FTS.
+
+BULK_AUTOMERGE = 0
+DEFAULT_AUTOMERGE = 4
+
+# unicode61 keeps a whole run of Han characters (and a Hangul word with its particles)
+# as one token, so "页缓冲器" never matches inside "所述页缓冲器包括".
+#   trigram:    FTS5 built-in substring index; terms shorter than 3 characters cannot match.
+#   cjk_bigram: Han/Hangul runs are rewritten to overlapping bigrams at build and query
+#               time and indexed with unicode61, so Latin text keeps word tokens.
+TOKENIZERS = ("unicode61", "trigram", "cjk_bigram")
+DEFAULT_TOKENIZER = "unicode61"
+CJK_RUN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+")
+
+
+def begin_bulk_load(con: sqlite3.Connection, table: str) -> None:
+    """Disable incremental segment merging while a builder inserts every row."""
+    con.execute(f"INSERT INTO {table}({table}, rank) VALUES('automerge', ?)", (BULK_AUTOMERGE,))
+
+
+def rebuild_external_content(con: sqlite3.Connection, table: str) -> None:
+    con.execute(f"INSERT INTO {table}({table}) VALUES('rebuild')")
+
+
+def finish_bulk_load(con: sqlite3.Connection, table: str) -> None:
+    """Merge all segments into one b-tree and restore the default automerge level."""
+    con.execute(f"INSERT INTO {table}({table}) VALUES('optimize')")
+    con.execute(f"INSERT INTO {table}({table}, rank) VALUES('automerge', ?)", (DEFAULT_AUTOMERGE,))
+    con.commit()
+
+
+# ---------- tokenizer ----------
+
+def tokenize_option(tokenizer: str) -> str:
+    """Extra fts5() argument for CREATE VIRTUAL TABLE, including the leading comma."""
+    if tokenizer == "trigram":
+        return ", tokenize='trigram'"
+    return ""
+
+
+def cjk_bigrams(text: str) -> str:
+    def split_run(match: re.Match) -> str:
+        run = match.group(0)
+        if len(run) < 2:
+            return run
+        return " " + " ".join(run[i : i + 2] for i in range(len(run) - 1)) + " "
+
+    return CJK_RUN_RE.sub(split_run, text)
+
+
+def index_text(value: object, tokenizer: str) -> str:
+    text = "" if value is None else str(value)
+    if tokenizer == "cjk_bigram":
+        return cjk_bigrams(text)
+    return text
+
+
+def register_index_text(con: sqlite3.Connection, tokenizer: str) -> None:
+    """Expose index_text() to SQL as fts_text(value) for bulk INSERT ... SELECT loads."""
+    con.create_function("fts_text", 1, lambda value: index_text(value, tokenizer), deterministic=True)
+
+
+def write_index_meta(con: sqlite3.Connection, tokenizer: str) -> None:
+    con.execute("CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT)")
+    con.executemany(
+        "INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)",
+        [
+            ("fts_tokenizer", tokenizer),
+            # Readers key decoded-row caches on this stamp; every build gets a new one.
+            ("index_version", f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"),
+        ],
+    )
+    con.commit()
+
+
+def read_fts_tokenizer(con: sqlite3.Connection) -> str:
+    try:
+        row = con.execute("SELECT value FROM index_meta WHERE key='fts_tokenizer'").fetchone()
+    except sqlite3.OperationalError:
+        return DEFAULT_TOKENIZER
+    return str(row[0]) if row and row[0] in TOKENIZERS else DEFAULT_TOKENIZER
+
+
+def cjk_runs(text: str, min_len: int = 2) -> List[str]:
+    return [run for run in CJK_RUN_RE.findall(text or "") if len(run) >= min_len]
+
+
+def fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def match_expression(terms: Iterable[str], tokenizer: str = DEFAULT_TOKENIZER, max_terms: int = 0) -> str:
+    """OR of phrase queries, rewritten the same way the index text was."""
+    phrases: List[str] = []
+    for term in terms:
+        term = re.sub(r"\s+", " ", str(term or "")).strip()
+        if not term:
+            continue
+        if tokenizer == "trigram" and len(term) < 3:
+            continue
+        phrase = fts_phrase(re.sub(r"\s+", " ", index_text(term, tokenizer)).strip())
+        if phrase not in phrases:
+            phrases.append(phrase)
+        if max_terms and len(phrases) >= max_terms:
+            break
+    return " OR ".join(phrases)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import argparse
 import json
+import re
 import sqlite3
 import time
 from datetime import datetime, timedelta
@@ -9,6 +10,7 @@ from pathlib import Path
 from typing import Any, Dict, Iterable, List, Set, Tuple
 
 import probe_problem_effect_evidence as probe
+from db_schema import append_change, changed_patent_ids_since, latest_change_seq
 from repair_problem_effect_with_pro import repair_one
 
 
@@ -17,12 +19,17 @@ DEFAULT_REBUILD = BASE / "rebuilds" / "A4_evidence_v2_full_20260508"
 DEFAULT_DB = DEFAULT_REBUILD / "db" / "patent_A4_evidence_v2_full.sqlite"
 DEFAULT_MINIMAL_DIR = DEFAULT_REBUILD / "minimal_analysis"
 DEFAULT_WORK_DIR = DEFAULT_REBUILD / "gemini_problem_effect_repair"
+MINIMAL_STAGES = ("minimal", "minimal_gemini_repair", "minimal_quarantine")
 
 
 def now() -> str:
     return datetime.now().isoformat(timespec="seconds")
 
 
+def safe_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", value)
+
+
 def load_json(path: Path) -> Dict[str, Any]:
     with path.open("r", encoding="utf-8") as f:
         return json.load(f)
@@ -99,28 +106,90 @@ def weak_reasons(card: Dict[str, Any]) -> List[str]:
     return reasons
 
 
-def iter_weak_minimal_cards(minimal_dir: Path, seen_keys: Set[Tuple[str, str]], max_items: int) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
+def inspect_weak_card(path: Path) -> Dict[str, Any] | None:
+    try:
+        card = load_json(path)
+    except Exception:
+        return None
+    patent_id = str(card.get("patent_id") or path.name.split(".")[0])
+    reasons = weak_reasons(card)
+    if not patent_id or not reasons:
+        return None
+    return {"patent_id": patent_id, "path": str(path), "weak_reasons": reasons}
+
+
+def scan_weak_cards(minimal_dir: Path) -> Dict[str, Dict[str, Any]]:
+    weak: Dict[str, Dict[str, Any]] = {}
     for path in sorted(minimal_dir.glob("*.minimal.json")):
-        try:
-            card = load_json(path)
-        except Exception:
-            continue
-        patent_id = str(card.get("patent_id") or path.name.split(".")[0])
-        if not patent_id:
-            continue
-        reasons = weak_reasons(card)
-        if not reasons:
-            continue
-        reasons = [reason for reason in reasons if (patent_id, reason) not in seen_keys]
+        item = inspect_weak_card(path)
+        if item:
+            weak[str(path)] = item
+    return weak
+
+
+def refresh_weak_cards(weak: Dict[str, Dict[str, Any]], minimal_dir: Path, patent_ids: Iterable[str]) -> None:
+    """Re-inspect only the cards whose patents appear in the change log."""
+    for patent_id in patent_ids:
+        path = minimal_dir / f"{safe_name(patent_id)}.minimal.json"
+        item = inspect_weak_card(path)
+        if item:
+            weak[str(path)] = item
+        else:
+            weak.pop(str(path), None)
+
+
+def select_weak_candidates(
+    weak: Dict[str, Dict[str, Any]],
+    seen_keys: Set[Tuple[str, str]],
+    max_items: int,
+) -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = []
+    for key in sorted(weak):
+        item = weak[key]
+        reasons = [reason for reason in item["weak_reasons"] if (item["patent_id"], reason) not in seen_keys]
         if not reasons:
             continue
-        items.append({"patent_id": patent_id, "path": str(path), "weak_reasons": reasons, "card": card})
+        items.append({**item, "weak_reasons": reasons})
         if len(items) >= max_items:
             break
     return items
 
 
+def iter_weak_minimal_cards(minimal_dir: Path, seen_keys: Set[Tuple[str, str]], max_items: int) -> List[Dict[str, Any]]:
+    return select_weak_candidates(scan_weak_cards(minimal_dir), seen_keys, max_items)
+
+
+def read_change_cursor(db_path: Path, after_seq: int | None) -> Tuple[List[str] | None, int | None]:
+    """Return (changed patent ids, new seq). None ids means the change log is unusable; rescan.
+
+    The position is kept in memory only: the weak-card set it updates is in memory too, so a
+    restarted worker needs its startup full scan anyway and starts from the latest seq. A log
+    error keeps the previous position instead of rewinding to 0.
+    """
+    if not db_path.exists():
+        return None, 0
+    con = sqlite3.connect(db_path, timeout=30)
+    try:
+        if after_seq is None:
+            return None, latest_change_seq(con)
+        return changed_patent_ids_since(con, after_seq, stages=MINIMAL_STAGES)
+    except sqlite3.Error:
+        return None, after_seq
+    finally:
+        con.close()
+
+
+def record_minimal_change(db_path: Path, patent_id: str) -> None:
+    con = sqlite3.connect(db_path, timeout=30)
+    try:
+        append_change(con, patent_id, "minimal_gemini_repair")
+        con.commit()
+    except sqlite3.Error:
+        pass
+    finally:
+        con.close()
+
+
 def get_minimal_failed_ids(db_path: Path) -> List[str]:
     if not db_path.exists():
         return []
@@ -239,13 +308,29 @@ def run_loop(args: argparse.Namespace) -> None:
     skipped_path = work_dir / "gemini_repair_skipped.jsonl"
 
     attempts = 0
+    weak: Dict[str, Dict[str, Any]] = {}
+    change_seq: int | None = None
+    last_full_scan = 0.0
     while True:
+        # Full scan once at startup (and every --full-rescan-sec as a safety net);
+        # between scans only cards named in the change log are re-inspected.
+        changed_ids, seq = read_change_cursor(db_path, change_seq)
+        rescan_due = args.full_rescan_sec > 0 and time.monotonic() - last_full_scan >= args.full_rescan_sec
+        if changed_ids is None or rescan_due:
+            weak = scan_weak_cards(minimal_dir)
+            last_full_scan = time.monotonic()
+            print(f"[gemini-worker] {now()} full scan weak={len(weak)} change_seq={seq}", flush=True)
+        elif changed_ids:
+            refresh_weak_cards(weak, minimal_dir, changed_ids)
+            print(f"[gemini-worker] {now()} changed={len(changed_ids)} weak={len(weak)} change_seq={seq}", flush=True)
+        change_seq = seq
+
         # Do not let old successful JSONL rows suppress repair forever.
         # The source of truth is the current minimal card: if the card still has
         # weak fields, retry it. Only explicit skips and recent failures back off.
         seen_keys = load_seen_keys([skipped_path])
         seen_keys.update(load_recent_failed_keys(failed_path, args.retry_failed_after_sec))
-        candidates = iter_weak_minimal_cards(minimal_dir, seen_keys, max_items=args.batch_size)
+        candidates = select_weak_candidates(weak, seen_keys, max_items=args.batch_size)
         failed_minimal_ids = get_minimal_failed_ids(db_path)
         write_queue_snapshots(work_dir, candidates, failed_minimal_ids)
 
@@ -282,6 +367,8 @@ def run_loop(args: argparse.Namespace) -> None:
                     result["applied"] = False
                     if args.apply and result.get("quality_pass"):
                         result["applied"] = apply_quality_repair(minimal_path, result)
+                        # The card is rewritten (repair marker) even when no label was filled.
+                        record_minimal_change(db_path, patent_id)
                         try:
                             repaired_card = load_json(minimal_path)
                             if minimal_card_valid(repaired_card):
@@ -332,6 +419,12 @@ def main() -> None:
     parser.add_argument("--timeout-sec", type=int, default=120)
     parser.add_argument("--delay-sec", type=float, default=60)
     parser.add_argument("--poll-sec", type=float, default=300)
+    parser.add_argument(
+        "--full-rescan-sec",
+        type=float,
+        default=21600,
+        help="Safety-net full scan interval. Between scans only change-log entries are re-inspected. 0 disables.",
+    )
     parser.add_argument("--batch-size", type=int, default=20)
     parser.add_argument("--limit", type=int, default=0)
     parser.add_argument("--retry-failed-after-sec", type=float, default=21600)
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from metrics import REGISTRY, Sample
+
+
+# Bounded worker lanes for the chat bots. Each lane has its own worker threads and a cap
+# on queued work, so a slow job only delays its own lane and a flood of jobs is refused
+# instead of piling up behind the poll loop. Waiting jobs are kept per chat and served
+# round-robin, so one chat's burst cannot push everyone else's job to the back; each chat
+# may also hold only a few jobs per lane. Wait estimates come from recent job durations.
+# In serial lanes a chat has at most one job running at a time, so that chat's messages
+# are handled (and answered) in the order they arrived.
+
+# lane -> (workers, queue depth beyond the running jobs)
+LANE_DEFAULTS: Dict[str, Tuple[int, int]] = {
+    "fast": (4, 32),  # lookups: /search, /patent, /triage, /status, approvals
+    "local": (1, 8),  # /ask through the local LLM
+    "pro": (2, 8),  # /ask_pro and /verify through GPT/Gemini
+    "mission": (1, 2),  # /mission reports
+}
+# lane -> jobs one chat may have queued or running
+CHAT_LIMITS: Dict[str, int] = {"fast": 8, "local": 2, "pro": 2, "mission": 1}
+# lanes that run one job per chat at a time (the fast lane handles every incoming message)
+SERIAL_LANES = {"fast"}
+# lane -> assumed job duration until the lane has finished jobs of its own
+DURATION_PRIOR_SEC: Dict[str, float] = {"fast": 2.0, "local": 120.0, "pro": 90.0, "mission": 600.0}
+RECENT_JOBS = 20
+
+LANE_WAIT_SECONDS = REGISTRY.histogram("a4_lane_wait_seconds", "Time a job spent queued before a worker took it.", ["lane"])
+LANE_JOB_SECONDS = REGISTRY.histogram("a4_lane_job_seconds", "Time a worker spent running a job.", ["lane"])
+
+
+class LaneFull(RuntimeError):
+    def __init__(self, lane: str, pending: int, per_chat: bool = False) -> None:
+        owner = "this chat's share of " if per_chat else ""
+        super().__init__(f"{owner}lane {lane} is full ({pending} jobs pending)")
+        self.lane = lane
+        self.pending = pending
+        self.per_chat = per_chat
+
+
+class Job:
+    __slots__ = ("fn", "args", "chat_id", "label", "future", "submitted", "started")
+
+    def __init__(self, fn: Callable[..., Any], args: Tuple[Any, ...], chat_id: Hashable, label: str) -> None:
+        self.fn = fn
+        self.args = args
+        self.chat_id = chat_id
+        self.label = label
+        self.future: Future = Future()
+        self.submitted = time.monotonic()
+        self.started = 0.0
+
+
+class JobLane:
+    def __init__(self, name: str, workers: int, queue_depth: int, per_chat: int = 0, serial: bool | None = None) -> None:
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self.per_chat = per_chat or CHAT_LIMITS.get(name, 0)
+        self.serial = name in SERIAL_LANES if serial is None else serial
+        self._cond = threading.Condition()
+        self._queues: OrderedDict[Hashable, Deque[Job]] = OrderedDict()  # round-robin order of chats
+        self._running: List[Job] = []
+        self._durations: Deque[float] = deque(maxlen=RECENT_JOBS)
+        self._closed = False
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.busy_sec = 0.0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"lane-{name}-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_depth
+
+    # ---------- scheduling ----------
+
+    def _queued(self) -> int:
+        return sum(len(jobs) for jobs in self._queues.values())
+
+    def _chat_pending(self, chat_id: Hashable) -> int:
+        return len(self._queues.get(chat_id, ())) + sum(1 for job in self._running if job.chat_id == chat_id)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, chat_id: Hashable = None, label: str = "") -> Future:
+        """Queue fn(*args) for chat_id; raises LaneFull when the lane or the chat's share is full."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"lane {self.name} is shut down")
+            pending = self._queued() + len(self._running)
+            if pending >= self.capacity:
+                self.rejected += 1
+                raise LaneFull(self.name, pending)
+            if chat_id is not None and self.per_chat and self._chat_pending(chat_id) >= self.per_chat:
+                self.rejected += 1
+                raise LaneFull(self.name, self._chat_pending(chat_id), per_chat=True)
+            job = Job(fn, args, chat_id, label)
+            self._queues.setdefault(chat_id, deque()).append(job)
+            self._cond.notify()
+            return job.future
+
+    def _next(self) -> Optional[Job]:
+        # Caller holds the lock. Take the first chat's oldest job and move that chat to the back.
+        # A serial lane skips chats that already have a job running; None when no job may start.
+        busy = {job.chat_id for job in self._running if job.chat_id is not None} if self.serial else set()
+        for chat_id, jobs in self._queues.items():
+            if chat_id not in busy:
+                break
+        else:
+            return None
+        job = jobs.popleft()
+        if jobs:
+            self._queues.move_to_end(chat_id)
+        else:
+            del self._queues[chat_id]
+        return job
+
+    def _order(self) -> List[Job]:
+        """Queued jobs in the order the workers will take them (caller holds the lock)."""
+        order: List[Job] = []
+        rounds = max((len(jobs) for jobs in self._queues.values()), default=0)
+        for index in range(rounds):
+            order.extend(jobs[index] for jobs in self._queues.values() if index < len(jobs))
+        return order
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None:
+                    if self._closed and not self._queues:
+                        return
+                    self._cond.wait()
+                    job = self._next()
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                job.started = time.monotonic()
+                self._running.append(job)
+            LANE_WAIT_SECONDS.observe(job.started - job.submitted, lane=self.name)
+            ok = False
+            try:
+                job.future.set_result(job.fn(*job.args))
+                ok = True
+            except BaseException as exc:
+                job.future.set_exception(exc)
+            finally:
+                elapsed = time.monotonic() - job.started
+                LANE_JOB_SECONDS.observe(elapsed, lane=self.name)
+                with self._cond:
+                    self._running.remove(job)
+                    self._cond.notify_all()  # the chat's next job may start now
+                    self._durations.append(elapsed)
+                    self.busy_sec += elapsed
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+
+    # ---------- visibility ----------
+
+    def typical_sec(self) -> float:
+        """Mean of recent job durations, or the lane's prior before any job has finished."""
+        with self._cond:
+            if self._durations:
+                return sum(self._durations) / len(self._durations)
+        return DURATION_PRIOR_SEC.get(self.name, 60.0)
+
+    def _eta(self, position: int, typical: float, now: float) -> float:
+        """Seconds until the queued job at position (0 = next) starts; caller holds the lock."""
+        # Each worker frees up when its running job reaches the typical duration; every
+        # queued job ahead then takes the earliest free worker for another typical run.
+        free_at = [max(0.0, typical - (now - job.started)) for job in self._running]
+        free_at += [0.0] * (self.workers - len(free_at))
+        heapq.heapify(free_at)
+        for _ in range(position):
+            heapq.heappush(free_at, heapq.heappop(free_at) + typical)
+        return free_at[0]
+
+    def chat_jobs(self, chat_id: Hashable) -> List[Dict[str, Any]]:
+        """This chat's jobs in the lane: running ones with elapsed time, queued ones with position and ETA."""
+        typical = self.typical_sec()
+        now = time.monotonic()
+        out: List[Dict[str, Any]] = []
+        with self._cond:
+            for job in self._running:
+                if job.chat_id == chat_id:
+                    out.append({"lane": self.name, "label": job.label, "state": "running", "elapsed_sec": now - job.started})
+            for position, job in enumerate(self._order()):
+                if job.chat_id == chat_id:
+                    out.append(
+                        {
+                            "lane": self.name,
+                            "label": job.label,
+                            "state": "queued",
+                            "position": position + 1,
+                            "waited_sec": now - job.submitted,
+                            "eta_sec": self._eta(position, typical, now),
+                        }
+                    )
+        return out
+
+    def position(self, future: Future) -> Optional[Dict[str, Any]]:
+        """Queue position (1-based) and ETA of a job that has not started yet."""
+        typical = self.typical_sec()
+        now = time.monotonic()
+        with self._cond:
+            for position, job in enumerate(self._order()):
+                if job.future is future:
+                    return {"position": position + 1, "eta_sec": self._eta(position, typical, now)}
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        typical = self.typical_sec()
+        with self._cond:
+            done = self.completed + self.failed
+            queued = self._queued()
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "per_chat": self.per_chat,
+                "running": len(self._running),
+                "queued": queued,
+                "chats_waiting": len(self._queues),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_sec": round(self.busy_sec / done, 2) if done else None,
+                "recent_sec": round(typical, 1),
+                # How long a job submitted now would wait to start.
+                "wait_sec": round(self._eta(queued, typical, time.monotonic()), 1),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            self._closed = True
+            if not wait:
+                for jobs in self._queues.values():
+                    for job in jobs:
+                        job.future.cancel()
+                self._queues.clear()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def build_lanes(sizes: Dict[str, Tuple[int, int]] | None = None) -> Dict[str, JobLane]:
+    sizes = {**LANE_DEFAULTS, **(sizes or {})}
+    return {name: JobLane(name, workers, depth) for name, (workers, depth) in sizes.items()}
+
+
+def lane_samples(lanes: Dict[str, JobLane]) -> List[Sample]:
+    """Metrics collector samples: queue depth, running jobs and job outcomes per lane."""
+    out: List[Sample] = []
+    for name, lane in lanes.items():
+        stats = lane.stats()
+        out += [
+            ("a4_lane_queued", "gauge", "Jobs waiting in the lane.", {"lane": name}, stats["queued"]),
+            ("a4_lane_running", "gauge", "Jobs running in the lane.", {"lane": name}, stats["running"]),
+            ("a4_lane_capacity", "gauge", "Workers plus queue depth of the lane.", {"lane": name}, lane.capacity),
+            ("a4_lane_wait_estimate_seconds", "gauge", "Estimated wait for a job submitted now.", {"lane": name}, stats["wait_sec"]),
+        ]
+        for outcome in ("completed", "failed", "rejected"):
+            out.append(("a4_lane_jobs_total", "counter", "Jobs by outcome.", {"lane": name, "outcome": outcome}, stats[outcome]))
+    return out
@@ -4,10 +4,12 @@ import json
 import os
 import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 import requests
 
+from metrics import llm_call, timed_llm
+
 
 DEFAULT_ENV_PATH = Path("/Volumes/외장 2TB/cpu2026/common/code/.env")
 RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
@@ -49,18 +51,51 @@ def extract_gemini_text(data: Dict[str, Any]) -> str:
     return "\n".join(parts).strip()
 
 
+def iter_sse_data(response: requests.Response) -> Iterator[str]:
+    """The data field of each server-sent event in a streaming response."""
+    data: List[str] = []
+    # chunk_size=None hands over each chunk as it arrives instead of waiting for a full buffer.
+    for raw in response.iter_lines(chunk_size=None):
+        line = raw.decode("utf-8")
+        if not line:
+            if data:
+                yield "\n".join(data)
+                data = []
+        elif line.startswith("data:"):
+            data.append(line[5:].removeprefix(" "))
+    if data:
+        yield "\n".join(data)
+
+
+def iter_ollama_text(response: requests.Response) -> Iterator[str]:
+    """Text deltas from a streaming Ollama /api/generate response (one JSON object per line)."""
+    for raw in response.iter_lines(chunk_size=None):
+        if not raw:
+            continue
+        data = json.loads(raw)
+        if data.get("error"):
+            raise RuntimeError(f"Ollama error: {data['error']}")
+        if data.get("response"):
+            yield str(data["response"])
+        if data.get("done"):
+            return
+
+
 def post_json_with_retries(
     url: str,
     headers: Dict[str, str],
     payload: Dict[str, Any],
     timeout: int,
     attempts: int = 3,
+    stream: bool = False,
 ) -> requests.Response:
+    """POST with retries on 429/5xx; with stream=True only the response headers are awaited."""
     last_response: Optional[requests.Response] = None
     for attempt in range(1, attempts + 1):
-        response = requests.post(url, headers=headers, json=payload, timeout=timeout)
+        response = requests.post(url, headers=headers, json=payload, timeout=timeout, stream=stream)
         if response.status_code not in RETRYABLE_STATUS_CODES or attempt == attempts:
             return response
+        response.close()
         last_response = response
         retry_after = response.headers.get("Retry-After", "")
         try:
@@ -115,15 +150,26 @@ class LLMClient:
         max_tokens: int = 1800,
         temperature: float = 0.1,
     ) -> str:
-        if self.provider == "openai":
-            return self.generate_openai(prompt, instructions, max_tokens, temperature)
-        if self.provider == "gemini":
-            return self.generate_gemini(prompt, instructions, max_tokens, temperature)
-        if self.provider == "ollama":
-            return self.generate_ollama(prompt, instructions, max_tokens, temperature)
-        raise ValueError(f"Unsupported provider: {self.provider}")
+        generate = {"openai": self.generate_openai, "gemini": self.generate_gemini, "ollama": self.generate_ollama}.get(self.provider)
+        if generate is None:
+            raise ValueError(f"Unsupported provider: {self.provider}")
+        with llm_call(self.provider, self.model):
+            return generate(prompt, instructions, max_tokens, temperature)
 
-    def generate_openai(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> str:
+    def stream(
+        self,
+        prompt: str,
+        instructions: str = "",
+        max_tokens: int = 1800,
+        temperature: float = 0.1,
+    ) -> Iterator[str]:
+        """Like generate, but yields the answer text piece by piece as the model produces it."""
+        stream = {"openai": self.stream_openai, "gemini": self.stream_gemini, "ollama": self.stream_ollama}.get(self.provider)
+        if stream is None:
+            raise ValueError(f"Unsupported provider: {self.provider}")
+        return timed_llm(stream(prompt, instructions, max_tokens, temperature), self.provider, self.model)
+
+    def openai_request(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY is not set")
@@ -137,49 +183,88 @@ class LLMClient:
         # Some reasoning models ignore or reject temperature; keep it opt-in for compatibility.
         if os.environ.get("OPENAI_USE_TEMPERATURE", "").lower() in {"1", "true", "yes"}:
             payload["temperature"] = temperature
-        r = post_json_with_retries(
-            "https://api.openai.com/v1/responses",
-            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-            payload=payload,
-            timeout=self.timeout,
-        )
+        return {
+            "url": "https://api.openai.com/v1/responses",
+            "headers": {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            "payload": payload,
+        }
+
+    def generate_openai(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> str:
+        request = self.openai_request(prompt, instructions, max_tokens, temperature)
+        r = post_json_with_retries(**request, timeout=self.timeout)
         r.raise_for_status()
         text = extract_openai_text(r.json())
         if not text:
             raise RuntimeError("OpenAI response contained no text")
         return text
 
-    def generate_gemini(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> str:
+    def stream_openai(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> Iterator[str]:
+        request = self.openai_request(prompt, instructions, max_tokens, temperature)
+        request["payload"]["stream"] = True
+        with post_json_with_retries(**request, timeout=self.timeout, stream=True) as r:
+            r.raise_for_status()
+            produced = False
+            for data in iter_sse_data(r):
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                kind = event.get("type", "")
+                if kind == "response.output_text.delta" and event.get("delta"):
+                    produced = True
+                    yield str(event["delta"])
+                elif kind in {"error", "response.failed"}:
+                    error = event.get("error") or (event.get("response") or {}).get("error") or event
+                    raise RuntimeError(f"OpenAI stream failed: {error}")
+                elif kind == "response.completed":
+                    break
+        if not produced:
+            raise RuntimeError("OpenAI response contained no text")
+
+    def gemini_request(self, prompt: str, instructions: str, max_tokens: int, temperature: float, method: str) -> Dict[str, Any]:
         api_key = os.environ.get("GEMINI_API_KEY")
         if not api_key:
             raise RuntimeError("GEMINI_API_KEY is not set")
         text = f"{instructions.strip()}\n\n{prompt}".strip()
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent"
-        payload = {
-            "contents": [{"role": "user", "parts": [{"text": text}]}],
-            "generationConfig": {
-                "maxOutputTokens": max_tokens,
-                "temperature": temperature,
+        return {
+            "url": f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:{method}",
+            "headers": {"x-goog-api-key": api_key, "Content-Type": "application/json"},
+            "payload": {
+                "contents": [{"role": "user", "parts": [{"text": text}]}],
+                "generationConfig": {
+                    "maxOutputTokens": max_tokens,
+                    "temperature": temperature,
+                },
             },
         }
-        r = post_json_with_retries(
-            url,
-            headers={"x-goog-api-key": api_key, "Content-Type": "application/json"},
-            payload=payload,
-            timeout=self.timeout,
-        )
+
+    def generate_gemini(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> str:
+        request = self.gemini_request(prompt, instructions, max_tokens, temperature, "generateContent")
+        r = post_json_with_retries(**request, timeout=self.timeout)
         r.raise_for_status()
         text = extract_gemini_text(r.json())
         if not text:
             raise RuntimeError("Gemini response contained no text")
         return text
 
-    def generate_ollama(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> str:
-        url = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
-        payload = {
+    def stream_gemini(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> Iterator[str]:
+        request = self.gemini_request(prompt, instructions, max_tokens, temperature, "streamGenerateContent?alt=sse")
+        with post_json_with_retries(**request, timeout=self.timeout, stream=True) as r:
+            r.raise_for_status()
+            produced = False
+            for data in iter_sse_data(r):
+                for candidate in json.loads(data).get("candidates", []) or []:
+                    for part in (candidate.get("content") or {}).get("parts", []) or []:
+                        if part.get("text"):
+                            produced = True
+                            yield str(part["text"])
+        if not produced:
+            raise RuntimeError("Gemini response contained no text")
+
+    def ollama_payload(self, prompt: str, instructions: str, max_tokens: int, temperature: float, stream: bool) -> Dict[str, Any]:
+        return {
             "model": self.model,
             "prompt": f"{instructions.strip()}\n\n{prompt}".strip(),
-            "stream": False,
+            "stream": stream,
             "think": False,
             "options": {
                 "temperature": temperature,
@@ -187,11 +272,22 @@ class LLMClient:
                 "num_predict": max_tokens,
             },
         }
+
+    def generate_ollama(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> str:
+        url = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+        payload = self.ollama_payload(prompt, instructions, max_tokens, temperature, stream=False)
         r = requests.post(url, json=payload, timeout=self.timeout)
         r.raise_for_status()
         data = r.json()
         return str(data.get("response") or data.get("thinking") or "").strip()
 
+    def stream_ollama(self, prompt: str, instructions: str, max_tokens: int, temperature: float) -> Iterator[str]:
+        url = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+        payload = self.ollama_payload(prompt, instructions, max_tokens, temperature, stream=True)
+        with requests.post(url, json=payload, timeout=self.timeout, stream=True) as r:
+            r.raise_for_status()
+            yield from iter_ollama_text(r)
+
 
 def json_from_text(text: str) -> Dict[str, Any]:
     text = (text or "").strip()
@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import argparse
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+# In-process metrics: counters, gauges and histograms with labels, rendered in the
+# Prometheus text format (0.0.4). Pipeline stages are timed with @timed("stage") into one
+# histogram, a4_stage_seconds{stage=...}, so p50/p95/p99 per stage come from
+# histogram_quantile() in Prometheus or Histogram.quantile() here. Numbers that already
+# live in stats() dicts (caches, lanes, the Telegram client) are read at scrape time by
+# registered collectors instead of being counted twice. The bot serves /metrics on a
+# side port (serve_metrics); the HTTP APIs add a /metrics route.
+
+DEFAULT_METRICS_PORT = int(os.environ.get("A4_METRICS_PORT", "9464"))
+# Seconds; covers SQLite lookups (ms) up to /mission reports (minutes).
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+# (name, kind, help, labels, value) produced by a collector at scrape time.
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def quantile(self, q: float, **labels: Any) -> Optional[float]:
+        """Estimate like Prometheus histogram_quantile: linear inside the bucket that holds rank q."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if not state or not state[2]:
+                return None
+            counts, total = list(state[0]), state[2]
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and seen + count >= rank:
+                if math.isinf(bound):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound if not math.isinf(bound) else lower
+        return lower
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        with self._lock:
+            keys = sorted(self._values)
+        return [dict(zip(self.labelnames, key)) for key in keys]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total_sum, total_count) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(total_sum)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {total_count}")
+        return lines
+
+    def time(self, **labels: Any) -> "_Timer":
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls: type, name: str, help: str, labelnames: Sequence[str], **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"metric {name} already registered as {metric.kind}{list(metric.labelnames)}")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """collector() is called on every scrape and returns (name, kind, help, labels, value) samples."""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        grouped: Dict[str, Tuple[str, str, List[Tuple[Dict[str, str], float]]]] = {}
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue  # a broken collector must not break the scrape
+            for name, kind, help, labels, value in samples:
+                grouped.setdefault(name, (kind, help, []))[2].append((labels, value))
+        for name, (kind, help, samples) in grouped.items():
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}"])
+            for labels, value in samples:
+                lines.append(f"{name}{_label_text(list(labels), list(labels.values()))} {_number(float(value))}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("a4_stage_seconds", "Wall time of a pipeline stage.", ["stage"])
+STAGE_ERRORS = REGISTRY.counter("a4_stage_errors_total", "Pipeline stage calls that raised.", ["stage"])
+LLM_SECONDS = REGISTRY.histogram("a4_llm_seconds", "Wall time of one LLM call.", ["provider", "model", "mode"])
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "a4_llm_first_token_seconds", "Time from a streaming LLM call to its first text.", ["provider", "model"]
+)
+LLM_ERRORS = REGISTRY.counter("a4_llm_errors_total", "LLM calls that failed.", ["provider", "model", "mode"])
+
+
+def timed(stage: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator: record each call's duration in a4_stage_seconds{stage} and failures in a4_stage_errors_total."""
+
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                STAGE_ERRORS.inc(stage=stage)
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def llm_call(provider: str, model: str, mode: str = "generate") -> Iterator[None]:
+    """Time one blocking LLM call into a4_llm_seconds and count it in a4_llm_errors_total if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        LLM_ERRORS.inc(provider=provider, model=model, mode=mode)
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - started, provider=provider, model=model, mode=mode)
+
+
+def timed_llm(pieces: Iterator[str], provider: str, model: str, stage: str = "") -> Iterator[str]:
+    """Pass a streaming LLM response through, recording time to first text, total time and errors."""
+    started = time.perf_counter()
+    first = True
+    try:
+        for piece in pieces:
+            if first:
+                LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, provider=provider, model=model)
+                first = False
+            yield piece
+    except BaseException as exc:
+        if not isinstance(exc, GeneratorExit):
+            LLM_ERRORS.inc(provider=provider, model=model, mode="stream")
+            if stage:
+                STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        LLM_SECONDS.observe(elapsed, provider=provider, model=model, mode="stream")
+        if stage:
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+
+
+def stats_samples(prefix: str, stats: Dict[str, Any], counters: Sequence[str], gauges: Sequence[str] = (), **labels: str) -> List[Sample]:
+    """Samples for numeric fields of a stats() dict: counter hits -> <prefix>_hits_total, gauge size -> <prefix>_size."""
+    out: List[Sample] = []
+    for field in counters:
+        if isinstance(stats.get(field), (int, float)):
+            out.append((f"{prefix}_{field}_total", "counter", f"{field} from stats().", dict(labels), float(stats[field])))
+    for field in gauges:
+        if isinstance(stats.get(field), (int, float)):
+            out.append((f"{prefix}_{field}", "gauge", f"{field} from stats().", dict(labels), float(stats[field])))
+    return out
+
+
+def stage_summary(quantiles: Sequence[float] = (0.5, 0.95, 0.99)) -> Dict[str, Dict[str, Any]]:
+    """{stage: {"count", "p50", "p95", "p99"}} in seconds, for status messages and JSON output."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for labels in STAGE_SECONDS.label_sets():
+        row: Dict[str, Any] = {"count": STAGE_SECONDS.count(**labels)}
+        for q in quantiles:
+            value = STAGE_SECONDS.quantile(q, **labels)
+            row[f"p{int(q * 100)}"] = round(value, 4) if value is not None else None
+        out[labels["stage"]] = row
+    return out
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in {"/metrics", "/"}:
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def serve_metrics(port: int = DEFAULT_METRICS_PORT, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread; returns the server (server_address has the bound port)."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print this process's metrics, or serve them for a quick check.")
+    parser.add_argument("--serve", type=int, default=0, help="Serve /metrics on this port until interrupted.")
+    args = parser.parse_args()
+    if not args.serve:
+        print(REGISTRY.render(), end="")
+        return
+    server = serve_metrics(args.serve)
+    print(f"[metrics] http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
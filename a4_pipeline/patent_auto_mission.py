@@ -3,7 +3,6 @@ from __future__ import annotations
 import argparse
 import json
 import re
-import sqlite3
 import sys
 import time
 from datetime import datetime
@@ -16,8 +15,8 @@ if str(CODE_DIR) not in sys.path:
     sys.path.insert(0, str(CODE_DIR))
 
 from llm_clients import LLMClient, json_from_text  # noqa: E402
-from patent_dictionary_ask import DEFAULT_MODEL, build_prompt_cards  # noqa: E402
-from patent_local_triage import DEFAULT_PACK_DB, search_packs, triage_question  # noqa: E402
+from patent_dictionary_ask import DEFAULT_MODEL  # noqa: E402
+from retrieval_service import RetrievalService, get_service  # noqa: E402
 
 
 DEFAULT_OUTPUT_DIR = Path("/Volumes/외장 2TB/cpu2026/patent_hub/outputs/missions/A4")
@@ -90,39 +89,53 @@ Rules:
     return data
 
 
-def merge_candidates(goal: str, queries: Sequence[str], per_query_limit: int, max_candidates: int) -> List[Dict[str, Any]]:
+def merge_query_packs(merged: Dict[str, Dict[str, Any]], query: str, packs: Sequence[Dict[str, Any]]) -> None:
+    for rank, pack in enumerate(packs, 1):
+        patent_id = pack["patent_id"]
+        entry = merged.get(patent_id)
+        contribution = float(pack.get("score") or 0.0) + max(0.0, 2.0 - rank * 0.15)
+        if not entry:
+            pack = dict(pack)
+            pack["mission_queries"] = [query]
+            pack["mission_score"] = contribution
+            pack["mission_hits"] = 1
+            merged[patent_id] = pack
+        else:
+            entry["mission_queries"].append(query)
+            entry["mission_score"] += contribution * 0.35
+            entry["mission_hits"] += 1
+            if float(pack.get("score") or 0.0) > float(entry.get("score") or 0.0):
+                for key in pack:
+                    if key not in {"mission_queries", "mission_score", "mission_hits"}:
+                        entry[key] = pack[key]
+
+
+def merge_candidates(
+    goal: str,
+    queries: Sequence[str],
+    per_query_limit: int,
+    max_candidates: int,
+    service: RetrievalService | None = None,
+) -> List[Dict[str, Any]]:
+    service = service or get_service()
+    queries = list(queries)
     merged: Dict[str, Dict[str, Any]] = {}
-    for query in queries:
-        result = triage_question(query, limit=per_query_limit)
-        for rank, pack in enumerate(result.get("candidates", []), 1):
-            patent_id = pack["patent_id"]
-            entry = merged.get(patent_id)
-            contribution = float(pack.get("score") or 0.0) + max(0.0, 2.0 - rank * 0.15)
-            if not entry:
-                pack = dict(pack)
-                pack["mission_queries"] = [query]
-                pack["mission_score"] = contribution
-                pack["mission_hits"] = 1
-                merged[patent_id] = pack
-            else:
-                entry["mission_queries"].append(query)
-                entry["mission_score"] += contribution * 0.35
-                entry["mission_hits"] += 1
-                if float(pack.get("score") or 0.0) > float(entry.get("score") or 0.0):
-                    for key in pack:
-                        if key not in {"mission_queries", "mission_score", "mission_hits"}:
-                            entry[key] = pack[key]
+    # All planned queries run concurrently; results are merged in plan order as soon as
+    # every earlier query has arrived, so scores do not depend on which query finished first.
+    arrived: Dict[int, List[Dict[str, Any]]] = {}
+    next_index = 0
+    for index, packs in service.search_packs_many(queries, limit=per_query_limit):
+        arrived[index] = packs
+        while next_index in arrived:
+            merge_query_packs(merged, queries[next_index], arrived.pop(next_index))
+            next_index += 1
 
     if not merged:
-        con = sqlite3.connect(DEFAULT_PACK_DB)
-        try:
-            for pack in search_packs(con, goal, limit=max_candidates):
-                pack["mission_queries"] = [goal]
-                pack["mission_score"] = float(pack.get("score") or 0.0)
-                pack["mission_hits"] = 1
-                merged[pack["patent_id"]] = pack
-        finally:
-            con.close()
+        for pack in service.search_packs(goal, limit=max_candidates):
+            pack["mission_queries"] = [goal]
+            pack["mission_score"] = float(pack.get("score") or 0.0)
+            pack["mission_hits"] = 1
+            merged[pack["patent_id"]] = pack
 
     candidates = list(merged.values())
     for pack in candidates:
@@ -168,14 +181,16 @@ def write_report(
     model: str,
     timeout: int,
     output_dir: Path,
+    service: RetrievalService | None = None,
 ) -> Dict[str, Any]:
+    service = service or get_service()
     output_dir.mkdir(parents=True, exist_ok=True)
     stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     base = output_dir / f"{stamp}_{safe_slug(goal)}"
     json_path = base.with_suffix(".json")
     md_path = base.with_suffix(".md")
 
-    evidence = build_prompt_cards([{"patent_id": c["patent_id"]} for c in candidates])
+    evidence = service.prompt_cards([{"patent_id": c["patent_id"]} for c in candidates])
     mission_cards = [compact_mission_pack(c) for c in candidates]
     prompt = f"""You are running an overnight patent research mission for a local patent dictionary.
 
@@ -253,14 +268,25 @@ def run_mission(
     max_candidates: int = 16,
     timeout: int = 360,
     output_dir: Path = DEFAULT_OUTPUT_DIR,
+    service: RetrievalService | None = None,
 ) -> Dict[str, Any]:
     goal = normalize_ws(goal)
     if not goal:
         raise ValueError("Mission goal is empty")
+    service = service or get_service()
     started = time.monotonic()
     plan = plan_queries(goal, model=model, timeout=timeout, max_queries=max_queries)
-    candidates = merge_candidates(goal, plan["queries"], per_query_limit=per_query_limit, max_candidates=max_candidates)
-    result = write_report(goal, plan, candidates, model=model, timeout=timeout, output_dir=output_dir)
+    retrieval_started = time.monotonic()
+    candidates = merge_candidates(
+        goal,
+        plan["queries"],
+        per_query_limit=per_query_limit,
+        max_candidates=max_candidates,
+        service=service,
+    )
+    retrieval_sec = round(time.monotonic() - retrieval_started, 2)
+    result = write_report(goal, plan, candidates, model=model, timeout=timeout, output_dir=output_dir, service=service)
+    result["retrieval_elapsed_sec"] = retrieval_sec
     result["total_elapsed_sec"] = round(time.monotonic() - started, 1)
     return result
 
@@ -272,6 +298,7 @@ def format_mission_summary(result: Dict[str, Any], max_chars: int = 3200) -> str
         f"- 목표: {result.get('goal')}",
         f"- 모델: {result.get('model')}",
         f"- 후보: {len(candidates)}건",
+        f"- 검색 소요: {result.get('retrieval_elapsed_sec', '-')}초",
         f"- 총 소요: {result.get('total_elapsed_sec', result.get('elapsed_sec'))}초",
         f"- 리포트: {result.get('report_path')}",
         "",
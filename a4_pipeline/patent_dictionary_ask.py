@@ -5,7 +5,7 @@ import json
 import sqlite3
 import sys
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Sequence
 
 import requests
 
@@ -14,7 +14,13 @@ CODE_DIR = Path(__file__).resolve().parent
 if str(CODE_DIR) not in sys.path:
     sys.path.insert(0, str(CODE_DIR))
 
+from card_cache import index_version  # noqa: E402
+from family_index import collapse_families, family_fields, family_map  # noqa: E402
+from llm_clients import iter_ollama_text  # noqa: E402
+from metrics import llm_call, timed, timed_llm  # noqa: E402
 from patent_dictionary_search import DEFAULT_DB, lookup, search  # noqa: E402
+from patent_id_index import resolve_patent_ids  # noqa: E402
+from patent_local_triage import decoded_pack_columns  # noqa: E402
 
 
 OLLAMA_URL = "http://localhost:11434/api/generate"
@@ -71,13 +77,6 @@ def compact_card(card: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def load_json(value: Any) -> Any:
-    try:
-        return json.loads(value or "[]")
-    except Exception:
-        return []
-
-
 def compact_claims(claims: List[Dict[str, Any]], limit: int, chars: int) -> List[Dict[str, Any]]:
     out = []
     for claim in claims[:limit]:
@@ -91,7 +90,7 @@ def compact_claims(claims: List[Dict[str, Any]], limit: int, chars: int) -> List
     return out
 
 
-def pack_lookup(con: sqlite3.Connection, patent_id: str) -> Dict[str, Any] | None:
+def pack_lookup(con: sqlite3.Connection, patent_id: str, version: str | None = None) -> Dict[str, Any] | None:
     con.row_factory = sqlite3.Row
     row = con.execute(
         """
@@ -103,8 +102,25 @@ def pack_lookup(con: sqlite3.Connection, patent_id: str) -> Dict[str, Any] | Non
     ).fetchone()
     if not row:
         return None
-    strong_claims = load_json(row["strong_claims_json"])
-    support_claims = load_json(row["support_claims_json"])
+    return pack_row_to_card(row, index_version(con) if version is None else version)
+
+
+def pack_lookup_many(con: sqlite3.Connection, patent_ids: Sequence[str], version: str | None = None) -> Dict[str, Dict[str, Any]]:
+    """patent_id -> prompt pack for every patent_id found, fetched in one query."""
+    patent_ids = list(dict.fromkeys(patent_ids))
+    if not patent_ids:
+        return {}
+    con.row_factory = sqlite3.Row
+    rows = con.execute(
+        f"SELECT * FROM evidence_pack_index WHERE patent_id IN ({','.join('?' for _ in patent_ids)})",
+        patent_ids,
+    ).fetchall()
+    version = index_version(con) if version is None else version
+    return {row["patent_id"]: pack_row_to_card(row, version) for row in rows}
+
+
+def pack_row_to_card(row: sqlite3.Row, version: str) -> Dict[str, Any]:
+    decoded = decoded_pack_columns(row, version)
     return {
         "patent_id": row["patent_id"],
         "language": row["source_language"],
@@ -112,36 +128,49 @@ def pack_lookup(con: sqlite3.Connection, patent_id: str) -> Dict[str, Any] | Non
         "title_quality": row["title_quality"],
         "minimal_title": row["title_source"],
         "primary_claim_type": row["primary_claim_type"],
-        "secondary_claim_types": load_json(row["secondary_claim_types_json"]),
-        "independent_claim_nos": load_json(row["independent_claim_nos_json"]),
+        "secondary_claim_types": decoded["secondary_claim_types"],
+        "independent_claim_nos": decoded["independent_claim_nos"],
         "core_subject": row["core_subject"],
-        "core_elements": load_json(row["core_elements_json"])[:10],
-        "problem_labels": load_json(row["problem_labels_json"])[:6],
-        "solution_labels": load_json(row["solution_labels_json"])[:8],
-        "effect_labels": load_json(row["effect_labels_json"])[:6],
-        "strong_evidence_ids": load_json(row["strong_evidence_ids_json"])[:10],
-        "weak_evidence_ids": load_json(row["weak_evidence_ids_json"])[:10],
-        "strong_claims": compact_claims(strong_claims, limit=3, chars=900),
-        "support_claims": compact_claims(support_claims, limit=2, chars=450),
+        "core_elements": decoded["core_elements"][:10],
+        "problem_labels": decoded["problem_labels"][:6],
+        "solution_labels": decoded["solution_labels"][:8],
+        "effect_labels": decoded["effect_labels"][:6],
+        "strong_evidence_ids": decoded["strong_evidence_ids"][:10],
+        "weak_evidence_ids": decoded["weak_evidence_ids"][:10],
+        "strong_claims": compact_claims(decoded["strong_claims"], limit=3, chars=900),
+        "support_claims": compact_claims(decoded["support_claims"], limit=2, chars=450),
         "confidence": row["confidence"],
-        "quality_flags": load_json(row["quality_flags_json"]),
+        "quality_flags": decoded["quality_flags"],
     }
 
 
-def build_prompt_cards(cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    if not DEFAULT_PACK_DB.exists():
+def build_prompt_cards(
+    cards: List[Dict[str, Any]],
+    pack_con: sqlite3.Connection | None = None,
+    question: str = "",
+) -> List[Dict[str, Any]]:
+    if pack_con is None and not DEFAULT_PACK_DB.exists():
         return [compact_card(card) for card in cards]
-    con = sqlite3.connect(DEFAULT_PACK_DB)
+    con = pack_con or sqlite3.connect(DEFAULT_PACK_DB)
+    # One prompt card per near-duplicate family; siblings are listed, not repeated.
+    # Patents named in the question each keep their own card, even when they share a family.
+    named = resolve_patent_ids(con, question, len(cards), table="evidence_pack_index") if question else []
+    families = collapse_families([card["patent_id"] for card in cards], family_map(con), keep=named)
+    packs = pack_lookup_many(con, list(families))
     out = []
     for card in cards:
-        pack = pack_lookup(con, card["patent_id"])
-        out.append(pack if pack else compact_card(card))
-    con.close()
+        if card["patent_id"] not in families:
+            continue
+        prompt_card = packs.get(card["patent_id"]) or compact_card(card)
+        prompt_card.update(family_fields(families[card["patent_id"]]))
+        out.append(prompt_card)
+    if pack_con is None:
+        con.close()
     return out
 
 
-def build_prompt(question: str, cards: List[Dict[str, Any]]) -> str:
-    evidence = json.dumps(build_prompt_cards(cards), ensure_ascii=False, indent=2)
+def build_prompt(question: str, cards: List[Dict[str, Any]], pack_con: sqlite3.Connection | None = None) -> str:
+    evidence = json.dumps(build_prompt_cards(cards, pack_con, question=question), ensure_ascii=False, indent=2)
     return f"""You are helping analyze a local patent dictionary.
 
 Answer in Korean, but preserve original patent titles and key technical terms in their source language.
@@ -164,11 +193,11 @@ Use short bullets under these headings only:
 """
 
 
-def ask_llm(prompt: str, model: str, timeout: int, num_predict: int) -> str:
-    payload = {
+def llm_payload(prompt: str, model: str, num_predict: int, stream: bool = False) -> Dict[str, Any]:
+    return {
         "model": model,
         "prompt": prompt,
-        "stream": False,
+        "stream": stream,
         "think": False,
         "options": {
             "temperature": 0.1,
@@ -176,12 +205,28 @@ def ask_llm(prompt: str, model: str, timeout: int, num_predict: int) -> str:
             "num_predict": num_predict,
         },
     }
-    r = requests.post(OLLAMA_URL, json=payload, timeout=timeout)
-    r.raise_for_status()
-    data = r.json()
+
+
+@timed("ask_llm")
+def ask_llm(prompt: str, model: str, timeout: int, num_predict: int) -> str:
+    with llm_call("ollama", model):
+        r = requests.post(OLLAMA_URL, json=llm_payload(prompt, model, num_predict), timeout=timeout)
+        r.raise_for_status()
+        data = r.json()
     return str(data.get("response") or data.get("thinking") or "").strip()
 
 
+def stream_llm(prompt: str, model: str, timeout: int, num_predict: int) -> Iterator[str]:
+    """ask_llm, yielding the answer as Ollama generates it."""
+    yield from timed_llm(_stream_ollama(prompt, model, timeout, num_predict), "ollama", model, stage="ask_llm")
+
+
+def _stream_ollama(prompt: str, model: str, timeout: int, num_predict: int) -> Iterator[str]:
+    with requests.post(OLLAMA_URL, json=llm_payload(prompt, model, num_predict, stream=True), timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        yield from iter_ollama_text(r)
+
+
 def print_context(cards: List[Dict[str, Any]]) -> None:
     print(f"Retrieved patents: {len(cards)}")
     for i, card in enumerate(cards, 1):
@@ -2,87 +2,75 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import re
 import sqlite3
+import sys
 from pathlib import Path
 from typing import Any, Dict, List, Sequence
 
+from card_cache import cached_decode, decode_profile, index_version
+from facet_index import bitmap_from_rowids, facet_index, iter_rowids
+from fts_index import DEFAULT_TOKENIZER, cjk_runs, match_expression, read_fts_tokenizer
+from query_aliases import AliasMatcher, alias_matcher, default_matcher
+from query_cache import QUERY_CACHE, normalize_query
+
 
 DEFAULT_DB = Path(
     "/Volumes/외장 2TB/cpu2026/patent_hub/outputs/indexes/A4/patent_minimal_index.sqlite"
 )
-
-QUERY_ALIASES = {
-    "메모리 평면": ["memory plane", "multiple memory planes", "multi_plane_architecture", "多个存储器平面"],
-    "평면 주소": ["plane address", "no plane address", "no_plane_address_input", "不接收平面地址", "平面地址"],
-    "plane address": ["plane address", "no plane address", "no_plane_address_input", "不接收平面地址", "平面地址"],
-    "독립 명령": ["independent command", "command and address", "独立接收命令和地址", "independent command address"],
-    "independent command": ["independent command", "command and address", "独立接收命令和地址", "independent command address"],
-    "패드 그룹": ["pad group", "plane dedicated pad", "plane_dedicated_pad_group", "平面专用焊盘组"],
-    "pad group": ["pad group", "plane dedicated pad", "plane_dedicated_pad_group", "平面专用焊盘组"],
-    "데이터 경로": ["data path", "separate_data_path", "数据路径", "데이터 경로"],
-    "페이지 버퍼": ["page buffer", "page_buffer_circuit", "页缓冲器", "페이지 버퍼"],
-    "워드 라인": ["word line", "word_line_control", "字线", "워드 라인"],
-    "비트 라인": ["bit line", "bit_line_connection", "位线", "비트 라인"],
-    "읽기 전압": ["read voltage", "read_reference_voltage_control", "读取电压", "읽기 전압"],
-    "garbage collection": ["garbage collection", "flash_garbage_collection", "垃圾回收"],
-    "가비지 컬렉션": ["garbage collection", "flash_garbage_collection", "垃圾回收"],
-    "ssd": ["SSD", "solid state drive", "solid_state_drive_data_operation", "固态硬盘"],
-    "ssd accelerator": ["SSD accelerator", "accelerator", "token manager", "non-volatile memory array"],
-    "펌웨어": ["firmware", "firmware_upgrade_control", "固件", "펌웨어"],
-    "암호화": ["encryption", "decryption", "encryption_decryption_processing", "암호화"],
-}
+# Facet filters matching at most this many rows are pushed into SQL as a rowid list.
+FACET_SQL_IN_MAX = int(os.environ.get("A4_FACET_SQL_IN_MAX", "2000"))
 
 
 def normalize_ws(value: Any) -> str:
     return re.sub(r"\s+", " ", str(value or "")).strip()
 
 
-def load_json(value: str) -> Any:
-    try:
-        return json.loads(value or "[]")
-    except Exception:
-        return []
-
-
-def expand_query(query: str) -> List[str]:
-    query = normalize_ws(query)
-    terms = [query] if query else []
-    lower = query.lower()
-    for key, aliases in QUERY_ALIASES.items():
-        if key.lower() in lower:
-            terms.extend(aliases)
-    return list(dict.fromkeys([t for t in terms if t]))
-
-
-def fts_phrase(term: str) -> str:
-    escaped = term.replace('"', '""')
-    return f'"{escaped}"'
+def expand_query(query: str, aliases: AliasMatcher | None = None) -> List[str]:
+    """The query plus the aliases of every dictionary key it contains (seed aliases by default)."""
+    return (aliases or default_matcher()).expand(query)
 
 
-def fts_query(query: str) -> str:
-    terms = expand_query(query)
+def fts_query(query: str, tokenizer: str = DEFAULT_TOKENIZER, aliases: AliasMatcher | None = None) -> str:
+    terms = expand_query(query, aliases)
     if not terms:
         return ""
-    return " OR ".join(fts_phrase(t) for t in terms)
+    if tokenizer != DEFAULT_TOKENIZER:
+        # CJK-aware indexes match inside Han/Hangul runs, so each run is a useful phrase.
+        terms.extend(cjk_runs(query))
+    return match_expression(terms, tokenizer)
+
+
+CARD_JSON_COLUMNS = (
+    "secondary_claim_types_json",
+    "independent_claim_nos_json",
+    "core_elements_json",
+    "problem_labels_json",
+    "solution_labels_json",
+    "effect_labels_json",
+    "evidence_ids_json",
+    "qc_flags_json",
+)
 
 
-def row_to_card(row: sqlite3.Row) -> Dict[str, Any]:
+def row_to_card(row: sqlite3.Row, version: str = "") -> Dict[str, Any]:
+    decoded = cached_decode("minimal", row["patent_id"], version, row, CARD_JSON_COLUMNS)
     return {
         "patent_id": row["patent_id"],
         "language": row["source_language"],
         "title": row["title_source"],
         "primary_claim_type": row["primary_claim_type"],
-        "secondary_claim_types": load_json(row["secondary_claim_types_json"]),
-        "independent_claim_nos": load_json(row["independent_claim_nos_json"]),
+        "secondary_claim_types": decoded["secondary_claim_types"],
+        "independent_claim_nos": decoded["independent_claim_nos"],
         "core_subject": row["core_subject"],
-        "core_elements": load_json(row["core_elements_json"]),
-        "problem_labels": load_json(row["problem_labels_json"]),
-        "solution_labels": load_json(row["solution_labels_json"]),
-        "effect_labels": load_json(row["effect_labels_json"]),
-        "evidence_ids": load_json(row["evidence_ids_json"]),
+        "core_elements": decoded["core_elements"],
+        "problem_labels": decoded["problem_labels"],
+        "solution_labels": decoded["solution_labels"],
+        "effect_labels": decoded["effect_labels"],
+        "evidence_ids": decoded["evidence_ids"],
         "confidence": row["confidence"],
-        "qc_flags": load_json(row["qc_flags_json"]),
+        "qc_flags": decoded["qc_flags"],
         "json_path": row["json_path"],
         "score": row["score"] if "score" in row.keys() else None,
     }
@@ -96,6 +84,25 @@ def search(
     claim_type: str = "",
     label: str = "",
     include_qc: bool = False,
+) -> List[Dict[str, Any]]:
+    version = index_version(con)
+    return QUERY_CACHE.get_or_compute(
+        "search",
+        version,
+        (normalize_query(query), language, claim_type, label, bool(include_qc), limit),
+        lambda: _search(con, query, limit, language, claim_type, label, include_qc, version),
+    )
+
+
+def _search(
+    con: sqlite3.Connection,
+    query: str,
+    limit: int,
+    language: str,
+    claim_type: str,
+    label: str,
+    include_qc: bool,
+    version: str,
 ) -> List[Dict[str, Any]]:
     con.row_factory = sqlite3.Row
     params: List[Any] = []
@@ -103,13 +110,22 @@ def search(
     score_expr = "0.0 AS score"
     from_expr = "minimal_index mi"
 
-    match = fts_query(query)
+    match = fts_query(query, read_fts_tokenizer(con), alias_matcher(con))
+    if normalize_ws(query) and not match:
+        # trigram indexes cannot match terms shorter than three characters.
+        return []
     if match:
-        from_expr = "minimal_index_fts fts JOIN minimal_index mi ON mi.patent_id = fts.patent_id"
+        from_expr = "minimal_index_fts fts JOIN minimal_index mi ON mi.rowid = fts.rowid"
         where.append("minimal_index_fts MATCH ?")
         params.append(match)
         score_expr = "bm25(minimal_index_fts) AS score"
 
+    facets = facet_index(con)
+    if facets is not None:
+        allowed = facets.select(language, claim_type, label, include_qc)
+        if allowed is not None:
+            return _search_within(con, allowed, facets.universe, from_expr, where, params, score_expr, limit, version)
+
     if language:
         where.append("mi.source_language = ?")
         params.append(language)
@@ -130,7 +146,103 @@ def search(
         LIMIT ?
     """
     params.append(limit)
-    return [row_to_card(row) for row in con.execute(sql, params).fetchall()]
+    return [row_to_card(row, version) for row in con.execute(sql, params).fetchall()]
+
+
+def _search_within(
+    con: sqlite3.Connection,
+    allowed: int,
+    universe: int,
+    from_expr: str,
+    where: List[str],
+    params: List[Any],
+    score_expr: str,
+    limit: int,
+    version: str,
+) -> List[Dict[str, Any]]:
+    """Top rows inside a facet bitmap; only rows that pass the bitmap are decoded into cards."""
+    selected = allowed.bit_count()
+    if not selected or limit <= 0:
+        return []
+    where = list(where)
+    params = list(params)
+    window: int | None = limit
+    if selected <= FACET_SQL_IN_MAX:
+        # Selective filter: hand the row set to SQLite so only those rows are scored.
+        where.append("mi.rowid IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(iter_rowids(allowed))))
+    elif selected < universe.bit_count():
+        # Broad filter: rank a window sized by the filter's selectivity and test bits.
+        window = limit + int(limit * 1.5 * universe.bit_count() / selected)
+    sql = f"""
+        SELECT mi.rowid AS facet_rowid, mi.*, {score_expr}
+        FROM {from_expr}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY score ASC, mi.confidence DESC, mi.patent_id ASC
+    """
+    while True:
+        ranked = con.execute(sql + ("LIMIT ?" if window else ""), params + ([window] if window else [])).fetchall()
+        hits = [row for row in ranked if allowed >> row["facet_rowid"] & 1][:limit]
+        if len(hits) >= limit or window is None or len(ranked) < window:
+            break
+        window = None
+    return [row_to_card(row, version) for row in hits]
+
+
+def facet_counts(
+    con: sqlite3.Connection,
+    query: str,
+    language: str = "",
+    claim_type: str = "",
+    label: str = "",
+    include_qc: bool = False,
+    top: int = 8,
+) -> Dict[str, Any] | None:
+    """Per-facet row counts for a query and filters, or None when the index has no facet bitmaps."""
+    facets = facet_index(con)
+    if facets is None:
+        return None
+    version = facets.version
+    return QUERY_CACHE.get_or_compute(
+        "facets",
+        version,
+        (normalize_query(query), language, claim_type, label, bool(include_qc), top),
+        lambda: _facet_counts(con, facets, query, language, claim_type, label, include_qc, top),
+    )
+
+
+def _facet_counts(
+    con: sqlite3.Connection,
+    facets: Any,
+    query: str,
+    language: str,
+    claim_type: str,
+    label: str,
+    include_qc: bool,
+    top: int,
+) -> Dict[str, Any]:
+    matched = facets.universe
+    match = fts_query(query, read_fts_tokenizer(con), alias_matcher(con)) if normalize_ws(query) else ""
+    if normalize_ws(query):
+        rowids = (
+            [rowid for (rowid,) in con.execute("SELECT rowid FROM minimal_index_fts WHERE minimal_index_fts MATCH ?", (match,))]
+            if match
+            else []
+        )
+        matched = bitmap_from_rowids(rowids)
+    selected = facets.select(language, claim_type, label, include_qc)
+    within = matched if selected is None else matched & selected
+    # QC counts ignore the QC filter so they show how many matches it hides.
+    qc_scope = facets.select(language, claim_type, label, include_qc=True)
+    out: Dict[str, Any] = {
+        "query": query,
+        "matched": matched.bit_count(),
+        "selected": within.bit_count(),
+    }
+    for facet in ("language", "claim_type", "label"):
+        out[facet] = dict(facets.counts(facet, within, top))
+    out["qc"] = dict(facets.counts("qc", matched if qc_scope is None else matched & qc_scope, top))
+    return out
 
 
 def lookup(con: sqlite3.Connection, patent_id: str) -> Dict[str, Any] | None:
@@ -139,7 +251,21 @@ def lookup(con: sqlite3.Connection, patent_id: str) -> Dict[str, Any] | None:
         "SELECT *, 0.0 AS score FROM minimal_index WHERE patent_id = ?",
         (patent_id,),
     ).fetchone()
-    return row_to_card(row) if row else None
+    return row_to_card(row, index_version(con)) if row else None
+
+
+def lookup_many(con: sqlite3.Connection, patent_ids: Sequence[str]) -> List[Dict[str, Any]]:
+    """Cards for patent_ids in the given order, fetched in one query."""
+    if not patent_ids:
+        return []
+    con.row_factory = sqlite3.Row
+    rows = con.execute(
+        f"SELECT *, 0.0 AS score FROM minimal_index WHERE patent_id IN ({','.join('?' for _ in patent_ids)})",
+        list(patent_ids),
+    ).fetchall()
+    version = index_version(con)
+    by_id = {row["patent_id"]: row_to_card(row, version) for row in rows}
+    return [by_id[patent_id] for patent_id in patent_ids if patent_id in by_id]
 
 
 def print_card(card: Dict[str, Any], rank: int) -> None:
@@ -172,20 +298,37 @@ def main() -> None:
     parser.add_argument("--label", default="", help="Exact label filter, e.g. page_buffer_circuit")
     parser.add_argument("--include-qc", action="store_true", help="Include rows with QC flags")
     parser.add_argument("--json", action="store_true", help="Emit JSON instead of readable cards")
+    parser.add_argument("--facets", action="store_true", help="Print facet counts for the query and filters")
+    parser.add_argument("--profile", action="store_true", help="Print card decode counters to stderr")
     args = parser.parse_args()
 
     con = sqlite3.connect(args.db)
-    exact = lookup(con, args.query) if args.query else None
-    cards = [exact] if exact else search(
-        con,
-        args.query,
-        args.limit,
-        language=args.lang,
-        claim_type=args.claim_type,
-        label=args.label,
-        include_qc=args.include_qc,
-    )
+    if args.facets:
+        counts = facet_counts(
+            con,
+            args.query,
+            language=args.lang,
+            claim_type=args.claim_type,
+            label=args.label,
+            include_qc=args.include_qc,
+        )
+        print(json.dumps(counts, ensure_ascii=False, indent=2))
+        return
+
+    with decode_profile() as profile:
+        exact = lookup(con, args.query) if args.query else None
+        cards = [exact] if exact else search(
+            con,
+            args.query,
+            args.limit,
+            language=args.lang,
+            claim_type=args.claim_type,
+            label=args.label,
+            include_qc=args.include_qc,
+        )
     cards = [c for c in cards if c]
+    if args.profile:
+        print(f"[profile] decode={json.dumps(profile)}", file=sys.stderr)
 
     if args.json:
         print(json.dumps(cards, ensure_ascii=False, indent=2))
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+from typing import Any, Iterable, List, Sequence, Tuple
+
+
+# patent_id looks like <country><publication digits><kind code>p, e.g. cn115543210ap or
+# us20250191658a1p. Users type bare digit fragments ("191658", "0191658"), full
+# publication numbers ("US20250191658A1") or the patent_id itself. Instead of scanning
+# minimal_index with LIKE '%fragment%', builders store every lookup key per patent in
+# patent_id_keys and readers resolve all fragments of a message in one indexed query.
+
+PATENT_ID_RE = re.compile(r"\b(?:us|cn|kr)[a-z0-9]{6,}p\b", re.I)
+PATENT_NUMBER_RE = re.compile(r"\d{7,}")
+PUBLICATION_RE = re.compile(r"\b(us|cn|kr)[\s-]*(\d{6,})[\s-]*([a-z]\d?)?\b", re.I)
+ID_PARTS_RE = re.compile(r"^(us|cn|kr)(\d+)([a-z]\d?)?p?$")
+MIN_FRAGMENT_LEN = 6
+
+
+def split_patent_id(patent_id: str) -> Tuple[str, str, str]:
+    match = ID_PARTS_RE.match(patent_id.lower())
+    if not match:
+        return patent_id[:2].lower(), "", ""
+    return match.group(1), match.group(2), match.group(3) or ""
+
+
+def patent_id_keys(patent_id: str) -> List[Tuple[str, int]]:
+    """(key, exact) pairs. Digit keys are every substring that starts with a nonzero
+    digit, so a fragment matches iff its zero-stripped form occurs in the number."""
+    patent_id = patent_id.lower()
+    country, digits, kind = split_patent_id(patent_id)
+    keys: dict[str, int] = {patent_id: 1}
+    if digits:
+        body = digits.lstrip("0") or digits
+        keys[f"{country}{digits}"] = 1
+        if kind:
+            keys[f"{country}{digits}{kind}"] = 1
+            keys[f"{digits}{kind}"] = 1
+        for start, char in enumerate(digits):
+            if char == "0":
+                continue
+            for end in range(start + MIN_FRAGMENT_LEN, len(digits) + 1):
+                key = digits[start:end]
+                keys[key] = max(keys.get(key, 0), int(key == body))
+    return list(keys.items())
+
+
+def create_id_index(con: sqlite3.Connection, patent_ids: Iterable[str]) -> int:
+    con.execute("DROP TABLE IF EXISTS patent_id_keys")
+    con.execute(
+        """
+        CREATE TABLE patent_id_keys (
+            key TEXT NOT NULL,
+            patent_id TEXT NOT NULL,
+            country TEXT NOT NULL,
+            exact INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (key, patent_id)
+        ) WITHOUT ROWID
+        """
+    )
+    rows = (
+        (key, patent_id.lower(), patent_id[:2].lower(), exact)
+        for patent_id in patent_ids
+        for key, exact in patent_id_keys(patent_id)
+    )
+    cur = con.executemany("INSERT OR IGNORE INTO patent_id_keys (key, patent_id, country, exact) VALUES (?, ?, ?, ?)", rows)
+    con.commit()
+    return cur.rowcount
+
+
+def country_hint(text: str) -> str:
+    lower = (text or "").lower()
+    if "us" in lower or "미국" in lower:
+        return "us"
+    if "cn" in lower or "중국" in lower:
+        return "cn"
+    if "kr" in lower or "한국" in lower:
+        return "kr"
+    return ""
+
+
+def query_keys(text: str) -> List[str]:
+    """Lookup keys for a free-text message, most specific first."""
+    keys: List[str] = []
+    for match in PATENT_ID_RE.finditer(text or ""):
+        keys.append(match.group(0).lower())
+    for match in PUBLICATION_RE.finditer(text or ""):
+        country, digits, kind = match.group(1).lower(), match.group(2), (match.group(3) or "").lower()
+        keys.extend([f"{country}{digits}{kind}", f"{country}{digits}"])
+    for fragment in PATENT_NUMBER_RE.findall(text or ""):
+        keys.append(fragment.lstrip("0") or fragment)
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+def has_id_index(con: sqlite3.Connection) -> bool:
+    row = con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='patent_id_keys'").fetchone()
+    return bool(row)
+
+
+def resolve_patent_ids(
+    con: sqlite3.Connection,
+    text: str,
+    limit: int,
+    table: str = "minimal_index",
+    prefix: str | None = None,
+) -> List[str]:
+    """Ranked patent_ids for the numbers in text: exact matches first, then shorter ids."""
+    country = country_hint(text) if prefix is None else prefix
+    return resolve_keys(con, query_keys(text), limit, table=table, country=country)
+
+
+def value_keys(value: str) -> List[str]:
+    """Keys for a single structured patent number, e.g. from an LLM query plan."""
+    compact = re.sub(r"[^a-z0-9]", "", str(value or "").lower())
+    return list(dict.fromkeys([*query_keys(str(value or "")), compact.lstrip("0") or compact]))
+
+
+def resolve_keys(
+    con: sqlite3.Connection,
+    keys: Sequence[str],
+    limit: int,
+    table: str = "minimal_index",
+    country: str = "",
+) -> List[str]:
+    keys = [key for key in dict.fromkeys(keys) if key]
+    if not keys:
+        return []
+    if not has_id_index(con):
+        return _resolve_by_scan(con, keys, limit, table, country)
+    placeholders = ",".join("?" for _ in keys)
+    params: List[Any] = list(keys)
+    where = f"key IN ({placeholders})"
+    if country:
+        where += " AND country = ?"
+        params.append(country)
+    rows = con.execute(
+        f"""
+        SELECT patent_id
+        FROM patent_id_keys
+        WHERE {where}
+        GROUP BY patent_id
+        ORDER BY MAX(exact) DESC, length(patent_id), patent_id
+        LIMIT ?
+        """,
+        [*params, limit],
+    ).fetchall()
+    return [str(row[0]) for row in rows]
+
+
+def _resolve_by_scan(con: sqlite3.Connection, keys: Sequence[str], limit: int, table: str, country: str) -> List[str]:
+    # Indexes built before patent_id_keys existed.
+    out: List[str] = []
+    for key in keys:
+        params: List[Any] = [f"%{key}%"]
+        where = "patent_id LIKE ?"
+        if country:
+            where += " AND patent_id LIKE ?"
+            params.append(f"{country}%")
+        rows = con.execute(
+            f"SELECT patent_id FROM {table} WHERE {where} ORDER BY length(patent_id), patent_id LIMIT ?",
+            [*params, limit],
+        ).fetchall()
+        for (patent_id,) in rows:
+            if patent_id not in out:
+                out.append(patent_id)
+            if len(out) >= limit:
+                return out
+    return out
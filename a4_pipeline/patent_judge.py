@@ -4,15 +4,17 @@ import argparse
 import json
 import sys
 import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 CODE_DIR = Path(__file__).resolve().parent
 if str(CODE_DIR) not in sys.path:
     sys.path.insert(0, str(CODE_DIR))
 
-from evidence_pack import build_evidence_pack  # noqa: E402
 from llm_clients import LLMClient  # noqa: E402
+from metrics import timed  # noqa: E402
+from retrieval_service import RetrievalService, get_service  # noqa: E402
 
 
 JUDGE_INSTRUCTIONS = """You are a patent analysis judge.
@@ -41,6 +43,21 @@ Write under these headings:
 """
 
 
+@lru_cache(maxsize=16)
+def judge_clients(
+    provider: str = "auto",
+    model: str = "",
+    planner_provider: str = "auto",
+    planner_model: str = "",
+    timeout: int = 240,
+) -> Tuple[LLMClient, Optional[LLMClient]]:
+    """(judge, planner) clients, built once per setting instead of on every question."""
+    judge_client = LLMClient(provider, model=model or None, timeout=timeout)
+    planner_client = None if planner_provider == "none" else LLMClient(planner_provider, model=planner_model or model or None, timeout=timeout)
+    return judge_client, planner_client
+
+
+@timed("judge_question")
 def judge_question(
     question: str,
     provider: str = "auto",
@@ -50,13 +67,25 @@ def judge_question(
     limit: int = 8,
     max_tokens: int = 2200,
     timeout: int = 240,
+    service: RetrievalService | None = None,
+    on_text: Callable[[str], None] | None = None,
 ) -> Dict[str, Any]:
+    """With on_text, the answer is streamed and on_text gets the text so far after each piece."""
     started = time.monotonic()
-    judge_client = LLMClient(provider, model=model or None, timeout=timeout)
-    planner_client = None if planner_provider == "none" else LLMClient(planner_provider, model=planner_model or model or None, timeout=timeout)
-    pack = build_evidence_pack(question, planner_client=planner_client, limit=limit)
+    judge_client, planner_client = judge_clients(provider, model, planner_provider, planner_model, timeout)
+    pack = (service or get_service()).evidence_pack(question, planner_client=planner_client, limit=limit)
     prompt = build_judge_prompt(question, pack)
-    answer = judge_client.generate(prompt, instructions=JUDGE_INSTRUCTIONS, max_tokens=max_tokens, temperature=0.1)
+    first_token_sec = None
+    if on_text is None:
+        answer = judge_client.generate(prompt, instructions=JUDGE_INSTRUCTIONS, max_tokens=max_tokens, temperature=0.1)
+    else:
+        parts: List[str] = []
+        for piece in judge_client.stream(prompt, instructions=JUDGE_INSTRUCTIONS, max_tokens=max_tokens, temperature=0.1):
+            if first_token_sec is None:
+                first_token_sec = round(time.monotonic() - started, 1)
+            parts.append(piece)
+            on_text("".join(parts))
+        answer = "".join(parts).strip()
     elapsed = time.monotonic() - started
     return {
         "provider": judge_client.provider,
@@ -64,6 +93,7 @@ def judge_question(
         "planner_provider": planner_client.provider if planner_client else "none",
         "planner_model": planner_client.model if planner_client else "fallback",
         "elapsed_sec": round(elapsed, 1),
+        "first_token_sec": first_token_sec,
         "answer": answer,
         "evidence_pack": pack,
     }
@@ -81,8 +111,17 @@ def main() -> None:
     parser.add_argument("--timeout", type=int, default=240)
     parser.add_argument("--show-pack", action="store_true")
     parser.add_argument("--json", action="store_true")
+    parser.add_argument("--stream", action="store_true", help="Print the answer while it is generated.")
     args = parser.parse_args()
 
+    shown = [0]
+
+    def print_new(text: str) -> None:
+        if shown[0] == 0:
+            print("--- Answer (streaming) ---")
+        print(text[shown[0]:], end="", flush=True)
+        shown[0] = len(text)
+
     result = judge_question(
         args.question,
         provider=args.provider,
@@ -92,15 +131,21 @@ def main() -> None:
         limit=args.limit,
         max_tokens=args.max_tokens,
         timeout=args.timeout,
+        on_text=print_new if args.stream and not args.json else None,
     )
+    if shown[0]:
+        print()
     if args.json:
         print(json.dumps(result, ensure_ascii=False, indent=2))
         return
     print(f"Provider: {result['provider']} / {result['model']}")
     print(f"Planner: {result['planner_provider']} / {result['planner_model']}")
     print(f"Elapsed: {result['elapsed_sec']} sec")
-    print("\n--- Answer ---")
-    print(result["answer"])
+    if result["first_token_sec"] is not None:
+        print(f"First token: {result['first_token_sec']} sec")
+    else:
+        print("\n--- Answer ---")
+        print(result["answer"])
     if args.show_pack:
         print("\n--- Evidence pack ---")
         print(json.dumps(result["evidence_pack"], ensure_ascii=False, indent=2))
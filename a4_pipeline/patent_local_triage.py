@@ -5,17 +5,24 @@ import json
 import math
 import re
 import sqlite3
+import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Sequence
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
 
+from card_cache import cached_decode, decode_profile, index_version
+from family_index import collapse_families, family_fields, family_map
+from fts_index import DEFAULT_TOKENIZER, match_expression, read_fts_tokenizer
+from metrics import timed
 from patent_dictionary_search import expand_query
+from patent_id_index import resolve_patent_ids
+from query_aliases import TRIAGE_PHRASES, AliasMatcher, alias_matcher, default_matcher
+from query_cache import QUERY_CACHE, normalize_query
 
 
 DEFAULT_PACK_DB = Path(
     "/Volumes/외장 2TB/cpu2026/patent_hub/outputs/indexes/A4/patent_evidence_pack_index.sqlite"
 )
-PATENT_ID_RE = re.compile(r"\b(?:us|cn|kr)[a-z0-9]{6,}p\b", re.I)
-PATENT_NUMBER_RE = re.compile(r"\d{7,}")
 TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9_+-]{2,}|[가-힣]{2,}|[\u4e00-\u9fff]{2,}")
 
 GEMINI_WORTHY_TERMS = {
@@ -35,13 +42,6 @@ def normalize_ws(value: Any) -> str:
     return re.sub(r"\s+", " ", str(value or "")).strip()
 
 
-def load_json(value: Any) -> Any:
-    try:
-        return json.loads(value or "[]")
-    except Exception:
-        return []
-
-
 def unique_keep_order(items: Iterable[Any]) -> List[str]:
     out: List[str] = []
     seen = set()
@@ -54,33 +54,36 @@ def unique_keep_order(items: Iterable[Any]) -> List[str]:
     return out
 
 
-def fts_phrase(term: str) -> str:
-    return f'"{term.replace(chr(34), chr(34) * 2)}"'
-
-
-def fts_query(query: str) -> str:
+def fts_query(query: str, tokenizer: str = DEFAULT_TOKENIZER, aliases: AliasMatcher | None = None) -> str:
     terms = []
-    for value in expand_query(query):
+    for value in expand_query(query, aliases):
         terms.append(value)
         terms.extend(TOKEN_RE.findall(value))
     terms = [term for term in unique_keep_order(terms) if len(term) >= 2]
-    return " OR ".join(fts_phrase(term) for term in terms[:24])
+    return match_expression(terms, tokenizer, max_terms=24)
+
+
+PACK_JSON_COLUMNS = (
+    "secondary_claim_types_json",
+    "independent_claim_nos_json",
+    "core_elements_json",
+    "problem_labels_json",
+    "solution_labels_json",
+    "effect_labels_json",
+    "strong_evidence_ids_json",
+    "weak_evidence_ids_json",
+    "strong_claims_json",
+    "support_claims_json",
+    "quality_flags_json",
+)
 
 
-def extract_patent_prefix(text: str) -> str:
-    lower = text.lower()
-    if "us" in lower or "미국" in lower:
-        return "us"
-    if "cn" in lower or "중국" in lower:
-        return "cn"
-    if "kr" in lower or "한국" in lower:
-        return "kr"
-    return ""
+def decoded_pack_columns(row: sqlite3.Row, version: str = "") -> Dict[str, Any]:
+    return cached_decode("pack", row["patent_id"], version, row, PACK_JSON_COLUMNS)
 
 
-def row_to_pack(row: sqlite3.Row, score: float = 0.0) -> Dict[str, Any]:
-    strong_claims = load_json(row["strong_claims_json"])
-    support_claims = load_json(row["support_claims_json"])
+def row_to_pack(row: sqlite3.Row, score: float = 0.0, version: str = "") -> Dict[str, Any]:
+    decoded = decoded_pack_columns(row, version)
     return {
         "patent_id": row["patent_id"],
         "language": row["source_language"],
@@ -88,71 +91,66 @@ def row_to_pack(row: sqlite3.Row, score: float = 0.0) -> Dict[str, Any]:
         "title_quality": row["title_quality"],
         "core_subject": row["core_subject"],
         "primary_claim_type": row["primary_claim_type"],
-        "independent_claim_nos": load_json(row["independent_claim_nos_json"]),
-        "core_elements": load_json(row["core_elements_json"]),
-        "problem_labels": load_json(row["problem_labels_json"]),
-        "solution_labels": load_json(row["solution_labels_json"]),
-        "effect_labels": load_json(row["effect_labels_json"]),
-        "strong_evidence_ids": load_json(row["strong_evidence_ids_json"]),
-        "weak_evidence_ids": load_json(row["weak_evidence_ids_json"]),
-        "quality_flags": load_json(row["quality_flags_json"]),
+        "independent_claim_nos": decoded["independent_claim_nos"],
+        "core_elements": decoded["core_elements"],
+        "problem_labels": decoded["problem_labels"],
+        "solution_labels": decoded["solution_labels"],
+        "effect_labels": decoded["effect_labels"],
+        "strong_evidence_ids": decoded["strong_evidence_ids"],
+        "weak_evidence_ids": decoded["weak_evidence_ids"],
+        "quality_flags": decoded["quality_flags"],
         "confidence": float(row["confidence"] or 0.0),
-        "strong_claims": strong_claims,
-        "support_claims": support_claims,
+        "strong_claims": decoded["strong_claims"],
+        "support_claims": decoded["support_claims"],
         "score": round(score, 3),
     }
 
 
-def direct_patent_matches(con: sqlite3.Connection, question: str, limit: int) -> List[Dict[str, Any]]:
+def direct_patent_matches(con: sqlite3.Connection, patent_ids: Sequence[str]) -> List[Dict[str, Any]]:
     con.row_factory = sqlite3.Row
-    match = PATENT_ID_RE.search(question or "")
-    candidates: List[str] = []
-    if match:
-        candidates.append(match.group(0).lower())
-    prefix = extract_patent_prefix(question)
-    for fragment in PATENT_NUMBER_RE.findall(question or ""):
-        stripped = fragment.lstrip("0") or fragment
-        candidates.extend([fragment.lower(), stripped.lower()])
-    seen = set()
+    if not patent_ids:
+        return []
+    rows = con.execute(
+        f"SELECT *, 0.0 AS bm25_score FROM evidence_pack_index WHERE patent_id IN ({','.join('?' for _ in patent_ids)})",
+        patent_ids,
+    ).fetchall()
+    by_id = {row["patent_id"]: row for row in rows}
+    version = index_version(con)
     packs: List[Dict[str, Any]] = []
-    for candidate in unique_keep_order(candidates):
-        if PATENT_ID_RE.fullmatch(candidate):
-            rows = con.execute("SELECT *, 0.0 AS bm25_score FROM evidence_pack_index WHERE patent_id=?", (candidate,)).fetchall()
-        else:
-            where = "patent_id LIKE ?"
-            params: List[Any] = [f"%{candidate}%"]
-            if prefix:
-                where += " AND patent_id LIKE ?"
-                params.append(f"{prefix}%")
-            rows = con.execute(
-                f"SELECT *, 0.0 AS bm25_score FROM evidence_pack_index WHERE {where} ORDER BY length(patent_id), patent_id LIMIT ?",
-                [*params, limit],
-            ).fetchall()
-        for row in rows:
-            if row["patent_id"] in seen:
-                continue
-            seen.add(row["patent_id"])
-            pack = row_to_pack(row, score=100.0)
-            pack["why_selected"] = ["explicit patent number match"]
-            packs.append(pack)
-            if len(packs) >= limit:
-                return packs
+    for patent_id in patent_ids:
+        if patent_id not in by_id:
+            continue
+        pack = row_to_pack(by_id[patent_id], score=100.0, version=version)
+        pack["why_selected"] = ["explicit patent number match"]
+        packs.append(pack)
     return packs
 
 
 def search_packs(con: sqlite3.Connection, question: str, limit: int, pool: int = 40) -> List[Dict[str, Any]]:
+    version = index_version(con)
+    return QUERY_CACHE.get_or_compute(
+        "packs",
+        version,
+        (normalize_query(question), limit, pool),
+        lambda: _search_packs(con, question, limit, pool, version),
+    )
+
+
+def _search_packs(con: sqlite3.Connection, question: str, limit: int, pool: int, version: str) -> List[Dict[str, Any]]:
     con.row_factory = sqlite3.Row
-    direct = direct_patent_matches(con, question, limit)
+    named = resolve_patent_ids(con, question, limit, table="evidence_pack_index")
+    direct = direct_patent_matches(con, named)
     if direct:
         return direct[:limit]
-    match = fts_query(question)
+    aliases = alias_matcher(con)
+    match = fts_query(question, read_fts_tokenizer(con), aliases)
     if not match:
         return []
     rows = con.execute(
         """
         SELECT epi.*, bm25(evidence_pack_fts) AS bm25_score
         FROM evidence_pack_fts fts
-        JOIN evidence_pack_index epi ON epi.patent_id = fts.patent_id
+        JOIN evidence_pack_index epi ON epi.rowid = fts.rowid
         WHERE evidence_pack_fts MATCH ?
         ORDER BY bm25(evidence_pack_fts) ASC, epi.confidence DESC
         LIMIT ?
@@ -163,36 +161,58 @@ def search_packs(con: sqlite3.Connection, question: str, limit: int, pool: int =
     for row in rows:
         bm25_score = float(row["bm25_score"] or 0.0)
         score = max(0.0, min(20.0, -bm25_score))
-        score += term_fit_score(question, row)
+        score += term_fit_score(question, row, version, aliases)
         score += float(row["confidence"] or 0.0)
-        flags = set(load_json(row["quality_flags_json"]))
+        flags = set(decoded_pack_columns(row, version)["quality_flags"])
         score -= 0.8 * len(flags & HIGH_RISK_FLAGS)
         score -= 0.2 * len(flags & LOW_RISK_FLAGS)
-        pack = row_to_pack(row, score=score)
-        pack["why_selected"] = explain_match(question, pack)
+        pack = row_to_pack(row, score=score, version=version)
+        pack["why_selected"] = explain_match(question, pack, aliases)
         packs.append(pack)
     packs.sort(key=lambda item: item["score"], reverse=True)
-    return packs[:limit]
+    return collapse_pack_families(con, packs, keep=named)[:limit]
 
 
-def term_fit_score(question: str, row: sqlite3.Row) -> float:
-    query_terms = [
-        term.lower()
-        for term in unique_keep_order([*expand_query(question), *TOKEN_RE.findall(question.lower())])
-        if len(term) >= 2
-    ]
+def collapse_pack_families(con: sqlite3.Connection, packs: List[Dict[str, Any]], keep: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """Keep the best pack of each near-duplicate family and list the rest as family_siblings.
+
+    Patents in keep (numbers named in the question) are never folded into a sibling list.
+    """
+    groups = collapse_families([pack["patent_id"] for pack in packs], family_map(con), keep=keep)
+    kept = []
+    for pack in packs:
+        if pack["patent_id"] not in groups:
+            continue
+        pack.update(family_fields(groups[pack["patent_id"]]))
+        kept.append(pack)
+    return kept
+
+
+@lru_cache(maxsize=512)
+def question_terms(question: str, aliases: AliasMatcher) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """(terms, dictionary phrases) of a question; computed once, not once per candidate row."""
+    terms = [term for term in unique_keep_order([*expand_query(question, aliases), *TOKEN_RE.findall(question.lower())]) if len(term) >= 2]
+    q_lower = question.lower()
+    phrases = [*aliases.matched_keys(question), *(phrase for phrase in TRIAGE_PHRASES if phrase in q_lower)]
+    return tuple(terms), tuple(unique_keep_order(phrases))
+
+
+def term_fit_score(question: str, row: sqlite3.Row, version: str = "", aliases: AliasMatcher | None = None) -> float:
+    terms, phrases = question_terms(question, aliases or default_matcher())
+    query_terms = [term.lower() for term in terms]
     if not query_terms:
         return 0.0
+    decoded = decoded_pack_columns(row, version)
     labels = " ".join(
         [
-            " ".join(load_json(row["problem_labels_json"])),
-            " ".join(load_json(row["solution_labels_json"])),
-            " ".join(load_json(row["effect_labels_json"])),
+            " ".join(decoded["problem_labels"]),
+            " ".join(decoded["solution_labels"]),
+            " ".join(decoded["effect_labels"]),
         ]
     ).lower()
-    elements = " ".join(load_json(row["core_elements_json"])).lower()
+    elements = " ".join(decoded["core_elements"]).lower()
     title = normalize_ws(row["title"]).lower()
-    claims = " ".join(claim.get("text", "") for claim in load_json(row["strong_claims_json"])).lower()
+    claims = " ".join(claim.get("text", "") for claim in decoded["strong_claims"]).lower()
     score = 0.0
     for term in query_terms:
         if term in title:
@@ -203,23 +223,14 @@ def term_fit_score(question: str, row: sqlite3.Row) -> float:
             score += 1.0
         if term in claims:
             score += 0.45
-    phrase_hits = [
-        "page buffer",
-        "bit line",
-        "program verify",
-        "evaluation operation",
-        "plane address",
-        "pad group",
-        "garbage collection",
-    ]
-    q_lower = question.lower()
-    for phrase in phrase_hits:
-        if phrase in q_lower and (phrase in title or phrase.replace(" ", "_") in labels or phrase in claims):
+    # Dictionary phrases named in the question that the pack carries as title, label or claim text.
+    for phrase in phrases:
+        if phrase in title or phrase.replace(" ", "_") in labels or phrase in claims:
             score += 2.0
     return min(score, 12.0)
 
 
-def explain_match(question: str, pack: Dict[str, Any]) -> List[str]:
+def explain_match(question: str, pack: Dict[str, Any], aliases: AliasMatcher | None = None) -> List[str]:
     text = " ".join(
         [
             pack.get("title", ""),
@@ -229,10 +240,7 @@ def explain_match(question: str, pack: Dict[str, Any]) -> List[str]:
             " ".join(pack.get("strong_evidence_ids", [])),
         ]
     ).lower()
-    terms = []
-    for term in unique_keep_order([*expand_query(question), *TOKEN_RE.findall(question.lower())]):
-        if len(term) >= 2 and term.lower() in text:
-            terms.append(term)
+    terms = [term for term in question_terms(question, aliases or default_matcher())[0] if term.lower() in text]
     reasons = []
     if terms:
         reasons.append("matched: " + ", ".join(terms[:6]))
@@ -264,10 +272,19 @@ def gemini_recommendation(question: str, packs: Sequence[Dict[str, Any]]) -> Dic
     }
 
 
-def triage_question(question: str, limit: int = 8, db_path: Path = DEFAULT_PACK_DB) -> Dict[str, Any]:
-    con = sqlite3.connect(db_path)
-    packs = search_packs(con, question, limit=limit)
-    con.close()
+@timed("triage")
+def triage_question(
+    question: str,
+    limit: int = 8,
+    db_path: Path = DEFAULT_PACK_DB,
+    con: sqlite3.Connection | None = None,
+) -> Dict[str, Any]:
+    if con is None:
+        con = sqlite3.connect(db_path)
+        packs = search_packs(con, question, limit=limit)
+        con.close()
+    else:
+        packs = search_packs(con, question, limit=limit)
     return {
         "question": question,
         "limit": limit,
@@ -300,6 +317,8 @@ def format_triage(result: Dict[str, Any]) -> str:
                 f"Independent: {', '.join(pack.get('independent_claim_nos', [])) or '-'}",
             ]
         )
+        if pack.get("family_siblings"):
+            lines.append(f"Family: 후보 중 {pack.get('family_size', '-')}건, " + ", ".join(pack["family_siblings"][:5]))
         if labels:
             lines.append(f"Labels: {labels}")
         if strong:
@@ -319,8 +338,12 @@ def main() -> None:
     parser.add_argument("--limit", type=int, default=8)
     parser.add_argument("--db", default=str(DEFAULT_PACK_DB))
     parser.add_argument("--json", action="store_true")
+    parser.add_argument("--profile", action="store_true", help="Print pack decode counters to stderr")
     args = parser.parse_args()
-    result = triage_question(args.question, limit=max(1, min(30, args.limit)), db_path=Path(args.db))
+    with decode_profile() as profile:
+        result = triage_question(args.question, limit=max(1, min(30, args.limit)), db_path=Path(args.db))
+    if args.profile:
+        print(f"[profile] decode={json.dumps(profile)}", file=sys.stderr)
     if args.json:
         print(json.dumps(result, ensure_ascii=False, indent=2))
     else:
@@ -11,6 +11,8 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
+from db_schema import append_change, ensure_change_log
+
 BASE = Path("/Volumes/외장 2TB/cpu2026")
 HUB = BASE / "patent_hub"
 COMMON = BASE / "common"
@@ -82,6 +84,7 @@ def load_json(path: Path) -> Dict[str, Any]:
 def open_db() -> sqlite3.Connection:
     con = sqlite3.connect(A4_DB, timeout=30)
     con.row_factory = sqlite3.Row
+    ensure_change_log(con)
     return con
 
 
@@ -680,6 +683,7 @@ def process_one_patent(con: sqlite3.Connection, patent_id: str, overwrite: bool
     }
 
     save_json(out_path, final)
+    append_change(con, patent_id, "minimal", MODEL)
     mark_job_status(con, patent_id, "brief_done")
 
     return {
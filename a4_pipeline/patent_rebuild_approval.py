@@ -7,6 +7,7 @@ import re
 import shutil
 import sqlite3
 import subprocess
+import threading
 import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
@@ -15,6 +16,7 @@ from typing import Any, Dict, Iterable, List, Optional
 
 import requests
 
+from db_schema import append_change, changed_patent_ids_since, ensure_change_log, latest_change_seq
 from llm_clients import load_env_file
 
 
@@ -28,6 +30,8 @@ APPROVAL_DIR = REBUILD / "telegram_approvals"
 QUARANTINE_DIR = APPROVAL_DIR / "quarantined_minimal"
 PENDING_PATH = APPROVAL_DIR / "pending_actions.json"
 EVENT_LOG = APPROVAL_DIR / "approval_events.jsonl"
+INSPECTION_CACHE = APPROVAL_DIR / "minimal_inspection_cache.json"
+MINIMAL_STAGES = ("minimal", "minimal_gemini_repair", "minimal_quarantine")
 CHAT_LOG = BASE / "common" / "runtime" / "logs" / "A4" / "patent_telegram_chat.jsonl"
 
 EVIDENCE_SCREEN = "a4_evidence_v2_full_20260508"
@@ -175,42 +179,104 @@ def patent_count() -> int:
         con.close()
 
 
+def safe_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", value)
+
+
+def inspect_card(path: Path) -> Dict[str, Any]:
+    fallback_id = path.name.split(".")[0]
+    try:
+        card = json.loads(path.read_text(encoding="utf-8"))
+    except Exception as exc:
+        return {"patent_id": fallback_id, "invalid": f"bad_json:{exc}", "weak": False, "repaired": False}
+    reasons: List[str] = []
+    title = str(card.get("title_source") or "")
+    if TITLE_CONTAMINATION_RE.search(title):
+        reasons.append("contaminated_title")
+    if not card.get("country"):
+        reasons.append("missing_country")
+    if not card.get("source_language"):
+        reasons.append("missing_source_language")
+    if not card.get("solution_labels"):
+        reasons.append("empty_solution_labels")
+    if not card.get("evidence_ids"):
+        reasons.append("empty_evidence_ids")
+    return {
+        "patent_id": str(card.get("patent_id") or fallback_id),
+        "invalid": ",".join(reasons),
+        "weak": not card.get("problem_labels") or not card.get("effect_labels"),
+        "repaired": bool(card.get("_gemini_problem_effect_repair")),
+    }
+
+
+def load_inspection_cache() -> Optional[Dict[str, Any]]:
+    if not INSPECTION_CACHE.exists():
+        return None
+    try:
+        data = json.loads(INSPECTION_CACHE.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if str(data.get("minimal_dir")) != str(MINIMAL_DIR):
+        return None
+    return data
+
+
+def save_inspection_cache(change_seq: int, cards: Dict[str, Dict[str, Any]]) -> None:
+    APPROVAL_DIR.mkdir(parents=True, exist_ok=True)
+    payload = {"updated_at": now(), "minimal_dir": str(MINIMAL_DIR), "change_seq": change_seq, "cards": cards}
+    tmp = INSPECTION_CACHE.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(INSPECTION_CACHE)
+
+
+def minimal_changes_since(after_seq: Optional[int]) -> tuple[Optional[List[str]], Optional[int]]:
+    """Changed patent ids from the change log; None means the log is unusable and a full scan is needed.
+
+    The cursor lives in the inspection cache next to the cards it describes. On a log error the
+    cursor is left where it was (None if there was none) rather than reset to 0.
+    """
+    if not DB.exists():
+        return None, 0
+    con = sqlite3.connect(str(DB), timeout=30)
+    try:
+        if after_seq is None:
+            return None, latest_change_seq(con)
+        return changed_patent_ids_since(con, after_seq, stages=MINIMAL_STAGES)
+    except sqlite3.Error:
+        return None, after_seq
+    finally:
+        con.close()
+
+
 def inspect_minimal_cards() -> Dict[str, Any]:
-    files = sorted(MINIMAL_DIR.glob("*.minimal.json"))
+    # Listing the directory is cheap; parsing every card is not. Parse only new files
+    # and cards named in the change log since the cached cursor.
+    names = {path.name for path in MINIMAL_DIR.glob("*.minimal.json")}
+    cache = load_inspection_cache()
+    changed_ids, change_seq = minimal_changes_since(int(cache["change_seq"]) if cache else None)
+    if cache is None or changed_ids is None:
+        cached: Dict[str, Dict[str, Any]] = {}
+        stale = set(names)
+    else:
+        cached = {name: entry for name, entry in cache.get("cards", {}).items() if name in names}
+        stale = (names - set(cached)) | {f"{safe_name(pid)}.minimal.json" for pid in changed_ids}
+    for name in stale & names:
+        cached[name] = inspect_card(MINIMAL_DIR / name)
+    if change_seq is not None:
+        save_inspection_cache(change_seq, cached)
+
     invalid: List[Dict[str, Any]] = []
     weak: List[str] = []
     repaired = 0
-    for path in files:
-        try:
-            card = json.loads(path.read_text(encoding="utf-8"))
-        except Exception as exc:
-            invalid.append({"patent_id": path.name.split(".")[0], "path": str(path), "reason": f"bad_json:{exc}"})
-            continue
-        reasons: List[str] = []
-        title = str(card.get("title_source") or "")
-        if TITLE_CONTAMINATION_RE.search(title):
-            reasons.append("contaminated_title")
-        if not card.get("country"):
-            reasons.append("missing_country")
-        if not card.get("source_language"):
-            reasons.append("missing_source_language")
-        if not card.get("solution_labels"):
-            reasons.append("empty_solution_labels")
-        if not card.get("evidence_ids"):
-            reasons.append("empty_evidence_ids")
-        if reasons:
-            invalid.append(
-                {
-                    "patent_id": card.get("patent_id") or path.name.split(".")[0],
-                    "path": str(path),
-                    "reason": ",".join(reasons),
-                }
-            )
-        if not card.get("problem_labels") or not card.get("effect_labels"):
-            weak.append(str(card.get("patent_id") or path.name.split(".")[0]))
-        if card.get("_gemini_problem_effect_repair"):
+    for name in sorted(cached):
+        entry = cached[name]
+        if entry["invalid"]:
+            invalid.append({"patent_id": entry["patent_id"], "path": str(MINIMAL_DIR / name), "reason": entry["invalid"]})
+        if entry["weak"]:
+            weak.append(entry["patent_id"])
+        if entry["repaired"]:
             repaired += 1
-    return {"files": len(files), "invalid": invalid, "weak": weak, "repaired": repaired}
+    return {"files": len(names), "invalid": invalid, "weak": weak, "repaired": repaired, "parsed": len(stale & names)}
 
 
 def create_pending_action(action_type: str, reason: str, payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -293,6 +359,7 @@ def monitor_once(notify: bool = True) -> Dict[str, Any]:
         "minimal_files": cards["files"],
         "invalid_count": len(cards["invalid"]),
         "weak_count": len(cards["weak"]),
+        "cards_parsed": cards["parsed"],
         "gemini_repaired": cards["repaired"],
     }
     actions: List[Dict[str, Any]] = []
@@ -380,6 +447,7 @@ def quarantine_minimal_outputs(patent_ids: Iterable[str]) -> int:
     QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
     stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     moved = 0
+    quarantined: List[str] = []
     for patent_id in ids:
         src = MINIMAL_DIR / f"{patent_id}.minimal.json"
         if not src.exists():
@@ -387,6 +455,16 @@ def quarantine_minimal_outputs(patent_ids: Iterable[str]) -> int:
         dst = QUARANTINE_DIR / f"{patent_id}.{stamp}.minimal.json"
         shutil.move(str(src), str(dst))
         moved += 1
+        quarantined.append(patent_id)
+    if quarantined and DB.exists():
+        con = sqlite3.connect(str(DB), timeout=30)
+        try:
+            ensure_change_log(con)
+            for patent_id in quarantined:
+                append_change(con, patent_id, "minimal_quarantine")
+            con.commit()
+        finally:
+            con.close()
     return moved
 
 
@@ -398,49 +476,59 @@ def restart_screen(screen_name: str, script_path: str) -> str:
     return f"restarted {screen_name}"
 
 
+# The bot handles messages on several threads. Each approve/reject reads pending_actions.json,
+# checks the status and rewrites it, so the whole check-and-act runs under one lock; a
+# second "승인" for the same id then sees "already approved_executed" instead of running again.
+_ACTION_LOCK = threading.Lock()
+
+
 def execute_action(action_id: str, approved_by: str = "telegram") -> str:
-    pending = load_pending()
-    action = pending.get(action_id)
-    if not action:
-        return f"pending action not found: {action_id}"
-    if action.get("status") != "pending":
-        return f"action already {action.get('status')}: {action_id}"
-    action_type = action.get("type")
-    payload = action.get("payload") or {}
-    if action_type in {"requeue_invalid_minimal", "requeue_minimal_failed"}:
-        moved = quarantine_minimal_outputs(payload.get("patent_ids") or [])
-        changed = requeue_patents(payload.get("patent_ids") or [])
-        result = f"quarantined {moved} minimal files; requeued {changed} job rows to evidence_done"
-    elif action_type == "restart_evidence":
-        result = restart_screen(EVIDENCE_SCREEN, str(EVIDENCE_RUN))
-    elif action_type == "restart_minimal":
-        result = restart_screen(MINIMAL_SCREEN, str(MINIMAL_RUN))
-    elif action_type == "restart_gemini_worker":
-        result = restart_screen(GEMINI_SCREEN, str(GEMINI_RUN))
-    else:
-        raise RuntimeError(f"unsupported action type: {action_type}")
-    action["status"] = "approved_executed"
-    action["approved_by"] = approved_by
-    action["executed_at"] = now()
-    action["result"] = result
-    pending[action_id] = action
-    save_pending(pending)
-    append_event({"event": "action_executed", "action": action})
-    return result
+    with _ACTION_LOCK:
+        pending = load_pending()
+        action = pending.get(action_id)
+        if not action:
+            return f"pending action not found: {action_id}"
+        if action.get("status") != "pending":
+            return f"action already {action.get('status')}: {action_id}"
+        action_type = action.get("type")
+        payload = action.get("payload") or {}
+        if action_type in {"requeue_invalid_minimal", "requeue_minimal_failed"}:
+            moved = quarantine_minimal_outputs(payload.get("patent_ids") or [])
+            changed = requeue_patents(payload.get("patent_ids") or [])
+            result = f"quarantined {moved} minimal files; requeued {changed} job rows to evidence_done"
+        elif action_type == "restart_evidence":
+            result = restart_screen(EVIDENCE_SCREEN, str(EVIDENCE_RUN))
+        elif action_type == "restart_minimal":
+            result = restart_screen(MINIMAL_SCREEN, str(MINIMAL_RUN))
+        elif action_type == "restart_gemini_worker":
+            result = restart_screen(GEMINI_SCREEN, str(GEMINI_RUN))
+        else:
+            raise RuntimeError(f"unsupported action type: {action_type}")
+        action["status"] = "approved_executed"
+        action["approved_by"] = approved_by
+        action["executed_at"] = now()
+        action["result"] = result
+        pending[action_id] = action
+        save_pending(pending)
+        append_event({"event": "action_executed", "action": action})
+        return result
 
 
 def reject_action(action_id: str, rejected_by: str = "telegram") -> str:
-    pending = load_pending()
-    action = pending.get(action_id)
-    if not action:
-        return f"pending action not found: {action_id}"
-    action["status"] = "rejected"
-    action["rejected_by"] = rejected_by
-    action["rejected_at"] = now()
-    pending[action_id] = action
-    save_pending(pending)
-    append_event({"event": "action_rejected", "action": action})
-    return f"rejected {action_id}"
+    with _ACTION_LOCK:
+        pending = load_pending()
+        action = pending.get(action_id)
+        if not action:
+            return f"pending action not found: {action_id}"
+        if action.get("status") != "pending":
+            return f"action already {action.get('status')}: {action_id}"
+        action["status"] = "rejected"
+        action["rejected_by"] = rejected_by
+        action["rejected_at"] = now()
+        pending[action_id] = action
+        save_pending(pending)
+        append_event({"event": "action_rejected", "action": action})
+        return f"rejected {action_id}"
 
 
 def format_pending() -> str:
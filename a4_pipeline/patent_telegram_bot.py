@@ -1,17 +1,18 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
 import json
 import os
 import re
-import sqlite3
 import sys
+import threading
 import time
 import traceback
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Set
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 import requests
 
@@ -20,28 +21,49 @@ CODE_DIR = Path(__file__).resolve().parent
 if str(CODE_DIR) not in sys.path:
     sys.path.insert(0, str(CODE_DIR))
 
+from answer_cache import ANSWER_CACHE, COMPUTED, format_age, normalize_question, source_note  # noqa: E402
 from patent_dictionary_ask import (  # noqa: E402
     DEFAULT_MODEL,
     ask_llm,
     build_prompt,
     compact_card,
-    infer_search_query,
+    stream_llm,
 )
-from patent_dictionary_search import DEFAULT_DB, lookup, search  # noqa: E402
-from patent_judge import judge_question  # noqa: E402
+from patent_dictionary_search import DEFAULT_DB  # noqa: E402
+from patent_judge import judge_clients, judge_question  # noqa: E402
+from job_lanes import LANE_DEFAULTS, LaneFull, build_lanes, lane_samples  # noqa: E402
 from llm_clients import load_env_file  # noqa: E402
-from patent_local_triage import format_triage, triage_question  # noqa: E402
+from metrics import DEFAULT_METRICS_PORT, REGISTRY, Sample, serve_metrics, stage_summary, stats_samples  # noqa: E402
+from patent_local_triage import format_triage  # noqa: E402
 from patent_auto_mission import format_mission_summary, run_mission  # noqa: E402
 from patent_rebuild_approval import execute_action, format_pending, load_pending, reject_action  # noqa: E402
+from retrieval_service import RetrievalService  # noqa: E402
+from telegram_async import DEFAULT_API_BASE, AsyncTelegramClient, StreamingReply, split_message  # noqa: E402
 
 
 DEFAULT_LOG_PATH = Path("/Volumes/외장 2TB/cpu2026/common/runtime/logs/A4/patent_telegram_chat.jsonl")
-TELEGRAM_MAX_MESSAGE = 3900
 MAX_SEARCH_LIMIT = 30
 PATENT_ID_RE = re.compile(r"\b(?:us|cn|kr)[a-z0-9]{6,}p\b", re.IGNORECASE)
-PATENT_NUMBER_RE = re.compile(r"\d{7,}")
 TELEGRAM_TOKEN_IN_URL_RE = re.compile(r"bot\d+:[A-Za-z0-9_-]+")
 TELEGRAM_TOKEN_VALUE_RE = re.compile(r"\b\d{6,}:[A-Za-z0-9_-]{20,}\b")
+BOT_COMMANDS = [
+    {"command": "ask", "description": "특허 사전에 질문하고 로컬 LLM 답변 받기"},
+    {"command": "triage", "description": "Gemini 없이 로컬 후보 예비심사"},
+    {"command": "compare_local", "description": "Gemini 전에 로컬 후보 비교"},
+    {"command": "mission", "description": "목표를 주면 로컬 LLM이 자동 분석 리포트 작성"},
+    {"command": "ask_pro", "description": "GPT/Gemini가 로컬 근거를 보고 판단"},
+    {"command": "verify", "description": "특정 특허/요약을 근거 기반 검증"},
+    {"command": "search", "description": "관련 특허 후보 카드 검색"},
+    {"command": "facets", "description": "검색어 기준 언어/청구항/라벨 분포 보기"},
+    {"command": "patent", "description": "patent_id로 특정 특허 조회"},
+    {"command": "status", "description": "인덱스 상태 확인"},
+    {"command": "queue", "description": "내 작업 대기 순서와 예상 대기 시간"},
+    {"command": "pending", "description": "대기 중인 파이프라인 승인 요청 확인"},
+    {"command": "approve", "description": "승인 요청 실행"},
+    {"command": "reject", "description": "승인 요청 거절"},
+    {"command": "help", "description": "사용법 보기"},
+]
+LANE_LABELS = {"fast": "조회", "local": "로컬 LLM", "pro": "프로 판단", "mission": "오토 미션"}
 
 
 def utc_now() -> str:
@@ -69,20 +91,6 @@ def redact_secrets(value: Any) -> Any:
     return value
 
 
-def split_message(text: str, limit: int = TELEGRAM_MAX_MESSAGE) -> Iterable[str]:
-    text = text.strip() or "(empty)"
-    while len(text) > limit:
-        cut = text.rfind("\n", 0, limit)
-        if cut < limit // 2:
-            cut = text.rfind(" ", 0, limit)
-        if cut < limit // 2:
-            cut = limit
-        yield text[:cut].strip()
-        text = text[cut:].strip()
-    if text:
-        yield text
-
-
 def clamp_limit(value: int) -> int:
     return max(1, min(MAX_SEARCH_LIMIT, value))
 
@@ -121,13 +129,16 @@ def parse_limited_query(text: str, default_limit: int) -> tuple[str, int]:
 
 
 class TelegramClient:
-    def __init__(self, token: str, timeout: int = 60) -> None:
-        self.base_url = f"https://api.telegram.org/bot{token}"
+    """Blocking Bot API client over one requests.Session (--transport requests)."""
+
+    def __init__(self, token: str, timeout: int = 60, api_base: str = DEFAULT_API_BASE) -> None:
+        self.base_url = f"{api_base.rstrip('/')}/bot{token}"
         self.timeout = timeout
+        self.session = requests.Session()
 
     def request(self, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        r = requests.post(f"{self.base_url}/{method}", json=payload, timeout=self.timeout)
-        r.raise_for_status()
+        timeout = self.timeout + float(payload.get("timeout") or 0)
+        r = self.session.post(f"{self.base_url}/{method}", json=payload, timeout=timeout)
         data = r.json()
         if not data.get("ok"):
             raise RuntimeError(f"Telegram API failed: {data}")
@@ -150,27 +161,30 @@ class TelegramClient:
                 },
             )
 
-    def set_commands(self) -> None:
-        self.request(
-            "setMyCommands",
-            {
-                "commands": [
-                    {"command": "ask", "description": "특허 사전에 질문하고 로컬 LLM 답변 받기"},
-                    {"command": "triage", "description": "Gemini 없이 로컬 후보 예비심사"},
-                    {"command": "compare_local", "description": "Gemini 전에 로컬 후보 비교"},
-                    {"command": "mission", "description": "목표를 주면 로컬 LLM이 자동 분석 리포트 작성"},
-                    {"command": "ask_pro", "description": "GPT/Gemini가 로컬 근거를 보고 판단"},
-                    {"command": "verify", "description": "특정 특허/요약을 근거 기반 검증"},
-                    {"command": "search", "description": "관련 특허 후보 카드 검색"},
-                    {"command": "patent", "description": "patent_id로 특정 특허 조회"},
-                    {"command": "status", "description": "인덱스 상태 확인"},
-                    {"command": "pending", "description": "대기 중인 파이프라인 승인 요청 확인"},
-                    {"command": "approve", "description": "승인 요청 실행"},
-                    {"command": "reject", "description": "승인 요청 거절"},
-                    {"command": "help", "description": "사용법 보기"},
-                ]
-            },
-        )
+    def set_commands(self, commands: List[Dict[str, str]]) -> None:
+        self.request("setMyCommands", {"commands": commands})
+
+    @contextlib.contextmanager
+    def typing(self, chat_id: int) -> Iterator[None]:
+        try:
+            self.request("sendChatAction", {"chat_id": chat_id, "action": "typing"})
+        except Exception:
+            pass
+        yield
+
+    def run_polling(self, handler: Callable[[Dict[str, Any]], None], timeout: int, on_error: Callable[[Exception], None] | None = None) -> None:
+        offset: Optional[int] = None
+        while True:
+            try:
+                updates = self.get_updates(offset, timeout)
+            except Exception as exc:
+                if on_error is not None:
+                    on_error(exc)
+                time.sleep(5)
+                continue
+            for update in updates:
+                offset = update["update_id"] + 1
+                handler(update)
 
 
 class PatentTelegramBot:
@@ -184,96 +198,44 @@ class PatentTelegramBot:
         limit: int,
         timeout: int,
         num_predict: int,
-        ask_workers: int,
+        lane_sizes: Optional[Dict[str, Tuple[int, int]]] = None,
+        transport: str = "async",
+        stream_replies: bool = True,
     ) -> None:
-        self.telegram = TelegramClient(token)
+        self.telegram = AsyncTelegramClient(token) if transport == "async" else TelegramClient(token)
         self.db_path = db_path
+        self.service = RetrievalService(index_db=db_path)
         self.log_path = log_path
         self.allowed_chat_ids = allowed_chat_ids
         self.model = model
         self.limit = limit
         self.timeout = timeout
         self.num_predict = num_predict
-        self.ask_executor = ThreadPoolExecutor(max_workers=max(1, ask_workers))
+        # /ask, /ask_pro and /verify answers are shown while the model writes them.
+        self.stream_replies = stream_replies
+        # Lookups run on the fast lane and each job kind on its own bounded lane, so the
+        # poll loop only dispatches and one slow job never stalls other chats.
+        self.lanes = build_lanes(lane_sizes)
+        REGISTRY.register_collector(self.metric_samples)
+        self._log_lock = threading.Lock()
         self.log_path.parent.mkdir(parents=True, exist_ok=True)
 
     def log_event(self, event: Dict[str, Any]) -> None:
         event = redact_secrets({"ts": utc_now(), **event})
-        with self.log_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._log_lock, self.log_path.open("a", encoding="utf-8") as f:
+            f.write(line)
 
-    def connect(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
-
-    def fuzzy_patent_cards(self, con: sqlite3.Connection, text: str, limit: int = 5) -> List[Dict[str, Any]]:
+    def fuzzy_patent_cards(self, text: str, limit: int = 5) -> List[Dict[str, Any]]:
         patent_id = extract_patent_id(text)
         if patent_id:
-            card = lookup(con, patent_id)
+            card = self.service.lookup(patent_id)
             if card:
                 return [card]
-
-        fragments = PATENT_NUMBER_RE.findall(text or "")
-        if not fragments:
-            return []
-
-        lower = (text or "").lower()
-        prefix = ""
-        if "us" in lower or "미국" in lower:
-            prefix = "us"
-        elif "cn" in lower or "중국" in lower:
-            prefix = "cn"
-        elif "kr" in lower or "한국" in lower:
-            prefix = "kr"
-
-        seen: Set[str] = set()
-        cards: List[Dict[str, Any]] = []
-        for fragment in fragments:
-            stripped = fragment.lstrip("0") or fragment
-            patterns = list(dict.fromkeys([f"%{fragment.lower()}%", f"%{stripped.lower()}%"]))
-            for pattern in patterns:
-                params: List[Any] = [pattern]
-                where = "patent_id LIKE ?"
-                if prefix:
-                    where += " AND patent_id LIKE ?"
-                    params.append(f"{prefix}%")
-                rows = con.execute(
-                    f"""
-                    SELECT patent_id
-                    FROM minimal_index
-                    WHERE {where}
-                    ORDER BY length(patent_id), patent_id
-                    LIMIT ?
-                    """,
-                    [*params, limit],
-                ).fetchall()
-                for (candidate_id,) in rows:
-                    if candidate_id in seen:
-                        continue
-                    card = lookup(con, candidate_id)
-                    if card:
-                        seen.add(candidate_id)
-                        cards.append(card)
-                    if len(cards) >= limit:
-                        return cards
-        return cards
+        return self.service.patent_cards(text, limit)
 
     def retrieve(self, question: str, limit: Optional[int] = None) -> tuple[str, List[Dict[str, Any]]]:
-        con = self.connect()
-        retrieval_query = question
-        cards = self.fuzzy_patent_cards(con, question, limit=limit or self.limit)
-        if cards:
-            retrieval_query = cards[0]["patent_id"] if len(cards) == 1 else "patent_id_fuzzy_match"
-        else:
-            cards = search(con, question, limit or self.limit)
-        cards = [card for card in cards if card]
-        if not cards:
-            fallback_query = infer_search_query(question)
-            if fallback_query and fallback_query != question:
-                retrieval_query = fallback_query
-                cards = search(con, fallback_query, limit or self.limit)
-                cards = [card for card in cards if card]
-        con.close()
-        return retrieval_query, cards
+        return self.service.retrieve(question, limit or self.limit)
 
     def format_cards(self, cards: List[Dict[str, Any]]) -> str:
         if not cards:
@@ -298,6 +260,17 @@ class PatentTelegramBot:
                 lines.append("QC: " + ", ".join(card["qc_flags"]))
         return "\n".join(lines)
 
+    def format_facets(self, counts: Optional[Dict[str, Any]]) -> str:
+        if counts is None:
+            return "이 인덱스에는 facet bitmap이 없어. 인덱스를 다시 빌드해줘."
+        if not counts["matched"]:
+            return "검색 결과가 없어."
+        lines = [f"분포: {counts['query'] or '전체'} (매칭 {counts['matched']}건, QC 제외 {counts['selected']}건)"]
+        for facet, title in (("language", "언어"), ("claim_type", "청구항 유형"), ("label", "라벨"), ("qc", "QC")):
+            if counts[facet]:
+                lines.append(f"- {title}: " + ", ".join(f"{value or 'unknown'}={count}" for value, count in counts[facet].items()))
+        return "\n".join(lines)
+
     def format_patent_detail(self, card: Dict[str, Any]) -> str:
         lines = [
             f"{card['patent_id']} ({card['language']}, {card['primary_claim_type']}, conf={card['confidence']})",
@@ -322,19 +295,33 @@ class PatentTelegramBot:
         lines.append(f"JSON: {card['json_path']}")
         return "\n".join(lines)
 
-    def ask(self, question: str) -> str:
+    def ask(self, question: str, on_text: Optional[Callable[[str], None]] = None) -> str:
+        """With on_text, the LLM answer is streamed and on_text gets the reply so far after each piece."""
         retrieval_query, cards = self.retrieve(question)
         if not cards:
             return "관련 특허를 찾지 못했어. 핵심 키워드를 조금 더 짧게 넣어줘."
-        prompt = build_prompt(question, cards)
-        answer = ask_llm(prompt, self.model, self.timeout, self.num_predict)
+        prompt = build_prompt(question, cards, pack_con=self.service.packs())
         prefix = ""
         if retrieval_query != question:
             prefix = f"Retrieval query: {retrieval_query}\n\n"
-        return prefix + answer
+        if on_text is None:
+            return prefix + ask_llm(prompt, self.model, self.timeout, self.num_predict)
+        parts: List[str] = []
+        for piece in stream_llm(prompt, self.model, self.timeout, self.num_predict):
+            parts.append(piece)
+            on_text(prefix + "".join(parts))
+        return prefix + "".join(parts).strip()
+
+    def metric_samples(self) -> List[Sample]:
+        """Lane queue depth/outcomes and Telegram client counters for /metrics."""
+        samples = lane_samples(self.lanes)
+        if hasattr(self.telegram, "stats"):
+            counters = ["requests", "messages", "chunks", "retries", "resent_chunks", "throttled_chats", "rate_wait_sec", "connections_opened"]
+            samples += stats_samples("a4_telegram", self.telegram.stats(), counters)
+        return samples
 
     def status(self) -> str:
-        con = self.connect()
+        con = self.service.index()
         total = con.execute("SELECT COUNT(*) FROM minimal_index").fetchone()[0]
         qc_rows = con.execute(
             "SELECT COUNT(*) FROM minimal_index WHERE qc_flags_json IS NOT NULL AND qc_flags_json != '[]'"
@@ -342,14 +329,26 @@ class PatentTelegramBot:
         langs = con.execute(
             "SELECT source_language, COUNT(*) FROM minimal_index GROUP BY source_language ORDER BY COUNT(*) DESC"
         ).fetchall()
-        con.close()
         lang_text = ", ".join(f"{lang or 'unknown'}={count}" for lang, count in langs)
+        cache = self.service.stats()["query_cache"]
+        answers = ANSWER_CACHE.stats()
+        lane_text = ", ".join(
+            f"{name} {stats['running']}/{stats['workers']} 실행·{stats['queued']} 대기"
+            for name, stats in ((name, lane.stats()) for name, lane in self.lanes.items())
+        )
+        latency_text = ", ".join(
+            f"{stage} {row['p50']:.2f}/{row['p95']:.2f}s (n={row['count']})" for stage, row in stage_summary().items()
+        ) or "-"
         return (
             "특허 사전 상태\n"
             f"- index: {self.db_path}\n"
             f"- indexed patents: {total}\n"
             f"- qc flagged rows: {qc_rows}\n"
             f"- languages: {lang_text}\n"
+            f"- query cache: {cache['size']}건, hit {cache['hits']}/{cache['hits'] + cache['misses']} ({cache['hit_rate']:.0%})\n"
+            f"- answer cache: {answers['size']}건, hit {answers['hits']} · 합류 {answers['coalesced']} · 새로 생성 {answers['misses']}\n"
+            f"- lanes: {lane_text}\n"
+            f"- latency p50/p95: {latency_text}\n"
             f"- chat log: {self.log_path}"
         )
 
@@ -364,8 +363,10 @@ class PatentTelegramBot:
             "/verify 질문 - 특정 특허나 요약의 정확성 검증\n"
             "/search 키워드 - 후보 카드만 빠르게 검색, 기본 10건\n"
             "/search 20 키워드 - 후보 개수 지정, 최대 30건\n"
+            "/facets 키워드 - 검색 결과의 언어/청구항 유형/라벨/QC 분포, 키워드 없으면 전체\n"
             "/patent patent_id - 특정 특허 카드 조회\n"
             "/status - 인덱스 상태 확인\n"
+            "/queue - 내 작업의 대기 순서와 예상 대기 시간\n"
             "/pending - 대기 중인 파이프라인 승인 요청 확인\n"
             "/approve id 또는 승인 id - 승인 요청 실행\n"
             "/reject id 또는 거절 id - 승인 요청 거절\n"
@@ -374,7 +375,7 @@ class PatentTelegramBot:
         )
 
     def triage(self, question: str, limit: Optional[int] = None) -> str:
-        result = triage_question(question, limit=limit or self.limit)
+        result = self.service.triage(question, limit=limit or self.limit)
         return format_triage(result)
 
     def strip_bot_suffix(self, text: str) -> str:
@@ -385,17 +386,69 @@ class PatentTelegramBot:
             first = first.split("@", 1)[0]
         return " ".join([first] + rest).strip()
 
+    def ask_key(self, question: str) -> Tuple[Any, ...]:
+        return ("ask", self.model, self.service.versions(), normalize_question(question))
+
+    def pro_key(self, question: str, mode: str) -> Tuple[Any, ...]:
+        judge_client, planner_client = judge_clients("auto", "", "auto", "", self.timeout)
+        return (
+            mode,
+            f"{judge_client.provider}/{judge_client.model}",
+            f"{planner_client.provider}/{planner_client.model}" if planner_client else "none",
+            self.limit,
+            self.service.versions(),
+            normalize_question(question),
+        )
+
+    def streaming_reply(self, chat_id: int) -> Tuple[Optional[StreamingReply], Optional[Callable[[str], None]]]:
+        """(reply, on_text) for a job that streams its answer, or (None, None) when streaming is off."""
+        if not self.stream_replies:
+            return None, None
+        reply = StreamingReply(self.telegram, chat_id)
+        return reply, lambda text: reply.update(f"답변 생성 중…\n\n{text}")
+
+    def deliver(self, chat_id: int, reply: Optional[StreamingReply], source: str, answer: str) -> None:
+        """Final answer: replaces the streamed message when this job generated it, else a new message."""
+        if reply is not None and reply.started and source == COMPUTED:
+            reply.finish(answer)
+        else:
+            self.telegram.send_message(chat_id, answer)
+
     def run_ask_job(self, chat_id: int, original_text: str, question: str) -> None:
         started = time.monotonic()
+        reply, on_text = self.streaming_reply(chat_id)
         try:
-            answer = self.ask(question)
-            elapsed = time.monotonic() - started
-            answer = f"생성 시간: {elapsed:.1f}초\n\n{answer}"
-            self.telegram.send_message(chat_id, answer)
-            self.log_event({"event": "answer", "chat_id": chat_id, "text": original_text, "answer": answer})
+            key = self.ask_key(question)
+
+            def compute() -> Tuple[str, float]:
+                return self.ask(question, on_text), time.monotonic() - started
+
+            with self.telegram.typing(chat_id):
+                (answer, generated_sec), source, age_sec = ANSWER_CACHE.get_or_run(key, compute)
+            header = f"생성 시간: {generated_sec:.1f}초"
+            if reply is not None and reply.first_shown_sec is not None and source == COMPUTED:
+                header += f" (첫 응답 {reply.first_shown_sec:.1f}초)"
+            note = source_note(source, age_sec)
+            if note:
+                header = f"{note}\n{header}"
+            answer = f"{header}\n\n{answer}"
+            self.deliver(chat_id, reply, source, answer)
+            self.log_event(
+                {
+                    "event": "answer",
+                    "chat_id": chat_id,
+                    "text": original_text,
+                    "answer_source": source,
+                    "first_shown_sec": round(reply.first_shown_sec, 2) if reply and reply.first_shown_sec is not None else None,
+                    "answer": answer,
+                }
+            )
         except Exception as exc:
             elapsed = time.monotonic() - started
             answer = f"처리 중 오류가 났어: {exc}"
+            if reply is not None and reply.started:
+                with contextlib.suppress(Exception):
+                    reply.finish(f"{reply.text}\n\n(생성 중단)")
             self.telegram.send_message(chat_id, answer)
             self.log_event(
                 {
@@ -410,30 +463,58 @@ class PatentTelegramBot:
 
     def run_pro_job(self, chat_id: int, original_text: str, question: str, mode: str) -> None:
         started = time.monotonic()
+        reply, on_text = self.streaming_reply(chat_id)
         try:
-            result = judge_question(question, provider="auto", planner_provider="auto", limit=self.limit, timeout=self.timeout)
+            key = self.pro_key(question, mode)
+
+            def compute() -> Dict[str, Any]:
+                result = judge_question(
+                    question,
+                    provider="auto",
+                    planner_provider="auto",
+                    limit=self.limit,
+                    timeout=self.timeout,
+                    service=self.service,
+                    on_text=on_text,
+                )
+                pack = result.pop("evidence_pack")
+                # Keep the cached entry small: the reply and what the log needs, not the pack.
+                result["query_plan"] = pack.get("query_plan")
+                result["retrieved_patents"] = [c["patent_id"] for c in pack.get("retrieved_cards", [])]
+                return result
+
+            with self.telegram.typing(chat_id):
+                result, source, age_sec = ANSWER_CACHE.get_or_run(key, compute)
             answer = (
                 f"판단 모드: {mode}\n"
                 f"Provider: {result['provider']} / {result['model']}\n"
                 f"Planner: {result['planner_provider']} / {result['planner_model']}\n"
-                f"생성 시간: {result['elapsed_sec']}초\n\n"
-                f"{result['answer']}"
+                f"생성 시간: {result['elapsed_sec']}초"
+                + (f" (첫 토큰 {result['first_token_sec']}초)" if result.get("first_token_sec") is not None else "")
+                + f"\n\n{result['answer']}"
             )
-            self.telegram.send_message(chat_id, answer)
+            note = source_note(source, age_sec)
+            if note:
+                answer = f"{note}\n{answer}"
+            self.deliver(chat_id, reply, source, answer)
             self.log_event(
                 {
                     "event": "pro_answer",
                     "chat_id": chat_id,
                     "text": original_text,
                     "mode": mode,
+                    "answer_source": source,
                     "elapsed_sec": round(time.monotonic() - started, 1),
                     "answer": answer,
-                    "query_plan": result["evidence_pack"].get("query_plan"),
-                    "retrieved_patents": [c["patent_id"] for c in result["evidence_pack"].get("retrieved_cards", [])],
+                    "query_plan": result["query_plan"],
+                    "retrieved_patents": result["retrieved_patents"],
                 }
             )
         except Exception as exc:
             answer = f"프로 판단 처리 중 오류가 났어: {exc}"
+            if reply is not None and reply.started:
+                with contextlib.suppress(Exception):
+                    reply.finish(f"{reply.text}\n\n(생성 중단)")
             self.telegram.send_message(chat_id, answer)
             self.log_event(
                 {
@@ -450,14 +531,16 @@ class PatentTelegramBot:
     def run_mission_job(self, chat_id: int, original_text: str, goal: str) -> None:
         started = time.monotonic()
         try:
-            result = run_mission(
-                goal,
-                model=self.model,
-                max_queries=5,
-                per_query_limit=max(6, min(12, self.limit)),
-                max_candidates=max(12, min(20, self.limit * 2)),
-                timeout=max(self.timeout, 360),
-            )
+            with self.telegram.typing(chat_id):
+                result = run_mission(
+                    goal,
+                    model=self.model,
+                    max_queries=5,
+                    per_query_limit=max(6, min(12, self.limit)),
+                    max_candidates=max(12, min(20, self.limit * 2)),
+                    timeout=max(self.timeout, 360),
+                    service=self.service,
+                )
             answer = format_mission_summary(result)
             self.telegram.send_message(chat_id, answer)
             self.log_event(
@@ -487,20 +570,78 @@ class PatentTelegramBot:
                 }
             )
 
+    def submit(self, lane: str, chat_id: int, fn: Callable[..., Any], *args: Any, label: str = "") -> Optional[Future]:
+        try:
+            return self.lanes[lane].submit(fn, *args, chat_id=chat_id, label=label)
+        except LaneFull as exc:
+            if exc.per_chat:
+                message = f"이 채팅방의 {LANE_LABELS.get(lane, lane)} 작업이 이미 {exc.pending}건 있어. 끝난 뒤 다시 보내줘. (/queue 로 확인)"
+            else:
+                message = f"지금 {LANE_LABELS.get(lane, lane)} 작업이 밀려 있어 (대기 {exc.pending}건). 잠시 후 다시 보내줘."
+            self.telegram.send_message(chat_id, message)
+            self.log_event({"event": "lane_full", "chat_id": chat_id, "lane": lane, "pending": exc.pending, "per_chat": exc.per_chat})
+            return None
+
+    def wait_note(self, lane: str, future: Future) -> str:
+        place = self.lanes[lane].position(future)
+        if not place or place["eta_sec"] < 1:
+            return ""
+        return f"\n대기 {place['position']}번째, 예상 대기 약 {format_age(place['eta_sec'])}. /queue 로 확인할 수 있어."
+
     def enqueue_ask(self, chat_id: int, original_text: str, question: str) -> None:
-        self.telegram.send_message(chat_id, "질문 받았어. 관련 특허를 찾고 로컬 LLM으로 답변 생성 중이야.")
+        if ANSWER_CACHE.peek(self.ask_key(question)):
+            # A cached answer costs nothing to send, so it skips the LLM lane queue.
+            self.run_ask_job(chat_id, original_text, question)
+            return
+        future = self.submit("local", chat_id, self.run_ask_job, chat_id, original_text, question, label=f"/ask {question}")
+        if future is None:
+            return
+        self.telegram.send_message(chat_id, "질문 받았어. 관련 특허를 찾고 로컬 LLM으로 답변 생성 중이야." + self.wait_note("local", future))
         self.log_event({"event": "ask_queued", "chat_id": chat_id, "text": original_text, "question": question})
-        self.ask_executor.submit(self.run_ask_job, chat_id, original_text, question)
 
     def enqueue_pro(self, chat_id: int, original_text: str, question: str, mode: str) -> None:
-        self.telegram.send_message(chat_id, "프로 판단 질문 받았어. GPT/Gemini가 검색 계획을 만들고 로컬 근거를 검토하는 중이야.")
+        if ANSWER_CACHE.peek(self.pro_key(question, mode)):
+            self.run_pro_job(chat_id, original_text, question, mode)
+            return
+        future = self.submit("pro", chat_id, self.run_pro_job, chat_id, original_text, question, mode, label=f"/{mode} {question}")
+        if future is None:
+            return
+        self.telegram.send_message(
+            chat_id, "프로 판단 질문 받았어. GPT/Gemini가 검색 계획을 만들고 로컬 근거를 검토하는 중이야." + self.wait_note("pro", future)
+        )
         self.log_event({"event": "pro_queued", "chat_id": chat_id, "text": original_text, "question": question, "mode": mode})
-        self.ask_executor.submit(self.run_pro_job, chat_id, original_text, question, mode)
 
     def enqueue_mission(self, chat_id: int, original_text: str, goal: str) -> None:
-        self.telegram.send_message(chat_id, "오토 미션 받았어. 로컬 LLM이 검색 계획을 만들고 후보를 모아서 리포트 작성 중이야.")
+        future = self.submit("mission", chat_id, self.run_mission_job, chat_id, original_text, goal, label=f"/mission {goal}")
+        if future is None:
+            return
+        self.telegram.send_message(
+            chat_id, "오토 미션 받았어. 로컬 LLM이 검색 계획을 만들고 후보를 모아서 리포트 작성 중이야." + self.wait_note("mission", future)
+        )
         self.log_event({"event": "mission_queued", "chat_id": chat_id, "text": original_text, "goal": goal})
-        self.ask_executor.submit(self.run_mission_job, chat_id, original_text, goal)
+
+    def format_queue(self, chat_id: int) -> str:
+        lines = ["작업 대기열"]
+        mine = [job for name, lane in self.lanes.items() if name != "fast" for job in lane.chat_jobs(chat_id)]
+        if mine:
+            lines.append("이 채팅방 작업:")
+            for job in mine:
+                label = job["label"] if len(job["label"]) <= 40 else job["label"][:39] + "…"
+                if job["state"] == "running":
+                    lines.append(f"- {label}: 실행 중 ({format_age(job['elapsed_sec'])} 경과)")
+                else:
+                    lines.append(f"- {label}: 대기 {job['position']}번째, 예상 대기 약 {format_age(job['eta_sec'])}")
+        else:
+            lines.append("이 채팅방에서 기다리는 작업은 없어.")
+        lines.append("")
+        lines.append("레인별:")
+        for name, lane in self.lanes.items():
+            stats = lane.stats()
+            lines.append(
+                f"- {LANE_LABELS.get(name, name)}: 실행 {stats['running']}/{stats['workers']}, 대기 {stats['queued']}"
+                f"/{stats['queue_depth']}, 작업당 약 {format_age(stats['recent_sec'])}, 지금 보내면 약 {format_age(stats['wait_sec'])} 대기"
+            )
+        return "\n".join(lines)
 
     def handle_text(self, chat_id: int, text: str) -> Optional[str]:
         text = self.strip_bot_suffix(text.strip())
@@ -508,6 +649,8 @@ class PatentTelegramBot:
             return self.help_text()
         if text == "/status":
             return self.status()
+        if text == "/queue":
+            return self.format_queue(chat_id)
         if text == "/pending":
             return format_pending()
         if text in {"/approve", "승인"}:
@@ -546,10 +689,10 @@ class PatentTelegramBot:
                 return "검색어를 같이 보내줘. 예: /search page buffer bit line 또는 /search 20 page buffer bit line"
             _, cards = self.retrieve(query, limit=search_limit)
             return self.format_cards(cards)
+        if text.startswith("/facets"):
+            return self.format_facets(self.service.facet_counts(text.removeprefix("/facets").strip()))
         if text.startswith("/patent"):
-            con = self.connect()
-            cards = self.fuzzy_patent_cards(con, text.removeprefix("/patent").strip(), limit=5)
-            con.close()
+            cards = self.fuzzy_patent_cards(text.removeprefix("/patent").strip(), limit=5)
             if not cards:
                 return "해당 특허를 찾지 못했어. 예: /patent us20250191658a1p 또는 /patent 20250191658"
             if len(cards) > 1:
@@ -595,51 +738,53 @@ class PatentTelegramBot:
     def is_allowed(self, chat_id: int) -> bool:
         return not self.allowed_chat_ids or chat_id in self.allowed_chat_ids
 
+    def process_message(self, chat_id: int, text: str) -> None:
+        try:
+            answer = self.handle_text(chat_id, text)
+        except Exception as exc:
+            answer = f"처리 중 오류가 났어: {exc}"
+            self.log_event(
+                {
+                    "event": "error",
+                    "chat_id": chat_id,
+                    "text": text,
+                    "error": repr(exc),
+                    "traceback": traceback.format_exc(),
+                }
+            )
+        if answer is not None:
+            self.telegram.send_message(chat_id, answer)
+            self.log_event({"event": "answer", "chat_id": chat_id, "text": text, "answer": answer})
+
+    def dispatch_update(self, update: Dict[str, Any]) -> None:
+        try:
+            message = update.get("message") or {}
+            chat = message.get("chat") or {}
+            text = str(message.get("text") or "").strip()
+            if not text or chat.get("id") is None:
+                return
+            chat_id = int(chat["id"])
+            if not self.is_allowed(chat_id):
+                self.log_event({"event": "rejected_chat", "chat_id": chat_id, "text": text})
+                self.telegram.send_message(chat_id, "이 봇은 허용된 채팅방에서만 사용할 수 있어.")
+                return
+            self.log_event({"event": "question", "chat_id": chat_id, "text": text})
+            self.submit("fast", chat_id, self.process_message, chat_id, text, label=text)
+        except Exception as exc:
+            self.log_event({"event": "poll_error", "error": repr(exc), "traceback": traceback.format_exc()})
+
     def run(self, poll_timeout: int = 30) -> None:
-        offset: Optional[int] = None
         try:
-            self.telegram.set_commands()
+            self.telegram.set_commands(BOT_COMMANDS)
             self.log_event({"event": "commands_registered"})
         except Exception as exc:
             self.log_event({"event": "commands_register_error", "error": repr(exc)})
         print(f"[telegram] started, db={self.db_path}")
-        while True:
-            try:
-                updates = self.telegram.get_updates(offset, poll_timeout)
-                for update in updates:
-                    offset = update["update_id"] + 1
-                    message = update.get("message") or {}
-                    chat = message.get("chat") or {}
-                    chat_id = int(chat.get("id"))
-                    text = str(message.get("text") or "").strip()
-                    if not text:
-                        continue
-                    if not self.is_allowed(chat_id):
-                        self.log_event({"event": "rejected_chat", "chat_id": chat_id, "text": text})
-                        self.telegram.send_message(chat_id, "이 봇은 허용된 채팅방에서만 사용할 수 있어.")
-                        continue
-                    self.log_event({"event": "question", "chat_id": chat_id, "text": text})
-                    try:
-                        answer = self.handle_text(chat_id, text)
-                    except Exception as exc:
-                        answer = f"처리 중 오류가 났어: {exc}"
-                        self.log_event(
-                            {
-                                "event": "error",
-                                "chat_id": chat_id,
-                                "text": text,
-                                "error": repr(exc),
-                                "traceback": traceback.format_exc(),
-                            }
-                        )
-                    if answer is not None:
-                        self.telegram.send_message(chat_id, answer)
-                        self.log_event({"event": "answer", "chat_id": chat_id, "text": text, "answer": answer})
-            except KeyboardInterrupt:
-                raise
-            except Exception as exc:
-                self.log_event({"event": "poll_error", "error": repr(exc), "traceback": traceback.format_exc()})
-                time.sleep(5)
+        self.telegram.run_polling(
+            self.dispatch_update,
+            poll_timeout,
+            on_error=lambda exc: self.log_event({"event": "poll_error", "error": repr(exc)}),
+        )
 
 
 def main() -> None:
@@ -651,8 +796,28 @@ def main() -> None:
     parser.add_argument("--limit", type=int, default=10)
     parser.add_argument("--timeout", type=int, default=240)
     parser.add_argument("--num-predict", type=int, default=1600)
-    parser.add_argument("--ask-workers", type=int, default=1)
+    parser.add_argument("--fast-workers", type=int, default=LANE_DEFAULTS["fast"][0], help="Workers for lookups and approvals.")
+    parser.add_argument("--ask-workers", type=int, default=LANE_DEFAULTS["local"][0], help="Workers for /ask (local LLM).")
+    parser.add_argument("--pro-workers", type=int, default=LANE_DEFAULTS["pro"][0], help="Workers for /ask_pro and /verify.")
+    parser.add_argument("--mission-workers", type=int, default=LANE_DEFAULTS["mission"][0])
+    parser.add_argument("--fast-queue", type=int, default=LANE_DEFAULTS["fast"][1], help="Jobs that may wait per lane.")
+    parser.add_argument("--ask-queue", type=int, default=LANE_DEFAULTS["local"][1])
+    parser.add_argument("--pro-queue", type=int, default=LANE_DEFAULTS["pro"][1])
+    parser.add_argument("--mission-queue", type=int, default=LANE_DEFAULTS["mission"][1])
     parser.add_argument("--poll-timeout", type=int, default=30)
+    parser.add_argument(
+        "--transport",
+        choices=["async", "requests"],
+        default="async",
+        help="async: pooled keep-alive connections, pipelined chunks, rate limits; requests: one blocking call per message.",
+    )
+    parser.add_argument("--no-stream", action="store_true", help="Send answers only when complete instead of editing them in as they are generated.")
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=DEFAULT_METRICS_PORT,
+        help="Serve Prometheus /metrics on 127.0.0.1 at this port (0 disables).",
+    )
     args = parser.parse_args()
 
     token = os.environ.get("TELEGRAM_BOT_TOKEN", "").strip()
@@ -668,8 +833,18 @@ def main() -> None:
         limit=args.limit,
         timeout=args.timeout,
         num_predict=args.num_predict,
-        ask_workers=args.ask_workers,
+        lane_sizes={
+            "fast": (args.fast_workers, args.fast_queue),
+            "local": (args.ask_workers, args.ask_queue),
+            "pro": (args.pro_workers, args.pro_queue),
+            "mission": (args.mission_workers, args.mission_queue),
+        },
+        transport=args.transport,
+        stream_replies=not args.no_stream,
     )
+    if args.metrics_port:
+        server = serve_metrics(args.metrics_port)
+        print(f"[metrics] http://{server.server_address[0]}:{server.server_address[1]}/metrics")
     bot.run(args.poll_timeout)
 
 
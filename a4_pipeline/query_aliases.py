@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from card_cache import index_version
+
+
+# Query expansion dictionary: key phrase -> alias terms. Hand-written seeds plus aliases
+# mined from the corpus at index build time and stored in each index DB
+# (query_aliases table), so a rebuild re-mines them under the new index_version.
+# Keys are matched as substrings of the lowercased query with an Aho-Corasick automaton,
+# which costs O(query length + matches) no matter how many keys the dictionary holds.
+#
+# Mining: every solution label is a concept. Core elements and short titles that co-occur
+# with the label in at least min_support cards, and mostly with that label, become its
+# aliases, e.g. page_buffer_circuit -> "page buffer", "页缓冲器", "페이지 버퍼".
+
+SEED_ALIASES: Dict[str, List[str]] = {
+    "메모리 평면": ["memory plane", "multiple memory planes", "multi_plane_architecture", "多个存储器平面"],
+    "평면 주소": ["plane address", "no plane address", "no_plane_address_input", "不接收平面地址", "平面地址"],
+    "plane address": ["plane address", "no plane address", "no_plane_address_input", "不接收平面地址", "平面地址"],
+    "독립 명령": ["independent command", "command and address", "独立接收命令和地址", "independent command address"],
+    "independent command": ["independent command", "command and address", "独立接收命令和地址", "independent command address"],
+    "패드 그룹": ["pad group", "plane dedicated pad", "plane_dedicated_pad_group", "平面专用焊盘组"],
+    "pad group": ["pad group", "plane dedicated pad", "plane_dedicated_pad_group", "平面专用焊盘组"],
+    "데이터 경로": ["data path", "separate_data_path", "数据路径", "데이터 경로"],
+    "페이지 버퍼": ["page buffer", "page_buffer_circuit", "页缓冲器", "페이지 버퍼"],
+    "워드 라인": ["word line", "word_line_control", "字线", "워드 라인"],
+    "비트 라인": ["bit line", "bit_line_connection", "位线", "비트 라인"],
+    "읽기 전압": ["read voltage", "read_reference_voltage_control", "读取电压", "읽기 전압"],
+    "garbage collection": ["garbage collection", "flash_garbage_collection", "垃圾回收"],
+    "가비지 컬렉션": ["garbage collection", "flash_garbage_collection", "垃圾回收"],
+    "ssd": ["SSD", "solid state drive", "solid_state_drive_data_operation", "固态硬盘"],
+    "ssd accelerator": ["SSD accelerator", "accelerator", "token manager", "non-volatile memory array"],
+    "펌웨어": ["firmware", "firmware_upgrade_control", "固件", "펌웨어"],
+    "암호화": ["encryption", "decryption", "encryption_decryption_processing", "암호화"],
+}
+
+# Phrases triage scores when the question names them, on top of the dictionary keys. They are
+# not expansion keys, so adding one here does not change expand() or /search ranking.
+TRIAGE_PHRASES: List[str] = ["page buffer", "bit line", "program verify", "evaluation operation"]
+
+DEFAULT_MIN_SUPPORT = 2
+DEFAULT_MIN_CONFIDENCE = 0.5
+MAX_ALIASES_PER_KEY = 12
+MAX_TERM_CHARS = 40
+SKIP_LABELS = {"generic_memory_operation", "general_data_processing"}
+CJK_RE = re.compile(r"[\u3131-\u318e\uac00-\ud7a3\u4e00-\u9fff]")
+
+
+def normalize_ws(value: Any) -> str:
+    return re.sub(r"\s+", " ", str(value or "")).strip()
+
+
+def usable_key(term: str) -> bool:
+    """Long enough to be a meaningful substring match: 2+ CJK/Hangul chars or 4+ others."""
+    if not term or len(term) > MAX_TERM_CHARS or term.isdigit() or "_" in term:
+        return False
+    return len(term) >= (2 if CJK_RE.search(term) else 4)
+
+
+# ---------- matching ----------
+
+class AliasMatcher:
+    """Aho-Corasick automaton over the lowercased alias keys."""
+
+    def __init__(self, aliases: Dict[str, Sequence[str]], version: str = "") -> None:
+        self.version = version
+        self.keys: List[str] = []
+        self.aliases: List[List[str]] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        for key, values in aliases.items():
+            key = normalize_ws(key).lower()
+            if key:
+                self._add(key, len(self.keys))
+                self.keys.append(key)
+                self.aliases.append(list(values))
+        self._link()
+
+    def _add(self, key: str, index: int) -> None:
+        node = 0
+        for ch in key:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[node][ch] = child
+            node = child
+        self._out[node] += (index,)
+
+    def _link(self) -> None:
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+    def matched(self, text: str) -> List[int]:
+        """Indexes of the keys that occur in text, in dictionary order."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        found = set()
+        for ch in normalize_ws(text).lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return sorted(found)
+
+    def matched_keys(self, text: str) -> List[str]:
+        return [self.keys[index] for index in self.matched(text)]
+
+    def expand(self, query: str) -> List[str]:
+        query = normalize_ws(query)
+        terms = [query] if query else []
+        for index in self.matched(query):
+            terms.extend(self.aliases[index])
+        return list(dict.fromkeys([term for term in terms if term]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self.keys),
+            "aliases": sum(len(values) for values in self.aliases),
+            "states": len(self._goto),
+            "version": self.version,
+        }
+
+
+@lru_cache(maxsize=1)
+def default_matcher() -> AliasMatcher:
+    """Seed aliases only, for callers without an index connection or older indexes."""
+    return AliasMatcher(SEED_ALIASES, version="seed")
+
+
+_MATCHERS: Dict[str, AliasMatcher] = {}
+_MATCHERS_LOCK = threading.Lock()
+
+
+def alias_matcher(con: sqlite3.Connection | None) -> AliasMatcher:
+    """Matcher over the query_aliases table of con's index, compiled once per index_version."""
+    if con is None:
+        return default_matcher()
+    version = index_version(con)
+    with _MATCHERS_LOCK:
+        matcher = _MATCHERS.get(version)
+    if matcher is not None:
+        return matcher
+    aliases = read_aliases(con)
+    matcher = AliasMatcher(aliases, version=version) if aliases else default_matcher()
+    with _MATCHERS_LOCK:
+        if len(_MATCHERS) >= 8:
+            _MATCHERS.clear()
+        _MATCHERS[version] = matcher
+    return matcher
+
+
+# ---------- mining / storage ----------
+
+def card_terms(card: Dict[str, Any]) -> List[str]:
+    terms = [normalize_ws(element) for element in card.get("core_elements") or []]
+    for column in ("title_source", "title_ko"):
+        title = normalize_ws(card.get(column))
+        if title and len(title) <= MAX_TERM_CHARS:
+            terms.append(title)
+    return [term for term in dict.fromkeys(terms) if term and len(term) <= MAX_TERM_CHARS]
+
+
+def mine_aliases(
+    cards: Iterable[Dict[str, Any]],
+    min_support: int = DEFAULT_MIN_SUPPORT,
+    min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+) -> Dict[str, List[str]]:
+    """Label-anchored alias groups from co-occurring core elements and titles."""
+    label_count: Counter = Counter()
+    term_count: Counter = Counter()
+    pair_count: Counter = Counter()
+    display: Dict[str, Counter] = defaultdict(Counter)
+    label_languages: Dict[str, set] = defaultdict(set)
+    for card in cards:
+        if card.get("qc_flags"):  # contaminated titles and labels would teach wrong aliases
+            continue
+        labels = [label for label in dict.fromkeys(card.get("solution_labels") or []) if label and label not in SKIP_LABELS]
+        terms = card_terms(card)
+        label_count.update(labels)
+        for label in labels:
+            label_languages[label].add(card.get("source_language") or "")
+        for term in terms:
+            key = term.lower()
+            term_count[key] += 1
+            display[key][term] += 1
+            for label in labels:
+                pair_count[(label, key)] += 1
+
+    # Each term joins the one label it is most associated with. Ties go to a label that
+    # names the term ("page buffer" for page_buffer_circuit), then to labels seen in more
+    # languages, which are the ones that bridge a Korean query to Chinese/English cards.
+    best: Dict[str, Tuple[Tuple[float, ...], str]] = {}
+    for (label, key), count in pair_count.items():
+        if label_count[label] < min_support or count < min_support:
+            continue
+        confidence = count / term_count[key]
+        if confidence < min_confidence:
+            continue
+        rank = (float(key in label.replace("_", " ")), confidence, float(len(label_languages[label])), float(label_count[label]))
+        if key not in best or rank > best[key][0]:
+            best[key] = (rank, label)
+
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for key, (_, label) in sorted(best.items(), key=lambda item: (-pair_count[(item[1][1], item[0])], item[0])):
+        groups[label].append(display[key].most_common(1)[0][0])
+
+    aliases: Dict[str, List[str]] = {}
+    for label in sorted(groups, key=lambda item: (-label_count[item], item)):
+        phrase = label.replace("_", " ")
+        group = list(dict.fromkeys([phrase, label, *groups[label]]))[:MAX_ALIASES_PER_KEY]
+        for key in [phrase, *groups[label]]:
+            key = key.lower()
+            if usable_key(key):
+                aliases.setdefault(key, [])
+                aliases[key] = list(dict.fromkeys([*aliases[key], *group]))[:MAX_ALIASES_PER_KEY]
+    return aliases
+
+
+def merge_aliases(*dictionaries: Dict[str, Sequence[str]]) -> Dict[str, List[str]]:
+    """Union of alias dictionaries; earlier ones keep their key order and alias order."""
+    merged: Dict[str, List[str]] = {}
+    for dictionary in dictionaries:
+        for key, values in dictionary.items():
+            key = normalize_ws(key).lower()
+            existing = merged.get(key, [])
+            combined = list(dict.fromkeys([*existing, *values]))
+            merged[key] = combined[: max(MAX_ALIASES_PER_KEY, len(existing))]
+    return merged
+
+
+def create_alias_index(con: sqlite3.Connection, aliases: Dict[str, Sequence[str]]) -> int:
+    con.execute("DROP TABLE IF EXISTS query_aliases")
+    con.execute(
+        """
+        CREATE TABLE query_aliases (
+            key TEXT NOT NULL,
+            alias TEXT NOT NULL,
+            key_rank INTEGER NOT NULL,
+            alias_rank INTEGER NOT NULL,
+            PRIMARY KEY (key, alias)
+        ) WITHOUT ROWID
+        """
+    )
+    rows = (
+        (key, alias, key_rank, alias_rank)
+        for key_rank, (key, values) in enumerate(aliases.items())
+        for alias_rank, alias in enumerate(values)
+    )
+    cur = con.executemany("INSERT OR IGNORE INTO query_aliases (key, alias, key_rank, alias_rank) VALUES (?, ?, ?, ?)", rows)
+    con.commit()
+    return cur.rowcount
+
+
+def read_aliases(con: sqlite3.Connection) -> Dict[str, List[str]]:
+    try:
+        rows = con.execute("SELECT key, alias FROM query_aliases ORDER BY key_rank, alias_rank").fetchall()
+    except sqlite3.OperationalError:  # index built before the alias table existed
+        return {}
+    aliases: Dict[str, List[str]] = {}
+    for key, alias in rows:
+        aliases.setdefault(key, []).append(alias)
+    return aliases
+
+
+def build_alias_dictionary(cards: Iterable[Dict[str, Any]], min_support: int = DEFAULT_MIN_SUPPORT) -> Dict[str, List[str]]:
+    return merge_aliases(SEED_ALIASES, mine_aliases(cards, min_support=min_support))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show the alias dictionary of an index and how queries expand.")
+    parser.add_argument("queries", nargs="*")
+    parser.add_argument("--index-db", default="")
+    parser.add_argument("--dump", action="store_true", help="Print every key and its aliases.")
+    args = parser.parse_args()
+
+    con = sqlite3.connect(Path(args.index_db)) if args.index_db else None
+    matcher = alias_matcher(con)
+    out: Dict[str, Any] = {"dictionary": matcher.stats()}
+    out["expansions"] = {query: {"keys": matcher.matched_keys(query), "terms": matcher.expand(query)} for query in args.queries}
+    if args.dump:
+        out["aliases"] = dict(zip(matcher.keys, matcher.aliases))
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+    if con is not None:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import copy
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from metrics import REGISTRY, stats_samples
+
+
+# Whole result lists of search / search_packs / rank_evidence, keyed by
+# (kind, index version, normalized query, filters, limit). The index version is the
+# index_version stamp the builders write into index_meta, so a rebuild changes every
+# key and the first query that sees the new stamp drops the old entries of that kind.
+
+DEFAULT_QUERY_CACHE_SIZE = int(os.environ.get("A4_QUERY_CACHE_SIZE", "2048"))
+DEFAULT_QUERY_CACHE_TTL_SEC = float(os.environ.get("A4_QUERY_CACHE_TTL_SEC", "1800"))
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", str(query or "")).strip()
+
+
+def freeze(value: Any) -> Hashable:
+    """Stable hashable form of a JSON-like value, e.g. an LLM query plan."""
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class QueryResultCache:
+    """Thread-safe LRU + TTL cache of query results with hit-rate counters."""
+
+    def __init__(self, maxsize: int = DEFAULT_QUERY_CACHE_SIZE, ttl_sec: float = DEFAULT_QUERY_CACHE_TTL_SEC) -> None:
+        self.maxsize = maxsize
+        self.ttl_sec = ttl_sec
+        self._items: OrderedDict[Tuple[Hashable, ...], Tuple[float, Any]] = OrderedDict()
+        self._versions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidated = 0
+        self.compute_sec = 0.0
+
+    def _invalidate_kind(self, kind: str, version: str) -> None:
+        # Caller holds the lock. A new version stamp means the index was rebuilt.
+        if self._versions.get(kind) == version:
+            return
+        if kind in self._versions:
+            stale = [key for key in self._items if key[0] == kind and key[1] != version]
+            for key in stale:
+                del self._items[key]
+            self.invalidated += len(stale)
+        self._versions[kind] = version
+
+    def get_or_compute(self, kind: str, version: str, key: Tuple[Hashable, ...], compute: Callable[[], Any]) -> Any:
+        if not version or self.maxsize <= 0:
+            return compute()
+        full_key = (kind, version, *key)
+        now = time.monotonic()
+        with self._lock:
+            self._invalidate_kind(kind, version)
+            entry = self._items.get(full_key)
+            if entry is not None and self.ttl_sec > 0 and now - entry[0] > self.ttl_sec:
+                del self._items[full_key]
+                self.expired += 1
+                entry = None
+            if entry is not None:
+                self._items.move_to_end(full_key)
+                self.hits += 1
+        if entry is not None:
+            # Callers decorate and mutate result dicts; hand out a private copy.
+            return copy.deepcopy(entry[1])
+        started = time.perf_counter()
+        value = compute()
+        elapsed = time.perf_counter() - started
+        stored = copy.deepcopy(value)
+        with self._lock:
+            self.misses += 1
+            self.compute_sec += elapsed
+            self._invalidate_kind(kind, version)
+            self._items[full_key] = (time.monotonic(), stored)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._versions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "invalidated": self.invalidated,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "compute_ms": round(self.compute_sec * 1000.0, 3),
+                "versions": dict(self._versions),
+            }
+
+
+QUERY_CACHE = QueryResultCache()
+REGISTRY.register_collector(
+    lambda: stats_samples(
+        "a4_cache", QUERY_CACHE.stats(), ["hits", "misses", "expired", "invalidated"], ["size", "hit_rate"], cache="query"
+    )
+)
@@ -28,6 +28,7 @@ from build_evidence_db import (  # noqa: E402
 )
 from build_evidence_pack_index import is_contaminated_claim_text, normalize_ws  # noqa: E402
 from config import A4_DB, A4_LOGS  # noqa: E402
+from db_schema import append_change, ensure_change_log  # noqa: E402
 
 
 DEFAULT_REPORT_DIR = Path("/Volumes/외장 2TB/cpu2026/common/runtime/reports/A4")
@@ -83,6 +84,7 @@ def ensure_repair_tables(con: sqlite3.Connection) -> None:
         );
         """
     )
+    ensure_change_log(con)
     con.commit()
 
 
@@ -211,6 +213,7 @@ def repair_one(con: sqlite3.Connection, patent_id: str, run_id: str, dry_run: bo
     if not dry_run:
         backup_claims(con, run_id, patent_id)
         replace_claim_artifacts(con, patent_id, claims, refs, claim_ref_map, figure_caps, drawing_ref_map)
+        append_change(con, patent_id, "evidence_claim_repair", run_id)
     return {
         "patent_id": patent_id,
         "status": "repaired" if not dry_run else "would_repair",
@@ -10,6 +10,7 @@ from pathlib import Path
 from typing import Any, Dict, Iterable, List, Sequence
 
 from config import A4_DB
+from db_schema import append_change, ensure_change_log
 
 
 DEFAULT_REPORT_DIR = Path("/Volumes/외장 2TB/cpu2026/common/runtime/reports/A4")
@@ -225,6 +226,7 @@ def ensure_tables(con: sqlite3.Connection) -> None:
         );
         """
     )
+    ensure_change_log(con)
     con.commit()
 
 
@@ -297,6 +299,7 @@ def run_cleanup(db_path: Path, patent_ids: Sequence[str], dry_run: bool, report_
     ensure_tables(con)
     rows = iter_claim_rows(con, unique_keep_order(patent_ids))
     actions: List[Dict[str, Any]] = []
+    changed_patents: List[str] = []
 
     try:
         for row in rows:
@@ -318,6 +321,8 @@ def run_cleanup(db_path: Path, patent_ids: Sequence[str], dry_run: bool, report_
             if dry_run:
                 continue
             backup_row(con, run_id, row, action)
+            if row["patent_id"] not in changed_patents:
+                changed_patents.append(row["patent_id"])
             if action["action"] == "delete":
                 con.execute(
                     "DELETE FROM claim_ref_map WHERE patent_id=? AND claim_no=?",
@@ -360,6 +365,8 @@ def run_cleanup(db_path: Path, patent_ids: Sequence[str], dry_run: bool, report_
                 """,
                 (run_id, len(actions), update_count, delete_count, int(dry_run), str(report_path)),
             )
+            for patent_id in changed_patents:
+                append_change(con, patent_id, "claim_text_cleanup", run_id)
             con.commit()
         con.close()
     except Exception:
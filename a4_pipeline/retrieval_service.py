@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CODE_DIR = Path(__file__).resolve().parent
+if str(CODE_DIR) not in sys.path:
+    sys.path.insert(0, str(CODE_DIR))
+
+from build_evidence_units import DEFAULT_UNITS_DB  # noqa: E402
+from card_cache import CARD_CACHE, index_version  # noqa: E402
+from evidence_pack import DEFAULT_EVIDENCE_DB, build_evidence_pack, extract_patent_id  # noqa: E402
+from evidence_reranker import rank_evidence  # noqa: E402
+from llm_clients import LLMClient  # noqa: E402
+from metrics import timed  # noqa: E402
+from patent_dictionary_ask import build_prompt_cards, infer_search_query  # noqa: E402
+from patent_dictionary_search import DEFAULT_DB, facet_counts, lookup, lookup_many, search  # noqa: E402
+from patent_id_index import resolve_patent_ids  # noqa: E402
+from patent_local_triage import DEFAULT_PACK_DB, search_packs, triage_question  # noqa: E402
+from query_cache import QUERY_CACHE  # noqa: E402
+
+
+# One object per process owns the read-only handles to the four A4 databases, so the
+# bot, triage, mission and judge paths stop paying connect + schema parse + cold page
+# cache on every query. sqlite3 connections are per thread here (worker pools call in
+# concurrently); each keeps its own prepared-statement cache and page cache. A handle is
+# reopened when a builder replaces the DB file (new inode); in-place writes are picked
+# up by SQLite itself.
+# Fan-out work (e.g. a mission's planned queries) runs on a small persistent worker pool;
+# each worker keeps its own read-only handles, so the pool doubles as a connection pool.
+# Handles of a thread that exits (e.g. a uvicorn/anyio worker retired from its pool) are
+# closed by a finalizer on that thread's holder, so short-lived threads do not leak them.
+
+DB_NAMES = ("index", "units", "packs", "evidence")
+DEFAULT_CACHE_KIB = int(os.environ.get("A4_SQLITE_CACHE_KIB", "65536"))
+DEFAULT_MMAP_BYTES = int(os.environ.get("A4_SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+STATEMENT_CACHE_SIZE = 256
+DEFAULT_FANOUT_WORKERS = int(os.environ.get("A4_RETRIEVAL_WORKERS", "4"))
+
+
+def open_readonly(path: Path, cache_kib: int = DEFAULT_CACHE_KIB, mmap_bytes: int = DEFAULT_MMAP_BYTES) -> sqlite3.Connection:
+    uri = Path(path).resolve().as_uri() + "?mode=ro"
+    con = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA query_only=1")
+    con.execute(f"PRAGMA cache_size=-{int(cache_kib)}")
+    con.execute(f"PRAGMA mmap_size={int(mmap_bytes)}")
+    return con
+
+
+class _ThreadHandles:
+    """One thread's open handles: name -> (connection, file identity)."""
+
+    def __init__(self) -> None:
+        self.handles: Dict[str, Tuple[sqlite3.Connection, Tuple[int, int]]] = {}
+
+
+def _release_thread_handles(service_ref: "weakref.ref[RetrievalService]", handles: Dict[str, Tuple[sqlite3.Connection, Tuple[int, int]]]) -> None:
+    service = service_ref()
+    if service is not None:
+        service._release(handles)
+        return
+    for con, _ in handles.values():
+        con.close()
+    handles.clear()
+
+
+def file_identity(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class RetrievalService:
+    def __init__(
+        self,
+        index_db: Path = DEFAULT_DB,
+        units_db: Path = DEFAULT_UNITS_DB,
+        pack_db: Path = DEFAULT_PACK_DB,
+        evidence_db: Path = DEFAULT_EVIDENCE_DB,
+        cache_kib: int = DEFAULT_CACHE_KIB,
+        mmap_bytes: int = DEFAULT_MMAP_BYTES,
+        workers: int = DEFAULT_FANOUT_WORKERS,
+    ) -> None:
+        self.paths: Dict[str, Path] = {
+            "index": Path(index_db),
+            "units": Path(units_db),
+            "packs": Path(pack_db),
+            "evidence": Path(evidence_db),
+        }
+        self.cache_kib = cache_kib
+        self.mmap_bytes = mmap_bytes
+        self.workers = max(1, workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open: List[sqlite3.Connection] = []
+        self.opened = 0
+        self.reopened = 0
+        self.released = 0
+        self.started_at = time.time()
+
+    # ---------- connections ----------
+
+    def connection(self, name: str) -> Optional[sqlite3.Connection]:
+        """This thread's read-only connection to one DB, or None if the file is missing."""
+        path = self.paths[name]
+        identity = file_identity(path)
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            # threading.local drops the holder when the thread exits; the finalizer then
+            # closes whatever handles that thread still had open.
+            holder = self._local.holder = _ThreadHandles()
+            weakref.finalize(holder, _release_thread_handles, weakref.ref(self), holder.handles)
+        handles = holder.handles
+        current = handles.get(name)
+        if current and current[1] == identity:
+            return current[0]
+        if current:
+            self._close(current[0])
+            handles.pop(name, None)
+            self.reopened += 1
+        if identity is None:
+            return None
+        con = open_readonly(path, self.cache_kib, self.mmap_bytes)
+        handles[name] = (con, identity)
+        with self._lock:
+            self._open.append(con)
+            self.opened += 1
+        return con
+
+    def require(self, name: str) -> sqlite3.Connection:
+        con = self.connection(name)
+        if con is None:
+            raise FileNotFoundError(f"{name} DB not found: {self.paths[name]}")
+        return con
+
+    def index(self) -> sqlite3.Connection:
+        return self.require("index")
+
+    def units(self) -> Optional[sqlite3.Connection]:
+        return self.connection("units")
+
+    def packs(self) -> Optional[sqlite3.Connection]:
+        return self.connection("packs")
+
+    def evidence(self) -> Optional[sqlite3.Connection]:
+        return self.connection("evidence")
+
+    def _close(self, con: sqlite3.Connection) -> None:
+        with self._lock:
+            if con in self._open:
+                self._open.remove(con)
+        con.close()
+
+    def _release(self, handles: Dict[str, Tuple[sqlite3.Connection, Tuple[int, int]]]) -> None:
+        cons = [con for con, _ in handles.values()]
+        handles.clear()
+        with self._lock:
+            for con in cons:
+                if con in self._open:
+                    self._open.remove(con)
+            self.released += len(cons)
+        for con in cons:
+            con.close()
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._lock:
+            cons, self._open = self._open, []
+        for con in cons:
+            con.close()
+        self._local = threading.local()
+
+    # ---------- fan-out ----------
+
+    def map_unordered(self, fn: Callable[[Any], Any], items: Sequence[Any]) -> Iterator[Tuple[int, Any]]:
+        """(index, fn(item)) for every item, yielded as each finishes on the worker pool."""
+        if len(items) <= 1 or self.workers <= 1:
+            for index, item in enumerate(items):
+                yield index, fn(item)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="retrieval")
+            executor = self._executor
+        futures = {executor.submit(fn, item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def search_packs_many(self, queries: Sequence[str], limit: int) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """Pack candidates for several queries at once; like triage without the per-query recommendation."""
+        return self.map_unordered(lambda query: self.search_packs(query, limit), list(queries))
+
+    # ---------- search / lookup ----------
+
+    def search(self, query: str, limit: int, **filters: Any) -> List[Dict[str, Any]]:
+        return search(self.index(), query, limit, **filters)
+
+    def facet_counts(self, query: str, **filters: Any) -> Optional[Dict[str, Any]]:
+        return facet_counts(self.index(), query, **filters)
+
+    def lookup(self, patent_id: str) -> Optional[Dict[str, Any]]:
+        return lookup(self.index(), patent_id)
+
+    def lookup_many(self, patent_ids: Sequence[str]) -> List[Dict[str, Any]]:
+        return lookup_many(self.index(), patent_ids)
+
+    def patent_cards(self, text: str, limit: int) -> List[Dict[str, Any]]:
+        """Cards for an explicit patent_id or publication-number fragments in text."""
+        con = self.index()
+        patent_id = extract_patent_id(text)
+        if patent_id:
+            card = lookup(con, patent_id)
+            if card:
+                return [card]
+        return lookup_many(con, resolve_patent_ids(con, text, limit))
+
+    @timed("retrieve")
+    def retrieve(self, question: str, limit: int) -> Tuple[str, List[Dict[str, Any]]]:
+        """(retrieval_query, cards): patent numbers first, then FTS, then an inferred query."""
+        retrieval_query = question
+        cards = self.patent_cards(question, limit)
+        if cards:
+            retrieval_query = cards[0]["patent_id"] if len(cards) == 1 else "patent_id_fuzzy_match"
+        else:
+            cards = self.search(question, limit)
+        cards = [card for card in cards if card]
+        if not cards:
+            fallback_query = infer_search_query(question)
+            if fallback_query and fallback_query != question:
+                retrieval_query = fallback_query
+                cards = [card for card in self.search(fallback_query, limit) if card]
+        return retrieval_query, cards
+
+    # ---------- packs / rank ----------
+
+    def triage(self, question: str, limit: int = 8) -> Dict[str, Any]:
+        return triage_question(question, limit=limit, db_path=self.paths["packs"], con=self.require("packs"))
+
+    def search_packs(self, question: str, limit: int) -> List[Dict[str, Any]]:
+        return search_packs(self.require("packs"), question, limit=limit)
+
+    def prompt_cards(self, cards: List[Dict[str, Any]], question: str = "") -> List[Dict[str, Any]]:
+        con = self.packs()
+        if con is None:
+            return build_prompt_cards(cards, question=question)
+        return build_prompt_cards(cards, pack_con=con, question=question)
+
+    def rank(self, question: str, plan: Dict[str, Any], limit: int = 8, units_per_patent: int = 4) -> List[Dict[str, Any]]:
+        return rank_evidence(
+            question,
+            plan,
+            index_db=self.paths["index"],
+            units_db=self.paths["units"],
+            limit=limit,
+            units_per_patent=units_per_patent,
+            index_con=self.index(),
+            units_con=self.require("units"),
+        )
+
+    def evidence_pack(self, question: str, planner_client: Optional[LLMClient] = None, limit: int = 8) -> Dict[str, Any]:
+        return build_evidence_pack(
+            question,
+            planner_client=planner_client,
+            index_db=self.paths["index"],
+            evidence_db=self.paths["evidence"],
+            units_db=self.paths["units"],
+            limit=limit,
+            index_con=self.index(),
+            units_con=self.units(),
+            evidence_con=self.evidence(),
+        )
+
+    def versions(self) -> Tuple[Tuple[str, str], ...]:
+        """(name, index_version) of each open index DB, for keys of results built on all of them."""
+        out = []
+        for name in ("index", "units", "packs"):
+            con = self.connection(name)
+            if con is not None:
+                out.append((name, index_version(con)))
+        return tuple(out)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            open_count = len(self._open)
+        return {
+            "paths": {name: str(path) for name, path in self.paths.items()},
+            "available": {name: path.exists() for name, path in self.paths.items()},
+            "open_connections": open_count,
+            "opened": self.opened,
+            "reopened": self.reopened,
+            "released": self.released,
+            "uptime_sec": round(time.time() - self.started_at, 1),
+            "fanout_workers": self.workers,
+            "card_cache": CARD_CACHE.stats(),
+            "query_cache": QUERY_CACHE.stats(),
+        }
+
+
+_DEFAULT_SERVICE: Optional[RetrievalService] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_service() -> RetrievalService:
+    """Process-wide service on the default DB paths."""
+    global _DEFAULT_SERVICE
+    with _DEFAULT_LOCK:
+        if _DEFAULT_SERVICE is None:
+            _DEFAULT_SERVICE = RetrievalService()
+        return _DEFAULT_SERVICE
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run queries through one long-lived retrieval service and report reuse stats.")
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("--index-db", default=str(DEFAULT_DB))
+    parser.add_argument("--units-db", default=str(DEFAULT_UNITS_DB))
+    parser.add_argument("--pack-db", default=str(DEFAULT_PACK_DB))
+    parser.add_argument("--evidence-db", default=str(DEFAULT_EVIDENCE_DB))
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    service = RetrievalService(Path(args.index_db), Path(args.units_db), Path(args.pack_db), Path(args.evidence_db))
+    timings: List[Dict[str, Any]] = []
+    for round_no in range(max(1, args.repeat)):
+        for query in args.queries:
+            started = time.perf_counter()
+            retrieval_query, cards = service.retrieve(query, args.limit)
+            timings.append(
+                {
+                    "round": round_no + 1,
+                    "query": query,
+                    "retrieval_query": retrieval_query,
+                    "results": len(cards),
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 3),
+                }
+            )
+    print(json.dumps({"queries": timings, "service": service.stats()}, ensure_ascii=False, indent=2))
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
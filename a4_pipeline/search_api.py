@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+CODE_DIR = Path(__file__).resolve().parent
+if str(CODE_DIR) not in sys.path:
+    sys.path.insert(0, str(CODE_DIR))
+
+from build_evidence_units import DEFAULT_UNITS_DB  # noqa: E402
+from evidence_pack import DEFAULT_EVIDENCE_DB, make_query_plan  # noqa: E402
+from llm_clients import LLMClient  # noqa: E402
+from metrics import CONTENT_TYPE, REGISTRY, stage_summary  # noqa: E402
+from patent_dictionary_ask import build_prompt  # noqa: E402
+from patent_dictionary_search import DEFAULT_DB  # noqa: E402
+from patent_local_triage import DEFAULT_PACK_DB, gemini_recommendation  # noqa: E402
+from retrieval_service import RetrievalService, get_service  # noqa: E402
+
+
+# HTTP front for the SQLite corpus (minimal index, evidence units, evidence packs), so
+# clients such as app_patent_assistant.py can use the same search, lookup, triage,
+# rank_evidence and evidence_pack paths as the bot. Every endpoint runs on a small worker
+# pool whose threads keep their own read-only RetrievalService handles, and reuses the
+# index_version-keyed query cache.
+#
+# List results are paged with offset/limit and can be projected with fields=a,b,c.card.title
+# (dotted names select inside nested objects), so a client pulls only what it renders.
+# /search and /triage run the underlying search for a window rounded up to WINDOW_STEP, so
+# the next pages of a query are served from the same cached result. Ranking and evidence
+# packs are not cached that way and cost grows with the window, so they fetch only one
+# result past the requested page. Responses are encoded with orjson when it is installed.
+#
+# POST /ask/stream answers like the bot's /ask but as server-sent events: `meta` (the
+# retrieval query and patents) right after retrieval, then one `data: {"delta": ...}`
+# per piece of model output, then `done` with timings (or `error`).
+#
+# GET /metrics exports stage latency histograms, LLM timings and cache counters in the
+# Prometheus text format; /stats includes the same stage p50/p95/p99 as JSON.
+
+API_WORKERS = int(os.environ.get("A4_API_WORKERS", "8"))
+MAX_PAGE = 100
+MAX_WINDOW = 500  # offset + limit
+MAX_PACK_WINDOW = 50  # evidence packs read claim text per patent
+WINDOW_STEP = 50
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson-encoded JSON; falls back to the standard encoder without orjson."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+app = FastAPI(title="A4 patent search API", default_response_class=FastJSONResponse)
+executor = ThreadPoolExecutor(max_workers=max(1, API_WORKERS), thread_name_prefix="search-api")
+_service: Optional[RetrievalService] = None
+
+
+def service() -> RetrievalService:
+    return _service or get_service()
+
+
+async def run(fn: Callable[..., Any], *args: Any) -> Any:
+    """fn(*args) on the worker pool; missing DBs become 503 and bad input 400."""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+# ---------- paging / projection ----------
+
+
+def parse_fields(fields: str) -> List[List[str]]:
+    return [name.strip().split(".") for name in str(fields or "").split(",") if name.strip()]
+
+
+def _pick(value: Any, path: Sequence[str], out: Dict[str, Any]) -> None:
+    if not isinstance(value, dict) or path[0] not in value:
+        return
+    key, rest = path[0], path[1:]
+    if not rest:
+        out[key] = value[key]
+        return
+    child = value[key]
+    if isinstance(child, list):
+        items = out.setdefault(key, [{} for _ in child])
+        for item, target in zip(child, items):
+            _pick(item, rest, target)
+    elif isinstance(child, dict):
+        _pick(child, rest, out.setdefault(key, {}))
+
+
+def project(item: Dict[str, Any], fields: List[List[str]]) -> Dict[str, Any]:
+    """New dict with only the requested (possibly dotted) fields; cached items are never modified."""
+    if not fields:
+        return item
+    out: Dict[str, Any] = {}
+    for path in fields:
+        _pick(item, path, out)
+    return out
+
+
+def window(offset: int, limit: int, cap: int = MAX_WINDOW, step: int = WINDOW_STEP) -> int:
+    """How many results to ask for: one past the page (for next_offset), rounded up to step."""
+    if offset + limit > cap:
+        raise HTTPException(status_code=400, detail=f"offset + limit must be <= {cap}")
+    return min(cap + 1, -(-(offset + limit + 1) // step) * step)
+
+
+def page(items: List[Dict[str, Any]], offset: int, limit: int, fields: str) -> Dict[str, Any]:
+    names = parse_fields(fields)
+    more = len(items) > offset + limit
+    return {
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if more else None,
+        "items": [project(item, names) for item in items[offset : offset + limit]],
+    }
+
+
+# ---------- endpoints ----------
+
+
+class RankRequest(BaseModel):
+    question: str
+    plan: Optional[Dict[str, Any]] = None  # default: the offline query planner
+    units_per_patent: int = Field(4, ge=1, le=16)
+    offset: int = Field(0, ge=0)
+    limit: int = Field(8, ge=1, le=MAX_PAGE)
+    fields: str = ""
+
+
+class AskRequest(BaseModel):
+    question: str
+    limit: int = Field(6, ge=1, le=30)
+    provider: str = "ollama"  # ollama | openai | gemini | auto
+    model: str = ""
+    max_tokens: int = Field(1600, ge=64, le=8000)
+
+
+class EvidencePackRequest(BaseModel):
+    question: str
+    offset: int = Field(0, ge=0)
+    limit: int = Field(8, ge=1, le=MAX_PAGE)
+    fields: str = ""
+    include_cards: bool = False
+
+
+@app.get("/search")
+async def search_endpoint(
+    q: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE),
+    fields: str = "",
+    language: str = "",
+    claim_type: str = "",
+    label: str = "",
+    include_qc: bool = False,
+):
+    filters = {"language": language, "claim_type": claim_type, "label": label, "include_qc": include_qc}
+    size = window(offset, limit)
+    cards = await run(lambda: service().search(q, size, **filters))
+    return {"query": q, **page(cards, offset, limit, fields)}
+
+
+@app.get("/lookup")
+async def lookup_endpoint(ids: str = "", q: str = "", fields: str = "", limit: int = Query(20, ge=1, le=MAX_PAGE)):
+    """Exact patent_ids (ids=a,b,c, in that order) or publication-number text (q=0012062403)."""
+    patent_ids = [item.strip() for item in ids.split(",") if item.strip()][:MAX_PAGE]
+    if not patent_ids and not q.strip():
+        raise HTTPException(status_code=400, detail="ids or q is required")
+    if patent_ids:
+        cards = await run(service().lookup_many, patent_ids)
+        missing = sorted(set(patent_ids) - {card["patent_id"] for card in cards})
+    else:
+        cards = await run(service().patent_cards, q, limit)
+        missing = []
+    names = parse_fields(fields)
+    return {"items": [project(card, names) for card in cards], "missing": missing}
+
+
+@app.get("/triage")
+async def triage_endpoint(
+    q: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(8, ge=1, le=MAX_PAGE),
+    fields: str = "",
+):
+    size = window(offset, limit)
+    packs = await run(service().search_packs, q, size)
+    # Same recommendation /triage gives for the packs up to the end of this page.
+    gemini = gemini_recommendation(q, packs[: offset + limit])
+    return {"question": q, "gemini": gemini, **page(packs, offset, limit, fields)}
+
+
+@app.post("/rank_evidence")
+async def rank_endpoint(request: RankRequest):
+    size = window(request.offset, request.limit, step=1)
+    plan = request.plan or make_query_plan(request.question, None, limit=size)
+    ranked = await run(lambda: service().rank(request.question, plan, limit=size, units_per_patent=request.units_per_patent))
+    return {"question": request.question, "query_plan": plan, **page(ranked, request.offset, request.limit, request.fields)}
+
+
+@app.post("/evidence_pack")
+async def evidence_pack_endpoint(request: EvidencePackRequest):
+    """Evidence pack with the offline query planner; `items` pages the pack's evidence list."""
+    size = window(request.offset, request.limit, MAX_PACK_WINDOW, step=1)
+    pack = await run(lambda: service().evidence_pack(request.question, limit=size))
+    out = {
+        "question": request.question,
+        "query_plan": pack.get("query_plan"),
+        "limits": pack.get("limits"),
+        **page(pack.get("evidence") or [], request.offset, request.limit, request.fields),
+    }
+    if request.include_cards:
+        out["retrieved_cards"] = pack.get("retrieved_cards") or []
+    return out
+
+
+@lru_cache(maxsize=8)
+def llm_client(provider: str, model: str) -> LLMClient:
+    return LLMClient(provider=provider, model=model or None)
+
+
+def sse(data: Dict[str, Any], event: str = "") -> bytes:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def sse_answer(client: LLMClient, prompt: str, max_tokens: int, meta: Dict[str, Any], started: float) -> Iterator[bytes]:
+    yield sse(meta, "meta")
+    if not prompt:
+        yield sse({"delta": "관련 특허를 찾지 못했어. 핵심 키워드를 조금 더 짧게 넣어줘."})
+        yield sse({"elapsed_sec": round(time.monotonic() - started, 2), "first_token_sec": None, "chars": 0}, "done")
+        return
+    first_token_sec = None
+    chars = 0
+    try:
+        for piece in client.stream(prompt, max_tokens=max_tokens):
+            if first_token_sec is None:
+                first_token_sec = round(time.monotonic() - started, 2)
+            chars += len(piece)
+            yield sse({"delta": piece})
+    except Exception as exc:
+        yield sse({"error": str(exc)}, "error")
+        return
+    yield sse({"elapsed_sec": round(time.monotonic() - started, 2), "first_token_sec": first_token_sec, "chars": chars}, "done")
+
+
+@app.post("/ask/stream")
+async def ask_stream_endpoint(request: AskRequest):
+    started = time.monotonic()
+    retrieval_query, cards = await run(service().retrieve, request.question, request.limit)
+    prompt = await run(lambda: build_prompt(request.question, cards, pack_con=service().packs())) if cards else ""
+    client = llm_client(request.provider, request.model)
+    meta = {
+        "retrieval_query": retrieval_query,
+        "patents": [{"patent_id": card["patent_id"], "title": card["title"]} for card in cards],
+        "provider": client.provider,
+        "model": client.model,
+        "retrieval_sec": round(time.monotonic() - started, 2),
+    }
+    return StreamingResponse(
+        sse_answer(client, prompt, request.max_tokens, meta, started),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/stats")
+async def stats_endpoint():
+    return {
+        "service": service().stats(),
+        "versions": dict(await run(service().versions)),
+        "stages": stage_summary(),
+        "orjson": orjson is not None,
+    }
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the A4 SQLite indexes over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--index-db", default=str(DEFAULT_DB))
+    parser.add_argument("--units-db", default=str(DEFAULT_UNITS_DB))
+    parser.add_argument("--pack-db", default=str(DEFAULT_PACK_DB))
+    parser.add_argument("--evidence-db", default=str(DEFAULT_EVIDENCE_DB))
+    args = parser.parse_args()
+
+    import uvicorn
+
+    global _service
+    _service = RetrievalService(
+        Path(args.index_db),
+        Path(args.units_db),
+        Path(args.pack_db),
+        Path(args.evidence_db),
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
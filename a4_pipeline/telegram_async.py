@@ -0,0 +1,501 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import ssl
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+# asyncio Bot API transport for the Telegram bot. One event loop thread owns every HTTP
+# connection: a small keep-alive pool for sends plus one connection for getUpdates.
+# The chunks of a long reply are pipelined on one connection (all requests written, then
+# all responses read), so a 5-chunk answer costs about one round trip instead of five.
+# Rate limits: sends and edits share a global token bucket at Telegram's documented 30
+# messages/s. A chat is not paced up front, so one reply's chunks go out as a burst (the old
+# transport sent them back to back too). Only after Telegram answers 429 for a chat does
+# that chat wait `retry_after` and then pace at CHAT_RATE, for CHAT_THROTTLE_SEC after its
+# last 429. When a pipelined chunk is refused, the chunks after it that went through are
+# deleted and everything from the refused chunk is resent one at a time, so the chat reads
+# in order. A request is sent once; only one that could not be written is retried.
+# Lane threads use the blocking wrappers (send_message, request, typing); nothing here
+# needs a third-party HTTP client.
+# StreamingReply shows an answer while the LLM is still writing it by editing one message
+# (then the next, past the size limit), at most once per EDIT_INTERVAL_SEC per reply. Its
+# sends and edits take the same per-chat lock and buckets as send_message.
+
+DEFAULT_API_BASE = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org")
+TELEGRAM_MAX_MESSAGE = 3900
+POOL_SIZE = int(os.environ.get("A4_TG_POOL_SIZE", "4"))
+GLOBAL_RATE = float(os.environ.get("A4_TG_GLOBAL_RATE", "30"))  # messages per second, all chats
+CHAT_RATE = float(os.environ.get("A4_TG_CHAT_RATE", "1"))  # per chat, only after a 429
+CHAT_BURST = int(os.environ.get("A4_TG_CHAT_BURST", "5"))
+CHAT_THROTTLE_SEC = float(os.environ.get("A4_TG_CHAT_THROTTLE_SEC", "60"))
+MESSAGE_METHODS = {"sendMessage", "editMessageText"}  # count against the message limits
+TYPING_INTERVAL_SEC = 4.5  # Telegram shows "typing" for about five seconds
+MAX_RETRIES = 3
+EDIT_INTERVAL_SEC = float(os.environ.get("A4_TG_EDIT_INTERVAL_SEC", "1.5"))
+STREAM_CURSOR = " ▌"
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_MESSAGE) -> Iterable[str]:
+    text = text.strip() or "(empty)"
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut < limit // 2:
+            cut = text.rfind(" ", 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        yield text[:cut].strip()
+        text = text[cut:].strip()
+    if text:
+        yield text
+
+
+class TelegramAPIError(RuntimeError):
+    def __init__(self, method: str, data: Dict[str, Any]) -> None:
+        super().__init__(f"Telegram API failed: {method} {data}")
+        self.data = data
+        self.retry_after = float((data.get("parameters") or {}).get("retry_after") or 0)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, tokens: Optional[float] = None) -> None:
+        self.rate = max(rate, 1e-6)
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst if tokens is None else tokens
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> int:
+        now = time.monotonic()
+        self._refill(now)
+        return 0 if now < self.blocked_until else int(self.tokens)
+
+    def reserve(self, count: int = 1) -> float:
+        """Take count tokens and return how long to wait before using them."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= count
+        wait = max(0.0, -self.tokens / self.rate)
+        return max(wait, self.blocked_until - now)
+
+    def pause(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+# ---------- HTTP/1.1 keep-alive pool ----------
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    def close(self) -> None:
+        with contextlib.suppress(Exception):
+            self.writer.close()
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str], bytes, bool]:
+    """(status, headers, body, reusable) of one HTTP/1.1 response."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed before response")
+    status = int(status_line.split()[1])
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    reusable = headers.get("connection", "").lower() != "close"
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        parts: List[bytes] = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            parts.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(parts)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        reusable = False
+    return status, headers, body, reusable
+
+
+class HTTPPool:
+    def __init__(self, base_url: str, size: int = POOL_SIZE) -> None:
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.tls = parts.scheme == "https"
+        self.port = parts.port or (443 if self.tls else 80)
+        self.host_header = parts.netloc
+        self.size = max(1, size)
+        self._idle: List[_Connection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.opened = 0
+
+    async def _open(self) -> _Connection:
+        context = ssl.create_default_context() if self.tls else None
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=context, server_hostname=self.host if self.tls else None
+        )
+        self.opened += 1
+        return _Connection(reader, writer)
+
+    def _encode(self, path: str, payload: Dict[str, Any]) -> bytes:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {self.host_header}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        )
+        return head.encode("latin-1") + body
+
+    def _checkout_idle(self) -> Optional[_Connection]:
+        """An idle connection the server has not closed, if any."""
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.reader.at_eof() and not conn.writer.is_closing():
+                return conn
+            conn.close()
+        return None
+
+    async def post_many(self, requests: List[Tuple[str, Dict[str, Any]]], timeout: float) -> List[Tuple[int, Dict[str, Any]]]:
+        """POST every request over one connection, pipelined; responses come back in order.
+
+        Requests are not idempotent (sendMessage), so once they are written nothing is
+        resent: a timeout or a dropped connection after the write raises. Only a reused
+        connection that fails while the requests are being written is retried, once, on a
+        new connection.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        data = b"".join(self._encode(path, payload) for path, payload in requests)
+        async with self._slots:
+            for attempt in range(2):
+                conn = self._checkout_idle() if attempt == 0 else None
+                reused = conn is not None
+                if conn is None:
+                    conn = await self._open()
+                try:
+                    conn.writer.write(data)
+                    await conn.writer.drain()
+                except (ConnectionError, OSError) as exc:
+                    conn.close()
+                    if reused:
+                        continue
+                    raise ConnectionError(f"Bot API connection failed: {exc!r}") from exc
+                except BaseException:
+                    conn.close()
+                    raise
+                try:
+                    results = []
+                    reusable = True
+                    for _ in requests:
+                        status, _, body, reusable = await asyncio.wait_for(read_response(conn.reader), timeout)
+                        results.append((status, json.loads(body.decode("utf-8") or "{}")))
+                except asyncio.TimeoutError as exc:
+                    conn.close()
+                    raise ConnectionError(f"Bot API response timed out after {timeout:g}s") from exc
+                except (ConnectionError, asyncio.IncompleteReadError, OSError) as exc:
+                    conn.close()
+                    raise ConnectionError(f"Bot API connection failed: {exc!r}") from exc
+                except BaseException:
+                    conn.close()
+                    raise
+                if reusable:
+                    self._idle.append(conn)
+                else:
+                    conn.close()
+                return results
+        raise ConnectionError("Bot API connection failed")
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop().close()
+
+
+# ---------- client ----------
+
+class AsyncTelegramClient:
+    """Bot API client whose I/O runs on a private event loop thread.
+
+    The blocking methods have the same names as TelegramClient so the bot can use either.
+    """
+
+    def __init__(self, token: str, timeout: int = 60, api_base: str = DEFAULT_API_BASE, pool_size: int = POOL_SIZE) -> None:
+        self.prefix = f"{urlsplit(api_base).path.rstrip('/')}/bot{token}"
+        self.timeout = timeout
+        self.pool = HTTPPool(api_base, pool_size)
+        self.poll_pool = HTTPPool(api_base, 1)
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.chat_locks: Dict[int, asyncio.Lock] = {}
+        self.counters = {
+            "requests": 0, "messages": 0, "chunks": 0, "pipelined_batches": 0, "retries": 0,
+            "resent_chunks": 0, "throttled_chats": 0, "rate_wait_sec": 0.0,
+        }
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="telegram-io", daemon=True)
+        self.thread.start()
+
+    # ----- coroutines (event loop thread) -----
+
+    def _chat_bucket(self, chat_id: int) -> Optional[TokenBucket]:
+        """The chat's bucket while it is throttled after a 429, else None (not paced)."""
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is not None and time.monotonic() >= bucket.blocked_until + CHAT_THROTTLE_SEC:
+            del self.chat_buckets[chat_id]
+            return None
+        return bucket
+
+    async def _wait_for_budget(self, chat_id: Optional[int], count: int) -> None:
+        wait = self.global_bucket.reserve(count)
+        bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+        if bucket is not None:
+            wait = max(wait, bucket.reserve(count))
+        if wait > 0:
+            self.counters["rate_wait_sec"] += wait
+            await asyncio.sleep(wait)
+
+    def _backoff(self, chat_id: Optional[int], data: Dict[str, Any]) -> float:
+        retry_after = float((data.get("parameters") or {}).get("retry_after") or 1)
+        if chat_id is None:
+            self.global_bucket.pause(retry_after)
+        else:
+            bucket = self._chat_bucket(chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST, tokens=0.0)
+                self.counters["throttled_chats"] += 1
+            bucket.pause(retry_after)
+        self.counters["retries"] += 1
+        return retry_after
+
+    def _chat_lock(self, chat_id: int) -> asyncio.Lock:
+        return self.chat_locks.setdefault(chat_id, asyncio.Lock())
+
+    async def call(self, method: str, payload: Dict[str, Any], poll: bool = False) -> Dict[str, Any]:
+        chat_id = payload.get("chat_id")
+        if method in MESSAGE_METHODS and chat_id is not None:
+            # Same per-chat lock and buckets as send_message_async (StreamingReply edits).
+            async with self._chat_lock(chat_id):
+                return await self._call(method, payload, poll, limited=True)
+        return await self._call(method, payload, poll, limited=False)
+
+    async def _call(self, method: str, payload: Dict[str, Any], poll: bool, limited: bool) -> Dict[str, Any]:
+        pool = self.poll_pool if poll else self.pool
+        timeout = self.timeout + float(payload.get("timeout") or 0)
+        chat_id = payload.get("chat_id")
+        for attempt in range(MAX_RETRIES + 1):
+            if limited:
+                await self._wait_for_budget(chat_id, 1)
+            self.counters["requests"] += 1
+            [(status, data)] = await pool.post_many([(f"{self.prefix}/{method}", payload)], timeout)
+            if data.get("ok"):
+                return data
+            if status == 429 and attempt < MAX_RETRIES:
+                await asyncio.sleep(self._backoff(chat_id, data))
+                continue
+            raise TelegramAPIError(method, data)
+        raise TelegramAPIError(method, {"ok": False, "description": "retries exhausted"})
+
+    async def send_message_async(self, chat_id: int, text: str) -> None:
+        payloads = [{"chat_id": chat_id, "text": chunk, "disable_web_page_preview": True} for chunk in split_message(text)]
+        self.counters["messages"] += 1
+        # One sender per chat keeps chunk order; different chats send concurrently.
+        async with self._chat_lock(chat_id):
+            attempts = 0
+            pipeline = True
+            while payloads:
+                bucket = self._chat_bucket(chat_id)
+                if not pipeline:
+                    batch = 1
+                elif bucket is None:
+                    batch = len(payloads)
+                else:
+                    batch = max(1, min(len(payloads), bucket.available()))
+                await self._wait_for_budget(chat_id, batch)
+                path = f"{self.prefix}/sendMessage"
+                self.counters["requests"] += batch
+                self.counters["pipelined_batches"] += batch > 1
+                results = await self.pool.post_many([(path, payload) for payload in payloads[:batch]], self.timeout)
+                refused = next((index for index, (_, data) in enumerate(results) if not data.get("ok")), None)
+                if refused is None:
+                    self.counters["chunks"] += batch
+                    payloads = payloads[batch:]
+                    continue
+                self.counters["chunks"] += refused
+                # Chunks after the refused one that went through would read out of order:
+                # delete them and resend everything from the refused chunk.
+                for _, data in results[refused + 1 :]:
+                    if data.get("ok"):
+                        self.counters["resent_chunks"] += 1
+                        with contextlib.suppress(Exception):
+                            await self._call("deleteMessage", {"chat_id": chat_id, "message_id": data["result"]["message_id"]}, False, limited=False)
+                status, data = results[refused]
+                if status != 429 or attempts >= MAX_RETRIES:
+                    raise TelegramAPIError("sendMessage", data)
+                attempts += 1
+                pipeline = False
+                await asyncio.sleep(self._backoff(chat_id, data))
+                payloads = payloads[refused:]
+
+    async def _typing_loop(self, chat_id: int, stop: asyncio.Event) -> None:
+        # Stopped between calls rather than cancelled, so a pooled connection is never
+        # dropped in the middle of a request.
+        while not stop.is_set():
+            with contextlib.suppress(Exception):
+                await self.call("sendChatAction", {"chat_id": chat_id, "action": "typing"})
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), TYPING_INTERVAL_SEC)
+
+    async def _poll(self, handler: Callable[[Dict[str, Any]], None], timeout: int, on_error: Callable[[Exception], None] | None) -> None:
+        offset: Optional[int] = None
+        while True:
+            try:
+                updates = await self.get_updates_async(offset, timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if on_error is not None:
+                    on_error(exc)
+                await asyncio.sleep(5)
+                continue
+            for update in updates:
+                offset = update["update_id"] + 1
+                # Handlers may call the blocking wrappers, so they must not run on this loop.
+                await self.loop.run_in_executor(None, handler, update)
+
+    async def get_updates_async(self, offset: Optional[int], timeout: int) -> List[Dict[str, Any]]:
+        payload: Dict[str, Any] = {"timeout": timeout, "allowed_updates": ["message"]}
+        if offset is not None:
+            payload["offset"] = offset
+        return (await self.call("getUpdates", payload, poll=True)).get("result", [])
+
+    # ----- blocking wrappers (any other thread) -----
+
+    def _run(self, coroutine: Any, timeout: Optional[float] = None) -> Any:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def request(self, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._run(self.call(method, payload))
+
+    def get_updates(self, offset: Optional[int], timeout: int) -> List[Dict[str, Any]]:
+        return self._run(self.get_updates_async(offset, timeout))
+
+    def send_message(self, chat_id: int, text: str) -> None:
+        self._run(self.send_message_async(chat_id, text))
+
+    def set_commands(self, commands: List[Dict[str, str]]) -> None:
+        self.request("setMyCommands", {"commands": commands})
+
+    @contextlib.contextmanager
+    def typing(self, chat_id: int) -> Iterator[None]:
+        """Keep the chat's typing indicator on while the block runs."""
+        stop = asyncio.Event()
+        asyncio.run_coroutine_threadsafe(self._typing_loop(chat_id, stop), self.loop)
+        try:
+            yield
+        finally:
+            self.loop.call_soon_threadsafe(stop.set)
+
+    def run_polling(self, handler: Callable[[Dict[str, Any]], None], timeout: int, on_error: Callable[[Exception], None] | None = None) -> None:
+        """Long-poll on the event loop and hand each update to handler on a worker thread."""
+        self._run(self._poll(handler, timeout, on_error))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "rate_wait_sec": round(self.counters["rate_wait_sec"], 2),
+            "connections_opened": self.pool.opened + self.poll_pool.opened,
+        }
+
+    def close(self) -> None:
+        async def shutdown() -> None:
+            self.pool.close()
+            self.poll_pool.close()
+
+        self._run(shutdown(), timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+# ---------- progressive replies ----------
+
+class StreamingReply:
+    """A reply that grows in place: sendMessage once, then editMessageText as text arrives.
+
+    Works with either transport through its blocking `request`; with AsyncTelegramClient
+    the sends and edits wait on the chat's lock and rate buckets like send_message. Text
+    past the message size limit continues in a new message; chunks that are already
+    complete are not touched again. Intermediate edits are best effort; finish() must succeed.
+    """
+
+    def __init__(self, client: Any, chat_id: int, interval_sec: float = EDIT_INTERVAL_SEC) -> None:
+        self.client = client
+        self.chat_id = chat_id
+        self.interval_sec = interval_sec
+        self.message_ids: List[int] = []
+        self.shown: List[str] = []
+        self.text = ""
+        self.flushed_at = 0.0
+        self.edits = 0
+        self.started_at = time.monotonic()
+        self.first_shown_sec: Optional[float] = None
+
+    @property
+    def started(self) -> bool:
+        return bool(self.message_ids)
+
+    def update(self, text: str) -> None:
+        """Record the full text so far; shown when the edit interval has passed."""
+        self.text = text
+        if text.strip() and time.monotonic() - self.flushed_at >= self.interval_sec:
+            with contextlib.suppress(Exception):
+                self._flush(text, STREAM_CURSOR)
+
+    def finish(self, text: str) -> None:
+        """Show the final text (without the cursor) and drop messages it no longer needs."""
+        self.text = text
+        self._flush(text, "")
+
+    def _flush(self, text: str, cursor: str) -> None:
+        chunks = list(split_message(text))
+        chunks[-1] += cursor
+        for index, chunk in enumerate(chunks):
+            if index < len(self.message_ids):
+                if self.shown[index] != chunk:
+                    self.client.request(
+                        "editMessageText",
+                        {"chat_id": self.chat_id, "message_id": self.message_ids[index], "text": chunk, "disable_web_page_preview": True},
+                    )
+                    self.shown[index] = chunk
+                    self.edits += 1
+                continue
+            data = self.client.request("sendMessage", {"chat_id": self.chat_id, "text": chunk, "disable_web_page_preview": True})
+            self.message_ids.append(int(data["result"]["message_id"]))
+            self.shown.append(chunk)
+            if self.first_shown_sec is None:
+                self.first_shown_sec = time.monotonic() - self.started_at
+        for message_id in self.message_ids[len(chunks):]:
+            with contextlib.suppress(Exception):
+                self.client.request("deleteMessage", {"chat_id": self.chat_id, "message_id": message_id})
+        del self.message_ids[len(chunks):], self.shown[len(chunks):]
+        self.flushed_at = time.monotonic()
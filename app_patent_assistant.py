@@ -1,98 +1,197 @@
-    import streamlit as st
-    import os
-    import requests
-    import json
-
-    # LangChain 및 Gemini 관련 라이브러리
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    from langchain.prompts import PromptTemplate
-    from langchain.schema.runnable import RunnablePassthrough
-    from langchain.schema.output_parser import StrOutputParser
-
-    # --- 1. 애플리케이션 기본 설정 및 프롬프트 ---
-    st.set_page_config(page_title="3D DRAM 특허 분석 Q&A", layout="wide")
-
-    prompt_template = """
-    You are a helpful AI assistant specializing in patent analysis.
-    Based on the following retrieved patent documents, answer the user's question.
-    If the documents don't provide enough information, say that you cannot find a relevant answer in the provided documents.
-    Provide a clear and concise answer, and always cite the source patent documents you used by their filenames (e.g., `[us20230012345a1p.txt]`).
-
-    **Retrieved Documents:**
-    {context}
-
-    **User's Question:**
-    {question}
-
-    **Your Answer:**
-    """
-    PROMPT = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-
-    # --- 2. 사이드바 - 설정 ---
-    with st.sidebar:
-        st.header("✨ AI & DB 서버 설정")
-        gemini_api_key = st.text_input("Gemini API Key", type="password", help="[Google AI Studio](https://aistudio.google.com/app/apikey)에서 발급받으세요.")
-        db_server_url = st.text_input("DB 검색 서버 주소", help="기숙사 PC의 Tailscale IP 또는 localhost를 입력하세요. (예: http://localhost:8000)")
-        
-        st.markdown("---")
-        st.header("📚 분석 대상 선택")
-        # [수정] DB 선택 메뉴
-        db_options = {"3D DRAM 특허": "3d_dram"}
-        selected_db_name = st.selectbox("분석할 DB를 선택하세요.", options=db_options.keys())
-        selected_db_id = db_options[selected_db_name]
-        
-        if st.button("대화 기록 초기화"):
-            st.session_state.messages = []
-            st.rerun()
-
-    # --- 3. 메인 Q&A 로직 ---
-    st.title(f"⚡ {selected_db_name} 분석 Q&A (하이브리드)")
-
-    if not gemini_api_key or not db_server_url:
-        st.info("사이드바에 Gemini API Key와 DB 검색 서버 주소를 모두 입력해주세요.")
-    else:
-        if "messages" not in st.session_state or st.session_state.get("current_db") != selected_db_id:
-            st.session_state.messages = []
-            st.session_state.current_db = selected_db_id
-
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-
-        if prompt := st.chat_input(f"{selected_db_name}에 대해 질문해보세요..."):
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            with st.chat_message("user"):
-                st.markdown(prompt)
-
-            with st.chat_message("assistant"):
-                with st.spinner("로컬 DB 서버에 관련 문헌을 요청하는 중... (1단계)"):
-                    try:
-                        search_url = f"{db_server_url.rstrip('/')}/search"
-                        search_payload = {"db_id": selected_db_id, "query": prompt}
-                        response = requests.post(search_url, json=search_payload, timeout=30)
-                        response.raise_for_status()
-                        retrieved_data = response.json().get('documents', [])
-
-                        if not retrieved_data:
-                            st.warning("관련된 특허 문서를 찾지 못했습니다.")
-                        else:
-                            with st.spinner("Gemini가 검색된 문헌을 분석하여 답변 생성 중... (2단계)"):
-                                llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-latest", google_api_key=gemini_api_key, temperature=0.2)
-                                
-                                def format_docs(docs):
-                                    return "\n\n".join([f"--- Source: {os.path.basename(doc['metadata'].get('source', 'N/A'))} ---\n{doc['page_content']}" for doc in docs])
-                                
-                                rag_chain = (
-                                    {"context": lambda x: format_docs(retrieved_data), "question": RunnablePassthrough()}
-                                    | PROMPT
-                                    | llm
-                                    | StrOutputParser()
-                                )
-                                
-                                answer = rag_chain.invoke(prompt)
-                                st.markdown(answer)
-                                st.session_state.messages.append({"role": "assistant", "content": answer})
-
-                    except Exception as e:
-                        st.error(f"오류가 발생했습니다: {e}")
-    
\ No newline at end of file
+import streamlit as st
+import os
+import requests
+import json
+from requests.adapters import HTTPAdapter
+
+# LangChain 및 Gemini 관련 라이브러리
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.prompts import PromptTemplate
+from langchain.schema.output_parser import StrOutputParser
+
+# --- 1. 애플리케이션 기본 설정 및 프롬프트 ---
+st.set_page_config(page_title="3D DRAM 특허 분석 Q&A", layout="wide")
+
+prompt_template = """
+You are a helpful AI assistant specializing in patent analysis.
+Based on the following retrieved patent documents, answer the user's question.
+If the documents don't provide enough information, say that you cannot find a relevant answer in the provided documents.
+Provide a clear and concise answer, and always cite the source patent documents you used by their filenames (e.g., `[us20230012345a1p.txt]`).
+
+**Retrieved Documents:**
+{context}
+
+**User's Question:**
+{question}
+
+**Your Answer:**
+"""
+
+ENGINE_GEMINI = "Gemini + DB 검색 서버"
+ENGINE_A4 = "A4 검색 API (로컬 코퍼스)"
+GEMINI_MODEL = "gemini-1.5-flash-latest"
+DEFAULT_CONTEXT_TOKENS = 6000  # 프롬프트에 넣을 검색 문헌의 토큰 예산
+RETRIEVAL_CACHE_SIZE = 32  # 세션마다 기억하는 (db_id, 질문) 검색 결과 수
+
+
+# --- 1-1. 재사용 자원 ---
+# Streamlit은 매 입력마다 스크립트를 처음부터 다시 실행한다. LLM 클라이언트, 체인, HTTP 세션은
+# cache_resource로 프로세스에 한 번만 만들어 모든 턴과 rerun이 같이 쓴다.
+@st.cache_resource
+def get_http_session():
+    """DB 검색 서버/A4 API와의 keep-alive 연결을 재사용하는 세션."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def get_rag_chain(api_key, model=GEMINI_MODEL):
+    """API 키/모델별로 한 번만 만드는 Gemini 체인. 입력은 {"context", "question"}."""
+    prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
+    llm = ChatGoogleGenerativeAI(model=model, google_api_key=api_key, temperature=0.2)
+    return prompt | llm | StrOutputParser()
+
+
+def estimate_tokens(text):
+    """토크나이저 없이 쓰는 대략적인 토큰 수: 영문/숫자는 약 4자당 1토큰, 한글·한자는 1자당 1토큰."""
+    wide = sum(1 for ch in text if ord(ch) > 127)
+    return wide + (len(text) - wide) // 4
+
+
+def build_context(docs, token_budget):
+    """검색 순위대로 문헌을 넣다가 예산에 닿으면 마지막 문헌을 잘라서 멈춘다. (context, 사용한 문헌 수, 토큰 수)"""
+    parts, used, tokens = [], 0, 0
+    for doc in docs:
+        block = f"--- Source: {os.path.basename(doc['metadata'].get('source', 'N/A'))} ---\n{doc['page_content']}"
+        cost = estimate_tokens(block)
+        if tokens + cost > token_budget:
+            remaining = token_budget - tokens
+            if remaining > 200:
+                # 남은 예산만큼만 앞부분을 넣는다 (문자당 토큰 비율로 환산).
+                keep = int(len(block) * remaining / max(cost, 1))
+                parts.append(block[:keep] + " …")
+                used += 1
+                tokens = token_budget
+            break
+        parts.append(block)
+        used += 1
+        tokens += cost
+    return "\n\n".join(parts), used, tokens
+
+
+def retrieve_documents(server_url, db_id, query):
+    """(db_id, 질문) 단위로 세션에 기억해 둔 검색 결과를 쓰고, 없을 때만 DB 검색 서버에 요청한다."""
+    cache = st.session_state.setdefault("retrieval_cache", {})
+    key = (server_url.rstrip("/"), db_id, " ".join(query.split()).casefold())
+    if key in cache:
+        cache[key] = cache.pop(key)  # 최근에 쓴 항목을 뒤로
+        return cache[key], True
+    response = get_http_session().post(f"{key[0]}/search", json={"db_id": db_id, "query": query}, timeout=30)
+    response.raise_for_status()
+    documents = response.json().get('documents', [])
+    cache[key] = documents
+    while len(cache) > RETRIEVAL_CACHE_SIZE:
+        cache.pop(next(iter(cache)))
+    return documents, False
+
+
+def stream_a4_answer(api_url, question, provider, sources):
+    """A4 검색 API의 /ask/stream(SSE)을 읽어 답변 조각을 순서대로 내보낸다. 검색된 특허는 sources에 담는다."""
+    payload = {"question": question, "provider": provider}
+    session = get_http_session()
+    with session.post(f"{api_url.rstrip('/')}/ask/stream", json=payload, stream=True, timeout=(10, 300)) as response:
+        response.raise_for_status()
+        event = ""
+        for raw in response.iter_lines(chunk_size=None):
+            line = raw.decode("utf-8")
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[5:])
+                if event == "meta":
+                    sources.extend(data.get("patents", []))
+                elif event == "error":
+                    raise RuntimeError(data.get("error"))
+                elif event != "done" and data.get("delta"):
+                    yield data["delta"]
+            elif not line:
+                event = ""
+
+
+# --- 2. 사이드바 - 설정 ---
+with st.sidebar:
+    st.header("✨ AI & DB 서버 설정")
+    engine = st.radio("답변 방식", [ENGINE_GEMINI, ENGINE_A4])
+    if engine == ENGINE_GEMINI:
+        gemini_api_key = st.text_input("Gemini API Key", type="password", help="[Google AI Studio](https://aistudio.google.com/app/apikey)에서 발급받으세요.")
+        db_server_url = st.text_input("DB 검색 서버 주소", help="기숙사 PC의 Tailscale IP 또는 localhost를 입력하세요. (예: http://localhost:8000)")
+        context_tokens = st.slider("문헌 컨텍스트 토큰 예산", 1000, 30000, DEFAULT_CONTEXT_TOKENS, step=500, help="검색 순위가 높은 문헌부터 이 예산까지만 프롬프트에 넣습니다.")
+    else:
+        a4_api_url = st.text_input("A4 검색 API 주소", value="http://localhost:8010", help="a4_pipeline/search_api.py 서버 주소")
+        a4_provider = st.selectbox("LLM", ["ollama", "gemini", "openai"], help="A4 검색 API 서버에 설정된 키/모델로 답변합니다.")
+
+    st.markdown("---")
+    st.header("📚 분석 대상 선택")
+    # [수정] DB 선택 메뉴
+    db_options = {"3D DRAM 특허": "3d_dram"}
+    selected_db_name = st.selectbox("분석할 DB를 선택하세요.", options=db_options.keys())
+    selected_db_id = db_options[selected_db_name]
+
+    if st.button("대화 기록 초기화"):
+        st.session_state.messages = []
+        st.session_state.retrieval_cache = {}
+        st.rerun()
+
+# --- 3. 메인 Q&A 로직 ---
+st.title(f"⚡ {selected_db_name} 분석 Q&A (하이브리드)")
+
+if engine == ENGINE_GEMINI and (not gemini_api_key or not db_server_url):
+    st.info("사이드바에 Gemini API Key와 DB 검색 서버 주소를 모두 입력해주세요.")
+elif engine == ENGINE_A4 and not a4_api_url:
+    st.info("사이드바에 A4 검색 API 주소를 입력해주세요.")
+else:
+    if "messages" not in st.session_state or st.session_state.get("current_db") != selected_db_id:
+        st.session_state.messages = []
+        st.session_state.current_db = selected_db_id
+
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    if prompt := st.chat_input(f"{selected_db_name}에 대해 질문해보세요..."):
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        with st.chat_message("assistant"):
+            try:
+                if engine == ENGINE_A4:
+                    # 검색과 답변 생성을 서버가 한 번에 처리하고, 생성되는 대로 화면에 이어 붙인다.
+                    sources = []
+                    answer = st.write_stream(stream_a4_answer(a4_api_url, prompt, a4_provider, sources))
+                    if sources:
+                        st.caption("검색된 특허: " + ", ".join(item["patent_id"] for item in sources))
+                    st.session_state.messages.append({"role": "assistant", "content": answer})
+                else:
+                    with st.spinner("로컬 DB 서버에 관련 문헌을 요청하는 중... (1단계)"):
+                        retrieved_data, reused = retrieve_documents(db_server_url, selected_db_id, prompt)
+
+                    if not retrieved_data:
+                        st.warning("관련된 특허 문서를 찾지 못했습니다.")
+                    else:
+                        context, used, tokens = build_context(retrieved_data, context_tokens)
+                        st.caption(
+                            f"문헌 {len(retrieved_data)}건 중 {used}건 사용 (약 {tokens:,} 토큰)"
+                            + (" · 이 세션의 이전 검색 결과 재사용" if reused else "")
+                        )
+                        rag_chain = get_rag_chain(gemini_api_key)
+
+                        # (2단계) 스피너 대신 Gemini가 생성하는 대로 답변을 바로 보여준다.
+                        answer = st.write_stream(rag_chain.stream({"context": context, "question": prompt}))
+                        st.session_state.messages.append({"role": "assistant", "content": answer})
+
+            except Exception as e:
+                st.error(f"오류가 발생했습니다: {e}")
@@ -1,63 +1,379 @@
-    import uvicorn
-    from fastapi import FastAPI, HTTPException
-    from pydantic import BaseModel
-    import os
-
-    # LangChain 및 DB 관련 라이브러리
-    from langchain_community.vectorstores import FAISS
-    from langchain_huggingface import HuggingFaceEmbeddings
-
-    # --- 1. 초기 설정 및 모델/DB 로딩 ---
-    print("서버 초기화 중... 임베딩 모델을 로드합니다.")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="jhgan/ko-sroberta-multitask",
-        model_kwargs={'device': 'cuda'}
-    )
-    print("임베딩 모델 로드 완료.")
-
-    available_dbs = {}
-    # [수정] 우리가 만든 3D DRAM DB 폴더 이름을 정확히 기재
-    db_folders = {
-        "3d_dram": "faiss_index_3d_dram_gpu",
-        # "samsung": "faiss_index_samsung_gpu", # 필요시 다른 DB 추가
-        # "hynix": "faiss_index_hynix_gpu"
-    }
-
-    for db_id, folder_name in db_folders.items():
-        db_path = os.path.join('.', folder_name)
-        if os.path.exists(db_path):
-            print(f"'{db_id}' DB 로딩 중...")
-            available_dbs[db_id] = FAISS.load_local(
-                db_path, embeddings, allow_dangerous_deserialization=True
-            )
-            print(f"'{db_id}' DB 로드 완료.")
-
-    app = FastAPI()
-
-    class SearchRequest(BaseModel):
-        db_id: str
-        query: str
-        k: int = 10 
-
-    # --- 2. API 엔드포인트 ---
-    @app.post("/search")
-    def search_documents(request: SearchRequest):
-        print(f"\n'{request.db_id}' DB에 대한 검색 요청 수신: '{request.query}' (k={request.k})")
-        if request.db_id not in available_dbs:
-            raise HTTPException(status_code=404, detail=f"'{request.db_id}' DB가 서버에 로드되지 않았습니다.")
-        
-        vector_db = available_dbs[request.db_id]
-        
-        try:
-            retriever = vector_db.as_retriever(search_kwargs={'k': request.k})
-            retrieved_docs = retriever.invoke(request.query)
-            results = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in retrieved_docs]
-            print(f"-> '{len(results)}'개의 관련 문서를 찾았습니다.")
-            return {"documents": results}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"검색 중 서버 오류 발생: {e}")
-
-    if __name__ == "__main__":
-        print("DB 검색 API 서버를 시작하려면 Anaconda Prompt에서 아래 명령어를 입력하세요:")
-        print("uvicorn db_api_server:app --host 0.0.0.0 --port 8000")
-    
\ No newline at end of file
+import asyncio
+import os
+import pickle
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+# LangChain 및 DB 관련 라이브러리
+from langchain_community.vectorstores import FAISS
+from langchain_huggingface import HuggingFaceEmbeddings
+
+# 지표 레지스트리는 a4_pipeline/metrics.py를 같이 쓴다 (봇/검색 API와 같은 Prometheus 형식).
+A4_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "a4_pipeline")
+if A4_DIR not in sys.path:
+    sys.path.insert(0, A4_DIR)
+
+from metrics import CONTENT_TYPE, REGISTRY  # noqa: E402
+
+# 동시에 들어온 /search 요청은 짧은 창(DB_API_BATCH_WINDOW_MS) 동안 모아서 한 번에 처리한다.
+# 질의 묶음은 인코더 forward 한 번으로 임베딩하고 FAISS index.search 한 번으로 검색한다.
+# 임베딩/검색은 전용 스레드 하나에서 돌기 때문에 이벤트 루프는 막히지 않는다.
+BATCH_WINDOW_MS = float(os.environ.get("DB_API_BATCH_WINDOW_MS", "5"))
+MAX_BATCH = int(os.environ.get("DB_API_MAX_BATCH", "64"))
+MAX_BATCH_QUERIES = int(os.environ.get("DB_API_MAX_BATCH_QUERIES", "256"))
+# 서버는 모델/DB를 올리지 않고 바로 뜬다. 임베딩 모델과 각 DB는 처음 쓰일 때 로드하고,
+# DB_API_WARMUP(쉼표 구분 db_id 또는 all)에 적힌 DB는 서버가 뜬 직후 백그라운드에서 미리 올린다.
+# FAISS 인덱스 파일은 mmap으로 열어(DB_API_MMAP=0이면 끔) 여러 워커 프로세스가 같은 페이지를 공유한다.
+WARMUP = os.environ.get("DB_API_WARMUP", "").strip()
+USE_MMAP = os.environ.get("DB_API_MMAP", "1") != "0"
+
+
+def pick_device() -> str:
+    """DB_API_DEVICE가 있으면 그 값, 없으면 cuda > mps > cpu 순으로 사용 가능한 장치."""
+    requested = os.environ.get("DB_API_DEVICE", "auto").strip().lower()
+    if requested != "auto":
+        return requested
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    if torch.cuda.is_available():
+        return "cuda"
+    mps = getattr(torch.backends, "mps", None)
+    if mps is not None and mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+# --- 0. 지표 (GET /metrics) ---
+# 요청 지연은 엔드포인트별, 배치 처리는 인코더/FAISS 단계별로 나눠 p50/p95/p99를 볼 수 있게 한다.
+REQUEST_SECONDS = REGISTRY.histogram("db_api_request_seconds", "HTTP 요청 처리 시간.", ["endpoint"])
+REQUEST_ERRORS = REGISTRY.counter("db_api_request_errors_total", "실패한 HTTP 요청 수.", ["endpoint", "status"])
+STAGE_SECONDS = REGISTRY.histogram("db_api_stage_seconds", "검색 배치의 단계별 시간.", ["stage"])
+BATCH_SIZE = REGISTRY.histogram("db_api_batch_queries", "배치 하나에 묶인 질의 수.", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+DB_LOAD_SECONDS = REGISTRY.histogram("db_api_db_load_seconds", "DB 하나를 메모리에 올리는 데 걸린 시간.", ["db_id"])
+
+
+# --- 1. 초기 설정 (모델/DB는 지연 로딩) ---
+DEVICE = pick_device()
+_embeddings: Optional[HuggingFaceEmbeddings] = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings() -> HuggingFaceEmbeddings:
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            print(f"임베딩 모델을 로드합니다. (device={DEVICE})")
+            started = time.perf_counter()
+            _embeddings = HuggingFaceEmbeddings(
+                model_name="jhgan/ko-sroberta-multitask",
+                model_kwargs={'device': DEVICE},
+                encode_kwargs={'batch_size': MAX_BATCH},
+            )
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="model_load")
+            print("임베딩 모델 로드 완료.")
+        return _embeddings
+
+
+def read_faiss_index(index_path: str):
+    """FAISS 인덱스를 읽기 전용 mmap으로 연다. (index, 실제로 mmap됐는지)
+
+    IVF 인덱스의 inverted list는 IO_FLAG_MMAP으로, IndexFlat 계열은 IO_FLAG_MMAP_IFC가 있는
+    FAISS(1.10+)에서만 mmap된다. 그 밖의 경우 FAISS가 플래그를 무시하고 메모리로 읽는다.
+    """
+    import faiss
+
+    if USE_MMAP:
+        ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | ifc)
+            return index, bool(ifc) or "IVF" in type(index).__name__
+        except RuntimeError as e:
+            print(f"mmap 로드 실패, 일반 로드로 전환: {e}")
+    return faiss.read_index(index_path), False
+
+
+def load_vector_db(db_path: str) -> Tuple[FAISS, bool]:
+    """FAISS.save_local 형식(index.faiss + index.pkl)을 FAISS.load_local과 같은 객체로 연다."""
+    index, mapped = read_faiss_index(os.path.join(db_path, "index.faiss"))
+    # index.pkl은 직접 만든 DB이므로 load_local(allow_dangerous_deserialization=True)과 같이 신뢰한다.
+    with open(os.path.join(db_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vector_db = FAISS(get_embeddings(), index, docstore, index_to_docstore_id)
+    return vector_db, mapped
+
+
+class DBSearcher:
+    """DB 하나의 FAISS 인덱스와 docstore 매핑. 처음 쓰일 때 한 번 만들고 요청마다 재사용한다."""
+
+    def __init__(self, vector_db: FAISS) -> None:
+        self.vector_db = vector_db
+        self.normalize = bool(getattr(vector_db, "_normalize_L2", False))
+
+    def search_vectors(self, vectors: np.ndarray, k: int) -> List[List[dict]]:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.normalize:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        _, ids = self.vector_db.index.search(vectors, k)
+        results = []
+        for row in ids:
+            docs = []
+            for i in row:
+                if i == -1:
+                    continue
+                doc = self.vector_db.docstore.search(self.vector_db.index_to_docstore_id[int(i)])
+                docs.append({"page_content": doc.page_content, "metadata": doc.metadata})
+            results.append(docs)
+        return results
+
+
+# [수정] 우리가 만든 3D DRAM DB 폴더 이름을 정확히 기재
+db_folders = {
+    "3d_dram": "faiss_index_3d_dram_gpu",
+    # "samsung": "faiss_index_samsung_gpu", # 필요시 다른 DB 추가
+    # "hynix": "faiss_index_hynix_gpu"
+}
+
+available_dbs: Dict[str, DBSearcher] = {}
+db_info: Dict[str, dict] = {}
+_db_locks = {db_id: threading.Lock() for db_id in db_folders}
+
+
+def db_exists(db_id: str) -> bool:
+    return db_id in db_folders and os.path.exists(os.path.join('.', db_folders[db_id]))
+
+
+def get_searcher(db_id: str) -> DBSearcher:
+    """DB를 처음 쓰는 요청에서 한 번만 로드한다. 같은 DB를 동시에 요청하면 한쪽이 기다린다."""
+    searcher = available_dbs.get(db_id)
+    if searcher is not None:
+        return searcher
+    with _db_locks[db_id]:
+        if db_id not in available_dbs:
+            print(f"'{db_id}' DB 로딩 중...")
+            started = time.perf_counter()
+            vector_db, mapped = load_vector_db(os.path.join('.', db_folders[db_id]))
+            available_dbs[db_id] = DBSearcher(vector_db)
+            db_info[db_id] = {"load_sec": round(time.perf_counter() - started, 2), "mmap": mapped}
+            DB_LOAD_SECONDS.observe(time.perf_counter() - started, db_id=db_id)
+            print(f"'{db_id}' DB 로드 완료. ({db_info[db_id]})")
+        return available_dbs[db_id]
+
+
+def warm_up(db_ids: List[str]) -> None:
+    """모델과 DB를 미리 올리고 질의 하나로 인코더를 데운다."""
+    for db_id in db_ids:
+        get_searcher(db_id)
+    get_embeddings().embed_documents(["warmup"])
+
+
+search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-search")
+load_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="db-load")
+
+
+def search_many(db_id: str, queries: List[str], k: int) -> List[List[dict]]:
+    """질의 목록을 한 번에 임베딩하고 한 번의 FAISS 검색으로 질의별 문서를 돌려준다."""
+    unique = list(dict.fromkeys(queries))
+    BATCH_SIZE.observe(len(unique))
+    embeddings, searcher = get_embeddings(), get_searcher(db_id)
+    with STAGE_SECONDS.time(stage="embed"):
+        vectors = np.asarray(embeddings.embed_documents(unique), dtype=np.float32)
+    with STAGE_SECONDS.time(stage="faiss_search"):
+        found = dict(zip(unique, searcher.search_vectors(vectors, k)))
+    return [found[query] for query in queries]
+
+
+class SearchBatcher:
+    """이벤트 루프에서 동시에 들어온 단건 검색을 DB별로 모아 search_many 한 번으로 처리한다."""
+
+    def __init__(self) -> None:
+        self.pending: Dict[str, List[Tuple[str, int, asyncio.Future]]] = {}
+        self.timers: Dict[str, asyncio.TimerHandle] = {}
+        self.batches = 0
+        self.queries = 0
+        self.in_flight = 0  # 검색 스레드에 넘겼지만 아직 끝나지 않은 질의 수
+
+    async def search(self, db_id: str, query: str, k: int) -> List[dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self.pending.setdefault(db_id, [])
+        batch.append((query, k, future))
+        if len(batch) >= MAX_BATCH:
+            self._flush(db_id)
+        elif len(batch) == 1:
+            self.timers[db_id] = loop.call_later(BATCH_WINDOW_MS / 1000, self._flush, db_id)
+        return await future
+
+    def _flush(self, db_id: str) -> None:
+        timer = self.timers.pop(db_id, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.pending.pop(db_id, [])
+        if batch:
+            asyncio.ensure_future(self._run(db_id, batch))
+
+    async def _run(self, db_id: str, batch: List[Tuple[str, int, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.queries += len(batch)
+        k = max(item[1] for item in batch)
+        loop = asyncio.get_running_loop()
+        self.in_flight += len(batch)
+        try:
+            results = await loop.run_in_executor(search_executor, search_many, db_id, [item[0] for item in batch], k)
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            self.in_flight -= len(batch)
+        for (_, item_k, future), docs in zip(batch, results):
+            if not future.done():
+                future.set_result(docs[:item_k])
+
+
+batcher = SearchBatcher()
+app = FastAPI()
+
+
+def server_samples():
+    """스크랩할 때 읽는 현재 값: 대기열 깊이, 로드된 DB 수, 메모리."""
+    samples = [
+        ("db_api_pending_queries", "gauge", "배치 창에서 기다리는 질의 수.", {}, sum(len(batch) for batch in batcher.pending.values())),
+        ("db_api_in_flight_queries", "gauge", "검색 스레드에서 처리 중인 질의 수.", {}, batcher.in_flight),
+        ("db_api_batches_total", "counter", "처리한 배치 수.", {}, batcher.batches),
+        ("db_api_queries_total", "counter", "처리한 단건 검색 질의 수.", {}, batcher.queries),
+        ("db_api_model_loaded", "gauge", "임베딩 모델이 메모리에 있으면 1.", {}, int(_embeddings is not None)),
+        ("db_api_dbs_loaded", "gauge", "메모리에 올라온 DB 수.", {}, len(available_dbs)),
+    ]
+    rss = rss_mb()
+    if rss is not None:
+        samples.append(("db_api_rss_megabytes", "gauge", "프로세스 RSS (MB).", {}, rss))
+    return samples
+
+
+REGISTRY.register_collector(server_samples)
+
+
+class SearchRequest(BaseModel):
+    db_id: str
+    query: str
+    k: int = 10
+
+
+class BatchSearchRequest(BaseModel):
+    db_id: str
+    queries: List[str]
+    k: int = 10
+
+
+async def ensure_db(db_id: str) -> None:
+    """없는 DB면 404. 아직 로드 전이면 로드 스레드에서 올릴 때까지 기다린다."""
+    if not db_exists(db_id):
+        raise HTTPException(status_code=404, detail=f"'{db_id}' DB가 서버에 없습니다.")
+    if db_id not in available_dbs:
+        await asyncio.get_running_loop().run_in_executor(load_executor, get_searcher, db_id)
+
+
+def rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@app.on_event("startup")
+async def start_warmup():
+    targets = [db_id for db_id in db_folders if db_exists(db_id)] if WARMUP == "all" else [
+        db_id.strip() for db_id in WARMUP.split(",") if db_exists(db_id.strip())
+    ]
+    if WARMUP:
+        asyncio.get_running_loop().run_in_executor(load_executor, warm_up, targets)
+
+
+# --- 2. API 엔드포인트 ---
+@app.get("/health")
+async def health():
+    """status는 요청을 받을 수 있으면 up, 임베딩 모델과 모든 DB가 메모리에 올라와 있으면 warm."""
+    present = [db_id for db_id in db_folders if db_exists(db_id)]
+    warm = _embeddings is not None and all(db_id in available_dbs for db_id in present)
+    return {
+        "status": "warm" if warm else "up",
+        "device": DEVICE,
+        "model_loaded": _embeddings is not None,
+        "dbs": {db_id: {"loaded": db_id in available_dbs, **db_info.get(db_id, {})} for db_id in present},
+        "rss_mb": rss_mb(),
+        "batches": batcher.batches,
+        "queries": batcher.queries,
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def observe_request(endpoint: str, started: float, status: int = 200) -> None:
+    REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    if status >= 400:
+        REQUEST_ERRORS.inc(endpoint=endpoint, status=str(status))
+
+
+@app.post("/search")
+async def search_documents(request: SearchRequest):
+    print(f"\n'{request.db_id}' DB에 대한 검색 요청 수신: '{request.query}' (k={request.k})")
+    started = time.perf_counter()
+    try:
+        await ensure_db(request.db_id)
+        results = await batcher.search(request.db_id, request.query, request.k)
+        print(f"-> '{len(results)}'개의 관련 문서를 찾았습니다.")
+    except HTTPException as e:
+        observe_request("search", started, e.status_code)
+        raise
+    except Exception as e:
+        observe_request("search", started, 500)
+        raise HTTPException(status_code=500, detail=f"검색 중 서버 오류 발생: {e}")
+    observe_request("search", started)
+    return {"documents": results}
+
+
+@app.post("/search_batch")
+async def search_documents_batch(request: BatchSearchRequest):
+    """여러 질의를 한 요청으로 검색한다. 결과는 queries 순서대로 {"query", "documents"} 목록."""
+    print(f"\n'{request.db_id}' DB에 대한 배치 검색 요청 수신: {len(request.queries)}건 (k={request.k})")
+    started = time.perf_counter()
+    try:
+        await ensure_db(request.db_id)
+        if not request.queries:
+            raise HTTPException(status_code=400, detail="queries가 비어 있습니다.")
+        if len(request.queries) > MAX_BATCH_QUERIES:
+            raise HTTPException(status_code=400, detail=f"한 번에 최대 {MAX_BATCH_QUERIES}개 질의까지 검색할 수 있습니다.")
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(search_executor, search_many, request.db_id, request.queries, request.k)
+    except HTTPException as e:
+        observe_request("search_batch", started, e.status_code)
+        raise
+    except Exception as e:
+        observe_request("search_batch", started, 500)
+        raise HTTPException(status_code=500, detail=f"검색 중 서버 오류 발생: {e}")
+    observe_request("search_batch", started)
+    return {"results": [{"query": query, "documents": docs} for query, docs in zip(request.queries, results)]}
+
+
+if __name__ == "__main__":
+    print("DB 검색 API 서버를 시작하려면 Anaconda Prompt에서 아래 명령어를 입력하세요:")
+    print("uvicorn db_api_server:app --host 0.0.0.0 --port 8000")
+    print("CPU 서버에서는 장치가 자동으로 cpu로 잡힌다. 강제로 지정하려면 DB_API_DEVICE=cpu 를 설정한다.")
+    print("DB는 첫 요청 때 로드된다. 미리 올리려면 DB_API_WARMUP=all (또는 3d_dram,samsung) 을 설정한다.")
+    print("여러 워커: uvicorn db_api_server:app --workers 4  (mmap 인덱스 페이지는 워커끼리 공유된다)")